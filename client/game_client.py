@@ -156,6 +156,10 @@ class GameClient:
             
             if msg_type == 'game_frame':
                 await self._handle_game_frame(payload)
+            elif msg_type == 'batch':
+                # 服务器合并发送的多条消息，逐条按原顺序处理
+                for inner in payload.get('messages', []):
+                    await self._handle_message(inner)
             elif msg_type == 'player_joined':
                 logger.info(f"Player joined: {payload.get('player_id')}")
             elif msg_type == 'player_left':
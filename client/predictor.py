@@ -170,17 +170,22 @@ class ClientPredictor:
         return self.last_prediction_result
     
     def _save_snapshot(self, frame_id: int):
-        """保存状态快照"""
+        """
+        保存状态快照
+        
+        物理实体用 PhysicsState 按列打包；游戏状态中与物理引擎共享的实体
+        只记占位（None），其余实体单独序列化，并保持原有顺序。
+        """
+        physics_entities = self.physics.entities
         snapshot = {
             'frame_id': self.game_state.frame_id,
-            'entities': {},
-            'physics_state': self.physics.serialize_state()
+            'entities': {
+                eid: None if physics_entities.get(eid) is entity else entity.serialize()
+                for eid, entity in self.game_state.entities.items()
+            },
+            'physics_state': self.physics.capture_state()
         }
         
-        # 保存所有实体
-        for eid, entity in self.game_state.entities.items():
-            snapshot['entities'][eid] = entity.serialize()
-        
         self.state_snapshots[frame_id] = snapshot
         
         # 清理旧快照
@@ -196,17 +201,16 @@ class ClientPredictor:
         
         snapshot = self.state_snapshots[frame_id]
         
-        # 恢复游戏状态
-        self.game_state.frame_id = snapshot['frame_id']
-        self.game_state.entities.clear()
+        # 先原地恢复物理实体（对象引用不变）
+        self.physics.restore_state(snapshot['physics_state'])
+        physics_entities = self.physics.entities
         
-        # 恢复实体
+        # 恢复游戏状态：共享实体重新挂回，其余实体重建
+        self.game_state.frame_id = snapshot['frame_id']
+        entities = self.game_state.entities
+        entities.clear()
         for eid, data in snapshot['entities'].items():
-            entity = Entity.deserialize(data)
-            self.game_state.entities[int(eid)] = entity
-        
-        # 恢复物理状态
-        self.physics.deserialize_state(snapshot['physics_state'])
+            entities[eid] = physics_entities[eid] if data is None else Entity.deserialize(data)
         
         return True
     
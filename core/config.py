@@ -22,6 +22,28 @@ import json
 from pathlib import Path
 
 
+def _upper_alias(name: str) -> property:
+    """
+    为小写配置字段生成大写别名属性
+
+    物理/游戏代码习惯使用常量风格的大写名（如 CONFIG.physics.GRAVITY），
+    配置文件则使用小写键。别名可读可写，始终映射到同一个字段。
+
+    Args:
+        name: 小写字段名
+
+    Returns:
+        property 对象
+    """
+    def getter(self):
+        return getattr(self, name)
+
+    def setter(self, value):
+        setattr(self, name, value)
+
+    return property(getter, setter, doc=f"{name} 的大写别名")
+
+
 @dataclass
 class FixedPointConfig:
     """
@@ -56,6 +78,16 @@ class PhysicsConfig:
     entity_height: float = 32.0
     grid_cell_size: float = 64.0
     
+    # 大写别名（不是 dataclass 字段，不参与 asdict）
+    GRAVITY = _upper_alias('gravity')
+    FRICTION = _upper_alias('friction')
+    MAX_VELOCITY = _upper_alias('max_velocity')
+    WORLD_WIDTH = _upper_alias('world_width')
+    WORLD_HEIGHT = _upper_alias('world_height')
+    ENTITY_WIDTH = _upper_alias('entity_width')
+    ENTITY_HEIGHT = _upper_alias('entity_height')
+    GRID_CELL_SIZE = _upper_alias('grid_cell_size')
+    
     def get_gravity_fixed(self, scale: int) -> int:
         """重力（定点数）"""
         return int(self.gravity * scale)
@@ -108,6 +140,14 @@ class GameConfig:
     attack_damage: int = 10
     default_hp: int = 100
     
+    # 大写别名（不是 dataclass 字段，不参与 asdict）
+    PLAYER_COUNT = _upper_alias('player_count')
+    MAX_PLAYERS_PER_ROOM = _upper_alias('max_players_per_room')
+    PLAYER_SPEED = _upper_alias('player_speed')
+    ATTACK_RANGE = _upper_alias('attack_range')
+    ATTACK_DAMAGE = _upper_alias('attack_damage')
+    DEFAULT_HP = _upper_alias('default_hp')
+    
     def get_player_speed_fixed(self, scale: int) -> int:
         """玩家速度（定点数）"""
         return int(self.player_speed * scale)
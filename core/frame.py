@@ -8,7 +8,7 @@
 """
 
 from dataclasses import dataclass, field
-from typing import Dict, Optional, List
+from typing import Dict, Iterable, Optional, List
 from collections import deque
 import time
 
@@ -47,6 +47,8 @@ class Frame:
     inputs: Dict[int, bytes] = field(default_factory=dict)
     confirmed: bool = False
     timestamp: float = field(default_factory=time.time)
+    # to_payload() 的缓存，输入变化时失效
+    _payload: Optional[dict] = field(default=None, init=False, repr=False, compare=False)
     
     def get_input(self, player_id: int) -> Optional[bytes]:
         """
@@ -69,6 +71,25 @@ class Frame:
             input_data: 序列化后的输入数据（字节）
         """
         self.inputs[player_id] = input_data
+        self._payload = None
+    
+    def to_payload(self) -> dict:
+        """
+        转换为网络消息中的帧数据（玩家ID键转为字符串）
+        
+        结果会缓存，广播和断线重连补帧共用同一份，不再重复转换。
+        
+        Returns:
+            {'frame_id': ..., 'inputs': {'0': b'...'}, 'confirmed': ...}
+        """
+        payload = self._payload
+        if payload is None:
+            payload = self._payload = {
+                'frame_id': self.frame_id,
+                'inputs': {str(k): v for k, v in self.inputs.items()},
+                'confirmed': self.confirmed
+            }
+        return payload
     
     def is_complete(self, player_count: int) -> bool:
         """
@@ -117,17 +138,27 @@ class FrameBuffer:
             已准备好可执行的帧ID队列。
             按 frame_id 排序，用于按顺序获取帧执行。
             maxlen=1000 防止内存无限增长。
+        
+        local_mode (bool): 
+            单机模式。输入来自本进程而不是网络，
+            add_input 不做字节校验，直接保存输入对象（如 PlayerInput）。
+        
+        MAX_INPUT_SIZE (1024): 单个输入允许的最大字节数
     """
     
-    def __init__(self, buffer_size: int = 3):
+    MAX_INPUT_SIZE = 1024
+    
+    def __init__(self, buffer_size: int = 3, local_mode: bool = False):
         """
         初始化帧缓冲
         
         Args:
             buffer_size: 缓冲帧数，用于抵消网络延迟。
                         值越大延迟越高，但对网络抖动越稳定。
+            local_mode: 单机模式，输入不经过序列化
         """
         self.buffer_size = buffer_size
+        self.local_mode = local_mode
         self.frames: Dict[int, Frame] = {}
         self.pending_inputs: Dict[int, Dict[int, bytes]] = {}
         self.ready_queue: deque = deque(maxlen=1000)
@@ -143,14 +174,18 @@ class FrameBuffer:
         
         Note:
             - frame_id < 0 的输入会被忽略
-            - 超过 1024 字节的输入会被拒绝
+            - 超过 MAX_INPUT_SIZE 字节的输入会被拒绝
+            - local_mode 下不检查类型和长度
         """
         # 验证输入
         if frame_id < 0:
             return
+        if self.local_mode:
+            self.pending_inputs.setdefault(frame_id, {})[player_id] = input_data
+            return
         if not isinstance(input_data, bytes):
             return
-        if len(input_data) > 1024:
+        if len(input_data) > self.MAX_INPUT_SIZE:
             return
             
         if frame_id not in self.pending_inputs:
@@ -303,19 +338,27 @@ class FrameEngine:
             保留的最大历史帧数。
             默认 300 帧（30fps 下约 10 秒）。
             超过此数量的旧帧会被自动清理。
+        
+        local_mode (bool): 
+            单机模式（没有网络层）。
+            输入直接以对象形式保存在帧里，省去序列化/反序列化往返，
+            此时 Frame.inputs 的值是调用方传入的对象而不是字节。
     """
     
-    def __init__(self, player_count: int = 2, buffer_size: int = 3):
+    def __init__(self, player_count: int = 2, buffer_size: int = 3,
+                 local_mode: bool = False):
         """
         初始化帧引擎
         
         Args:
             player_count: 玩家数量
             buffer_size: 帧缓冲大小
+            local_mode: 单机模式，输入不经过序列化
         """
         self.player_count = player_count
         self.buffer_size = buffer_size
-        self.frame_buffer = FrameBuffer(buffer_size)
+        self.local_mode = local_mode
+        self.frame_buffer = FrameBuffer(buffer_size, local_mode=local_mode)
         self.current_frame = 0
         self.frame_history: Dict[int, Frame] = {}
         self.max_history = 300
@@ -327,7 +370,7 @@ class FrameEngine:
         Args:
             frame_id: 目标帧ID
             player_id: 玩家ID
-            input_data: 序列化后的输入数据
+            input_data: 序列化后的输入数据（local_mode 下为输入对象）
         """
         self.frame_buffer.add_input(frame_id, player_id, input_data)
     
@@ -349,18 +392,41 @@ class FrameEngine:
         
         if frame:
             self.frame_history[frame.frame_id] = frame
-            
-            # 清理旧历史
-            oldest = self.current_frame - self.max_history
-            for fid in list(self.frame_history.keys()):
-                if fid < oldest:
-                    del self.frame_history[fid]
+            self._trim_history()
             
             self.current_frame += 1
             return frame
         
         return None
     
+    def run_n(self, frame_inputs: Iterable[Dict[int, bytes]]) -> List[Frame]:
+        """
+        批量推进（回放/测试等一次性喂入多帧输入的场景）
+        
+        依次把每组输入提交到 current_frame 并 tick()，
+        add_input/tick 在循环外绑定一次，省去每帧的方法查找。
+        遇到不完整的帧即停止（该帧的输入保留在缓冲中）。
+        
+        Args:
+            frame_inputs: 每帧一个 {player_id: 输入数据} 字典
+        
+        Returns:
+            成功推进的 Frame 列表
+        """
+        add_input = self.frame_buffer.add_input
+        tick = self.tick
+        frames = []
+        append = frames.append
+        for inputs in frame_inputs:
+            frame_id = self.current_frame
+            for player_id, input_data in inputs.items():
+                add_input(frame_id, player_id, input_data)
+            frame = tick()
+            if frame is None:
+                break
+            append(frame)
+        return frames
+    
     def force_tick(self) -> Frame:
         """
         强制推进帧（超时处理）
@@ -374,10 +440,11 @@ class FrameEngine:
         # 获取已收集的输入
         pending = self.frame_buffer.pending_inputs.get(self.current_frame, {})
         
-        # 填充缺失的玩家输入（使用空输入）
+        # 填充缺失的玩家输入（使用空输入，local_mode 下为 None）
+        empty = None if self.local_mode else b''
         for player_id in range(self.player_count):
             if player_id not in pending:
-                pending[player_id] = b''
+                pending[player_id] = empty
         
         frame = Frame(
             frame_id=self.current_frame,
@@ -386,12 +453,7 @@ class FrameEngine:
         )
         
         self.frame_history[frame.frame_id] = frame
-        
-        # 清理旧历史
-        oldest = self.current_frame - self.max_history
-        for fid in list(self.frame_history.keys()):
-            if fid < oldest:
-                del self.frame_history[fid]
+        self._trim_history()
         
         # 清理 pending
         if self.current_frame in self.frame_buffer.pending_inputs:
@@ -400,6 +462,21 @@ class FrameEngine:
         self.current_frame += 1
         return frame
     
+    def _trim_history(self):
+        """
+        清理旧历史
+        
+        帧按 frame_id 递增的顺序写入 frame_history，字典保持插入顺序，
+        所以只需从头部删除过期帧，每帧通常只删一个，不必遍历整个历史。
+        """
+        history = self.frame_history
+        oldest = self.current_frame - self.max_history
+        while history:
+            fid = next(iter(history))
+            if fid >= oldest:
+                break
+            del history[fid]
+    
     def get_frame(self, frame_id: int) -> Optional[Frame]:
         """
         获取历史帧
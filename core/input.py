@@ -57,6 +57,16 @@ class InputFlags(IntFlag):
     JUMP = 1 << 7          # 0x80 = 128
 
 
+# 常用组合标志（模块加载时预先计算，避免每次都走 IntFlag.__or__）
+COMBO_MOVE_RIGHT_ATTACK = InputFlags.MOVE_RIGHT | InputFlags.ATTACK
+COMBO_MOVE_LEFT_ATTACK = InputFlags.MOVE_LEFT | InputFlags.ATTACK
+COMBO_MOVE_UP_JUMP = InputFlags.MOVE_UP | InputFlags.JUMP
+
+# 输入头部: frame_id(4) + player_id(2) + flags(1) + target_x(4) + target_y(4) + extra_len(1)
+# 预编译格式，避免每次 pack/unpack 重新解析格式字符串
+_INPUT_HEADER = struct.Struct('!IHBiiB')
+
+
 @dataclass
 class PlayerInput:
     """
@@ -107,7 +117,7 @@ class PlayerInput:
     extra: bytes = b''
     
     # 序列化格式: frame_id(4) + player_id(2) + flags(1) + target_x(4) + target_y(4) + extra_len(1) + extra
-    FORMAT = '!IHBiiB'
+    FORMAT = _INPUT_HEADER.format
     
     def set_flag(self, flag: InputFlags):
         """
@@ -146,8 +156,37 @@ class PlayerInput:
         Returns:
             16+ 字节的二进制数据
         """
-        header = struct.pack(
-            self.FORMAT,
+        return _INPUT_HEADER.pack(
+            self.frame_id,
+            self.player_id,
+            self.flags,
+            self.target_x,
+            self.target_y,
+            len(self.extra)
+        ) + self.extra
+    
+    def packed_size(self) -> int:
+        """
+        序列化后的字节数
+        
+        Returns:
+            头部大小 + extra 长度
+        """
+        return _INPUT_HEADER.size + len(self.extra)
+    
+    def pack_into(self, buf, offset: int = 0) -> int:
+        """
+        直接写入预分配的缓冲区（不产生中间 bytes 对象）
+        
+        Args:
+            buf: 可写缓冲区（bytearray / memoryview）
+            offset: 写入起始偏移
+        
+        Returns:
+            写入后的下一个偏移
+        """
+        _INPUT_HEADER.pack_into(
+            buf, offset,
             self.frame_id,
             self.player_id,
             self.flags,
@@ -155,7 +194,10 @@ class PlayerInput:
             self.target_y,
             len(self.extra)
         )
-        return header + self.extra
+        offset += _INPUT_HEADER.size
+        end = offset + len(self.extra)
+        buf[offset:end] = self.extra
+        return end
     
     @classmethod
     def deserialize(cls, data: bytes) -> 'PlayerInput':
@@ -171,17 +213,31 @@ class PlayerInput:
         Raises:
             ValueError: 如果数据长度不足
         """
-        header_size = struct.calcsize(cls.FORMAT)
+        return cls.unpack_from(data)
+    
+    @classmethod
+    def unpack_from(cls, buf, offset: int = 0) -> 'PlayerInput':
+        """
+        从缓冲区的指定偏移解析（接收缓冲区可直接传入，头部解析不复制）
         
-        if len(data) < header_size:
-            raise ValueError("Input data too short")
+        下一条输入的偏移为 offset + 返回值.packed_size()。
         
-        header = data[:header_size]
-        extra = data[header_size:]
+        Args:
+            buf: 二进制数据（bytes / bytearray / memoryview）
+            offset: 起始偏移
         
-        frame_id, player_id, flags, target_x, target_y, extra_len = struct.unpack(
-            cls.FORMAT, header
-        )
+        Returns:
+            PlayerInput 实例
+        
+        Raises:
+            ValueError: 如果数据长度不足
+        """
+        start = offset + _INPUT_HEADER.size
+        if len(buf) < start:
+            raise ValueError("Input data too short")
+        
+        frame_id, player_id, flags, target_x, target_y, extra_len = \
+            _INPUT_HEADER.unpack_from(buf, offset)
         
         return cls(
             frame_id=frame_id,
@@ -189,7 +245,7 @@ class PlayerInput:
             flags=flags,
             target_x=target_x,
             target_y=target_y,
-            extra=extra[:extra_len]
+            extra=bytes(buf[start:start + extra_len])
         )
     
     def get_direction(self) -> tuple:
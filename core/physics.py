@@ -4,6 +4,7 @@
 本模块提供帧同步所需的确定性物理模拟：
 - Entity: 游戏实体，使用定点数坐标
 - PhysicsEngine: 物理引擎，处理碰撞和物理模拟
+- PhysicsState: 物理状态的 SoA（结构数组）存储，用于快速捕获/恢复
 - EntityPool: 实体对象池，优化内存分配
 
 重构说明：
@@ -12,18 +13,20 @@
 - 消除所有硬编码的 << 16 和魔法数字
 """
 
+from array import array
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import math
 
 from .fixed import fixed, FixedPoint
 from .config import CONFIG, _ensure_config_loaded
+from .state import entity_digest
 
 # 确保配置已加载
 _ensure_config_loaded()
 
 
-@dataclass
+@dataclass(slots=True)
 class Entity:
     """
     游戏实体
@@ -47,6 +50,12 @@ class Entity:
         hp (int): 当前生命值
         max_hp (int): 最大生命值
         flags (int): 状态标志位
+    
+    尺寸一半（_half_w/_half_h）会被缓存用于空间网格定位，
+    修改宽高请使用 set_size() 以保持缓存一致。
+    _cell/_cell_index 记录实体在所属物理引擎空间网格中的位置，
+    一个实体同一时间只应属于一个 PhysicsEngine。
+    _hash_key/_hash 缓存 fast_hash() 的结果，按序列化字段的值判断是否失效。
     """
     entity_id: int
     x: int = 0
@@ -58,6 +67,13 @@ class Entity:
     hp: int = 0
     max_hp: int = 0
     flags: int = 0
+    _half_w: int = field(default=0, init=False, repr=False, compare=False)
+    _half_h: int = field(default=0, init=False, repr=False, compare=False)
+    # 所在空间网格单元格及其在桶中的下标（由 PhysicsEngine 维护）
+    _cell: Optional[Tuple[int, int]] = field(default=None, init=False, repr=False, compare=False)
+    _cell_index: int = field(default=-1, init=False, repr=False, compare=False)
+    _hash_key: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _hash: int = field(default=0, init=False, repr=False, compare=False)
     
     def __post_init__(self):
         """初始化默认值（使用配置）"""
@@ -69,6 +85,8 @@ class Entity:
             self.hp = CONFIG.game.DEFAULT_HP
         if self.max_hp == 0:
             self.max_hp = CONFIG.game.DEFAULT_HP
+        self._half_w = self.width // 2
+        self._half_h = self.height // 2
     
     @classmethod
     def from_float(cls, entity_id: int, x: float, y: float) -> 'Entity':
@@ -161,6 +179,19 @@ class Entity:
         else:
             self.vy = int(vy * FixedPoint.SCALE)
     
+    def set_size(self, width: int, height: int):
+        """
+        设置尺寸并刷新缓存的半宽/半高
+        
+        Args:
+            width: 宽度（定点数原始值）
+            height: 高度（定点数原始值）
+        """
+        self.width = width
+        self.height = height
+        self._half_w = width // 2
+        self._half_h = height // 2
+    
     def get_bounds(self) -> Tuple[int, int, int, int]:
         """
         获取碰撞边界
@@ -191,6 +222,49 @@ class Entity:
             'flags': self.flags
         }
     
+    def clone(self) -> 'Entity':
+        """
+        复制实体（替代 copy.deepcopy，所有字段都是不可变值，浅复制即可）
+        
+        副本不属于任何物理引擎的空间网格。
+        
+        Returns:
+            新的 Entity 实例
+        """
+        c = object.__new__(type(self))
+        for name in _ENTITY_COPY_SLOTS:
+            setattr(c, name, getattr(self, name))
+        c._cell = None
+        c._cell_index = -1
+        return c
+    
+    def record(self) -> tuple:
+        """
+        serialize() 各字段值组成的元组
+        
+        比构造字典便宜得多，用于判断实体自上次序列化/哈希以来是否变化。
+        
+        Returns:
+            (entity_id, x, y, vx, vy, hp, flags)
+        """
+        return (self.entity_id, self.x, self.y, self.vx, self.vy, self.hp, self.flags)
+    
+    def fast_hash(self) -> int:
+        """
+        实体摘要（带缓存）
+        
+        与 entity_digest(self.serialize()) 相同。序列化字段都未变化时
+        直接返回上次结果，静止的实体每帧只需一次元组比较。
+        
+        Returns:
+            128 位无符号整数
+        """
+        key = self.record()
+        if key != self._hash_key:
+            self._hash = entity_digest(self.serialize())
+            self._hash_key = key
+        return self._hash
+    
     @classmethod
     def deserialize(cls, data: dict) -> 'Entity':
         """从字典反序列化"""
@@ -206,6 +280,99 @@ class Entity:
         )
 
 
+# clone() 逐个复制的槽位（_cell/_cell_index 由 clone 单独重置）
+_ENTITY_COPY_SLOTS = tuple(n for n in Entity.__slots__ if n not in ('_cell', '_cell_index'))
+
+
+class PhysicsState:
+    """
+    物理状态的 SoA 存储
+    
+    每个字段一块连续的 array('q')，按槽位（slot）排列，
+    适合回滚时整体捕获/恢复，以及顺序遍历。
+    
+    Entity 对象仍然是引擎中的权威数据：它们被 GameState、
+    客户端预测器等按引用共享，因此这里只做打包副本，不做视图。
+    
+    属性:
+        count: 已使用的槽位数
+        capacity: 当前容量
+        entity_id/x/y/vx/vy/width/height/hp/max_hp/flags: 各字段数组（覆盖 Entity 的全部公开字段）
+    """
+    
+    FIELDS = ('entity_id', 'x', 'y', 'vx', 'vy', 'width', 'height', 'hp', 'max_hp', 'flags')
+    
+    def __init__(self, capacity: int = 256):
+        """
+        初始化 SoA 存储
+        
+        Args:
+            capacity: 初始容量（槽位数）
+        """
+        self.capacity = max(1, capacity)
+        self.count = 0
+        self._slot_of: Dict[int, int] = {}
+        for name in self.FIELDS:
+            setattr(self, name, array('q', [0]) * self.capacity)
+    
+    def _grow(self, min_capacity: int):
+        """扩容到至少 min_capacity（按倍数增长）"""
+        new_capacity = self.capacity
+        while new_capacity < min_capacity:
+            new_capacity *= 2
+        extra = new_capacity - self.capacity
+        for name in self.FIELDS:
+            getattr(self, name).extend(array('q', [0]) * extra)
+        self.capacity = new_capacity
+    
+    def clear(self):
+        """清空所有槽位（保留已分配的数组）"""
+        self.count = 0
+        self._slot_of.clear()
+    
+    def load(self, entities: Iterable[Entity]):
+        """
+        从实体集合填充数组（覆盖原有内容）
+        
+        Args:
+            entities: 实体迭代器，按迭代顺序分配槽位
+        """
+        entities = list(entities)
+        if len(entities) > self.capacity:
+            self._grow(len(entities))
+        
+        self.clear()
+        ids, xs, ys = self.entity_id, self.x, self.y
+        vxs, vys, ws, hs = self.vx, self.vy, self.width, self.height
+        hps, max_hps, flags = self.hp, self.max_hp, self.flags
+        slot_of = self._slot_of
+        
+        for slot, e in enumerate(entities):
+            ids[slot] = e.entity_id
+            xs[slot] = e.x
+            ys[slot] = e.y
+            vxs[slot] = e.vx
+            vys[slot] = e.vy
+            ws[slot] = e.width
+            hs[slot] = e.height
+            hps[slot] = e.hp
+            max_hps[slot] = e.max_hp
+            flags[slot] = e.flags
+            slot_of[e.entity_id] = slot
+        
+        self.count = len(entities)
+    
+    def slot_of(self, entity_id: int) -> Optional[int]:
+        """实体ID -> 槽位，不存在返回 None"""
+        return self._slot_of.get(entity_id)
+    
+    def eid_of(self, slot: int) -> int:
+        """槽位 -> 实体ID"""
+        if not 0 <= slot < self.count:
+            raise IndexError(f"Slot {slot} out of range")
+        return self.entity_id[slot]
+
+
 class PhysicsEngine:
     """
     确定性物理引擎
@@ -222,10 +389,15 @@ class PhysicsEngine:
     
     属性:
         entities: 所有实体的字典
-        collision_pairs: 当前帧检测到的碰撞对
+        collision_pairs: 当前帧检测到的碰撞对（整数键，见 pair_key()）
         spatial_grid: 空间划分网格
     """
     
+    # 实体数少于该值，或平均每个世界单元格实体数低于 SAP_MAX_DENSITY 时，
+    # 使用扫描排除法（网格大量空桶，开销不划算）
+    SAP_MAX_ENTITIES = 100
+    SAP_MAX_DENSITY = 0.1
+    
     def __init__(self, config=None):
         """
         初始化物理引擎
@@ -244,153 +416,326 @@ class PhysicsEngine:
         self.cell_size = int(self._cfg.physics.GRID_CELL_SIZE * FixedPoint.SCALE)
         
         self.entities: Dict[int, Entity] = {}
-        self.collision_pairs: List[Tuple[int, int]] = []
+        self.collision_pairs: List[int] = []
         self.spatial_grid: Dict[Tuple[int, int], List[int]] = {}
+        # 网格跨帧保留，只在实体跨越单元格时移动；为 False 时下一帧整体重建
+        self._grid_valid = False
+        
+        # 扫描排除法：跨帧保留的按 x 排序的实体ID（帧间近乎有序，排序接近 O(n)）
+        self._sap_order: List[int] = []
+        self._world_cells = max(1, (self.WORLD_WIDTH // self.cell_size) *
+                                   (self.WORLD_HEIGHT // self.cell_size))
     
     def add_entity(self, entity: Entity):
         """添加实体"""
+        if entity.entity_id in self.entities:
+            self.remove_entity(entity.entity_id)
+        entity._cell = None
+        entity._cell_index = -1
         self.entities[entity.entity_id] = entity
     
     def remove_entity(self, entity_id: int):
         """移除实体"""
-        if entity_id in self.entities:
-            del self.entities[entity_id]
+        entity = self.entities.pop(entity_id, None)
+        if entity is not None and entity._cell is not None and self._grid_valid:
+            self._grid_remove(entity)
     
     def get_entity(self, entity_id: int) -> Optional[Entity]:
         """获取实体"""
         return self.entities.get(entity_id)
     
-    def update(self, dt_ms: int):
+    def update(self, dt_ms: int, steps: int = 1):
         """
         更新物理模拟
         
         Args:
             dt_ms: 时间增量（毫秒）
+            steps: 连续推进的步数，结果与调用 steps 次 update(dt_ms) 完全相同
         """
         if dt_ms <= 0:
             return
         
-        for entity in self.entities.values():
-            # 应用重力
-            entity.vy += (self.GRAVITY * dt_ms) // 1000
-            
-            # 限制最大速度
-            entity.vx = max(-self.MAX_VELOCITY, min(self.MAX_VELOCITY, entity.vx))
-            entity.vy = max(-self.MAX_VELOCITY, min(self.MAX_VELOCITY, entity.vy))
+        step = self._step
+        for _ in range(steps):
+            step(dt_ms)
+    
+    def _step(self, dt_ms: int):
+        """
+        推进一步物理模拟（dt_ms 已确认为正数）
+        
+        Args:
+            dt_ms: 时间增量（毫秒）
+        """
+        use_sap = self._use_sweep_and_prune()
+        
+        # 单次遍历完成：积分、边界处理、空间网格分桶
+        if use_sap:
+            self._grid_valid = False
+        elif not self._grid_valid:
+            self._reset_grid()
+        grid = self.spatial_grid
+        cs = self.cell_size
+        
+        # 帧常量提到循环外
+        g_dv = (self.GRAVITY * dt_ms) // 1000
+        mv = self.MAX_VELOCITY
+        fr = self.FRICTION
+        ww = self.WORLD_WIDTH
+        wh = self.WORLD_HEIGHT
+        bits = FixedPoint.FRACTION_BITS
+        
+        for eid, entity in self.entities.items():
+            # 应用重力并限制最大速度（条件表达式在 CPython 中比 max/min 快得多）
+            vx = entity.vx
+            vx = mv if vx > mv else (-mv if vx < -mv else vx)
+            vy = entity.vy + g_dv
+            vy = mv if vy > mv else (-mv if vy < -mv else vy)
             
             # 更新位置
-            entity.update_position(dt_ms)
+            x = entity.x + (vx * dt_ms) // 1000
+            y = entity.y + (vy * dt_ms) // 1000
             
             # 应用摩擦力
-            entity.vx = (entity.vx * self.FRICTION) >> FixedPoint.FRACTION_BITS
-        
-        # 边界碰撞
-        self._handle_boundary_collision()
-        
-        # 实体间碰撞
-        self._handle_entity_collision_optimized()
-    
-    def _handle_boundary_collision(self):
-        """处理边界碰撞"""
-        for entity in self.entities.values():
-            if entity.x < 0:
-                entity.x = 0
-                entity.vx = 0
+            vx = (vx * fr) >> bits
             
-            if entity.x + entity.width > self.WORLD_WIDTH:
-                entity.x = self.WORLD_WIDTH - entity.width
-                entity.vx = 0
+            # 边界碰撞
+            if x < 0:
+                x = 0
+                vx = 0
+            right = ww - entity.width
+            if x > right:
+                x = right
+                vx = 0
+            if y < 0:
+                y = 0
+                vy = 0
+            bottom = wh - entity.height
+            if y > bottom:
+                y = bottom
+                vy = 0
             
-            if entity.y < 0:
-                entity.y = 0
-                entity.vy = 0
+            entity.x = x
+            entity.y = y
+            entity.vx = vx
+            entity.vy = vy
             
-            if entity.y + entity.height > self.WORLD_HEIGHT:
-                entity.y = self.WORLD_HEIGHT - entity.height
-                entity.vy = 0
+            # 空间网格分桶（扫描排除法不需要网格）；留在原单元格的实体不动
+            if not use_sap:
+                cell = ((x + entity._half_w) // cs, (y + entity._half_h) // cs)
+                if cell != entity._cell:
+                    if entity._cell is not None:
+                        self._grid_remove(entity)
+                    bucket = grid.get(cell)
+                    if bucket is None:
+                        bucket = grid[cell] = []
+                    entity._cell = cell
+                    entity._cell_index = len(bucket)
+                    bucket.append(eid)
+        
+        # 实体间碰撞
+        if use_sap:
+            self._handle_entity_collision_sap()
+        else:
+            self._handle_entity_collision_optimized(rebuild_grid=False)
+    
+    def _use_sweep_and_prune(self) -> bool:
+        """根据实体数量和密度选择宽相算法"""
+        n = len(self.entities)
+        return n < self.SAP_MAX_ENTITIES or n < self.SAP_MAX_DENSITY * self._world_cells
     
     def _update_spatial_grid(self):
-        """更新空间网格"""
-        self.spatial_grid.clear()
+        """整体重建空间网格（按实体中心定位单元格）"""
+        self._reset_grid()
+        grid = self.spatial_grid
+        cs = self.cell_size
         for eid, entity in self.entities.items():
-            cx = (entity.x + entity.width // 2) // self.cell_size
-            cy = (entity.y + entity.height // 2) // self.cell_size
-            cell = (cx, cy)
-            if cell not in self.spatial_grid:
-                self.spatial_grid[cell] = []
-            self.spatial_grid[cell].append(eid)
-    
-    def _handle_entity_collision_optimized(self):
-        """优化的实体间碰撞检测"""
+            cell = ((entity.x + entity._half_w) // cs, (entity.y + entity._half_h) // cs)
+            bucket = grid.get(cell)
+            if bucket is None:
+                bucket = grid[cell] = []
+            entity._cell = cell
+            entity._cell_index = len(bucket)
+            bucket.append(eid)
+    
+    def _reset_grid(self):
+        """清空网格并清除所有实体的单元格记录"""
+        self.spatial_grid.clear()
+        for entity in self.entities.values():
+            entity._cell = None
+            entity._cell_index = -1
+        self._grid_valid = True
+    
+    def _grid_remove(self, entity: Entity):
+        """把实体从所在的桶中移除（与桶尾交换后弹出，O(1)）"""
+        bucket = self.spatial_grid[entity._cell]
+        last_eid = bucket.pop()
+        if last_eid != entity.entity_id:
+            index = entity._cell_index
+            bucket[index] = last_eid
+            self.entities[last_eid]._cell_index = index
+        elif not bucket:
+            del self.spatial_grid[entity._cell]
+        entity._cell = None
+        entity._cell_index = -1
+    
+    def _handle_entity_collision_optimized(self, rebuild_grid: bool = True):
+        """
+        优化的实体间碰撞检测
+        
+        每个单元格的实体坐标先抽取成并列的整数列表（SoA），
+        再由 _aabb_scan 对整行候选做批量扫描，命中后才回到对象层解决碰撞。
+        邻居只检查半模板（左、上、左上、右上），每个无序单元格对恰好访问一次，
+        因此不需要额外的 checked 去重集合。
+        
+        Args:
+            rebuild_grid: 是否重建空间网格（update() 已在积分循环中建好时传 False）
+        """
+        self.collision_pairs.clear()
+        if rebuild_grid:
+            self._update_spatial_grid()
+        
+        # 网格跨帧增量维护，桶内和单元格顺序与历史有关；
+        # 这里统一按坐标/ID 排序，保证回滚重建后处理顺序仍然一致
+        entities = self.entities
+        grid = self.spatial_grid
+        cells = {}
+        for cell in sorted(grid):
+            ents = [entities[eid] for eid in sorted(grid[cell])]
+            cells[cell] = (ents,
+                           [e.x for e in ents], [e.y for e in ents],
+                           [e.width for e in ents], [e.height for e in ents])
+        
+        self.collision_pairs.extend(self._collide_cells(cells, list(cells)))
+    
+    def _handle_entity_collision_sap(self):
+        """
+        扫描排除法（Sweep and Prune）碰撞检测
+        
+        按 (x, entity_id) 排序后沿 X 轴扫描，只与 X 区间仍然重叠的
+        活动实体做完整 AABB 测试。排序键是全序，结果与历史排列无关，
+        回滚重建实体后依然确定。
+        """
         self.collision_pairs.clear()
-        self._update_spatial_grid()
-        
-        checked = set()
-        
-        for cell, entity_ids in self.spatial_grid.items():
-            for i, eid1 in enumerate(entity_ids):
-                for eid2 in entity_ids[i+1:]:
-                    pair = (min(eid1, eid2), max(eid1, eid2))
-                    if pair in checked:
-                        continue
-                    checked.add(pair)
-                    
-                    e1 = self.entities[eid1]
-                    e2 = self.entities[eid2]
-                    if self._check_aabb_collision(e1, e2):
-                        self.collision_pairs.append(pair)
-                        self._resolve_collision(e1, e2)
+        entities = self.entities
+        order = self._sap_order
+        if len(order) != len(entities) or not all(eid in entities for eid in order):
+            order[:] = entities.keys()
+        order.sort(key=lambda eid: (entities[eid].x, eid))
+        
+        pairs = self.collision_pairs
+        active: List[Entity] = []
+        for eid in order:
+            b = entities[eid]
+            bx = b.x
+            active = [a for a in active if a.x + a.width > bx]
+            for a in active:
+                if _aabb_overlap(a.x, a.y, a.width, a.height, bx, b.y, b.width, b.height):
+                    ax, ay, bx, by, axis = _resolve_overlap(a.x, a.y, a.width, a.height,
+                                                            bx, b.y, b.width, b.height,
+                                                            a.vx - b.vx, a.vy - b.vy)
+                    self._apply_resolution(a, b, ax, ay, bx, by, axis)
+                    aid = a.entity_id
+                    pairs.append((aid << 32) | eid if aid < eid else (eid << 32) | aid)
+            active.append(b)
+    
+    def _collide_cells(self, cells: dict, group: List[Tuple[int, int]]) -> List[int]:
+        """
+        处理一组单元格（单元格内部 + 半模板邻居）
+        
+        Args:
+            cells: 单元格 -> SoA 元组
+            group: 要处理的单元格列表
+        
+        Returns:
+            本组检测到的碰撞对
+        """
+        pairs = []
+        for cell in group:
+            soa = cells[cell]
+            n = len(soa[0])
             
-            # 检查相邻单元格
-            cx, cy = cell
-            neighbors = [(-1,0), (0,-1), (-1,-1), (1,-1)]
+            # 单元格内部
+            for i in range(n - 1):
+                self._collide_row(soa, i, soa, i + 1, pairs)
             
-            for dx, dy in neighbors:
-                neighbor = (cx + dx, cy + dy)
-                if neighbor not in self.spatial_grid:
+            # 相邻单元格
+            cx, cy = cell
+            for dx, dy in _NEIGHBOR_OFFSETS:
+                other = cells.get((cx + dx, cy + dy))
+                if other is None:
                     continue
-                    
-                for eid1 in entity_ids:
-                    for eid2 in self.spatial_grid[neighbor]:
-                        pair = (min(eid1, eid2), max(eid1, eid2))
-                        if pair in checked:
-                            continue
-                        checked.add(pair)
-                        
-                        e1 = self.entities[eid1]
-                        e2 = self.entities[eid2]
-                        if self._check_aabb_collision(e1, e2):
-                            self.collision_pairs.append(pair)
-                            self._resolve_collision(e1, e2)
+                for i in range(n):
+                    self._collide_row(soa, i, other, 0, pairs)
+        return pairs
+    
+    def _collide_row(self, a_soa: tuple, i: int, b_soa: tuple, start: int,
+                     pairs: List[int]):
+        """
+        用 A 的第 i 个实体扫描 B 中从 start 开始的所有候选
+        
+        命中后立即解决碰撞并同步回写 SoA 列表，然后从下一个候选继续扫描，
+        与逐对检测的处理顺序和结果完全一致。
+        
+        Args:
+            a_soa: (实体列表, xs, ys, ws, hs)
+            i: A 中的实体下标
+            b_soa: (实体列表, xs, ys, ws, hs)
+            start: B 中开始扫描的下标
+            pairs: 碰撞对输出列表
+        """
+        a_ents, axs, ays, aws, ahs = a_soa
+        b_ents, bxs, bys, bws, bhs = b_soa
+        ax = axs[i]
+        ay = ays[i]
+        aw = aws[i]
+        ah = ahs[i]
+        
+        j = _aabb_scan(ax, ay, aw, ah, bxs, bys, bws, bhs, start)
+        while j >= 0:
+            a = a_ents[i]
+            b = b_ents[j]
+            ax, ay, bx, by, axis = _resolve_overlap(ax, ay, aw, ah,
+                                                    bxs[j], bys[j], bws[j], bhs[j],
+                                                    a.vx - b.vx, a.vy - b.vy)
+            if axis >= 0:
+                self._apply_resolution(a, b, ax, ay, bx, by, axis)
+                axs[i] = ax
+                ays[i] = ay
+                bxs[j] = bx
+                bys[j] = by
+            
+            eid1 = a.entity_id
+            eid2 = b.entity_id
+            pairs.append((eid1 << 32) | eid2 if eid1 < eid2 else (eid2 << 32) | eid1)
+            
+            j = _aabb_scan(ax, ay, aw, ah, bxs, bys, bws, bhs, j + 1)
     
     def _check_aabb_collision(self, a: Entity, b: Entity) -> bool:
         """AABB 碰撞检测"""
-        return (a.x < b.x + b.width and
-                a.x + a.width > b.x and
-                a.y < b.y + b.height and
-                a.y + a.height > b.y)
+        return _aabb_overlap(a.x, a.y, a.width, a.height,
+                             b.x, b.y, b.width, b.height)
     
     def _resolve_collision(self, a: Entity, b: Entity):
         """解决碰撞"""
-        overlap_x = min(a.x + a.width - b.x, b.x + b.width - a.x)
-        overlap_y = min(a.y + a.height - b.y, b.y + b.height - a.y)
-        
-        if overlap_x < overlap_y:
-            if a.x < b.x:
-                a.x -= overlap_x // 2
-                b.x += overlap_x // 2
-            else:
-                a.x += overlap_x // 2
-                b.x -= overlap_x // 2
+        ax, ay, bx, by, axis = _resolve_overlap(a.x, a.y, a.width, a.height,
+                                                b.x, b.y, b.width, b.height,
+                                                a.vx - b.vx, a.vy - b.vy)
+        self._apply_resolution(a, b, ax, ay, bx, by, axis)
+    
+    @staticmethod
+    def _apply_resolution(a: Entity, b: Entity, ax: int, ay: int,
+                          bx: int, by: int, axis: int):
+        """将 _resolve_overlap 的结果写回实体，并清零分离轴上的速度"""
+        if axis < 0:
+            return
+        a.x = ax
+        a.y = ay
+        b.x = bx
+        b.y = by
+        if axis == 0:
             a.vx = 0
             b.vx = 0
         else:
-            if a.y < b.y:
-                a.y -= overlap_y // 2
-                b.y += overlap_y // 2
-            else:
-                a.y += overlap_y // 2
-                b.y -= overlap_y // 2
             a.vy = 0
             b.vy = 0
     
@@ -428,6 +773,89 @@ class PhysicsEngine:
         entity.vx = vx
         entity.vy = vy
     
+    def batch_apply_inputs(self, inputs: Iterable[Tuple[int, int]], speed: int = None):
+        """
+        批量应用玩家输入
+        
+        结果与对每一项调用 apply_input() 相同，但标志位和速度只解析一次，
+        每个实体只剩一次字典查找和两次属性写入。
+        
+        Args:
+            inputs: (实体ID, 输入标志位) 的迭代器，字典可传入 .items()
+            speed: 移动速度（定点数），默认从配置读取
+        """
+        if speed is None:
+            speed = int(self._cfg.game.PLAYER_SPEED * FixedPoint.SCALE)
+        
+        from .input import InputFlags
+        
+        left = int(InputFlags.MOVE_LEFT)
+        right = int(InputFlags.MOVE_RIGHT)
+        up = int(InputFlags.MOVE_UP)
+        down = int(InputFlags.MOVE_DOWN)
+        entities = self.entities
+        
+        for entity_id, input_flags in inputs:
+            entity = entities.get(entity_id)
+            if entity is None:
+                continue
+            entity.vx = (speed if input_flags & right else 0) - (speed if input_flags & left else 0)
+            entity.vy = (speed if input_flags & down else 0) - (speed if input_flags & up else 0)
+    
+    def get_collision_pairs(self) -> List[Tuple[int, int]]:
+        """
+        获取当前帧碰撞对的元组形式
+        
+        Returns:
+            [(较小ID, 较大ID), ...]
+        """
+        return [unpack_pair_key(key) for key in self.collision_pairs]
+    
+    def capture_state(self, state: Optional[PhysicsState] = None) -> PhysicsState:
+        """
+        把当前所有实体打包为 SoA 状态
+        
+        Args:
+            state: 可复用的 PhysicsState（避免重复分配），为 None 时新建
+        
+        Returns:
+            PhysicsState 实例
+        """
+        if state is None:
+            state = PhysicsState(len(self.entities))
+        state.load(self.entities.values())
+        return state
+    
+    def restore_state(self, state: PhysicsState):
+        """
+        从 SoA 状态恢复
+        
+        已存在的实体原地写回（保持对象引用不变，GameState 等持有者无需更新），
+        缺失的实体新建，状态中没有的实体被移除。
+        
+        Args:
+            state: capture_state() 得到的状态
+        """
+        entities = self.entities
+        for eid in list(entities.keys()):
+            if state.slot_of(eid) is None:
+                self.remove_entity(eid)
+        
+        for slot in range(state.count):
+            eid = state.entity_id[slot]
+            entity = entities.get(eid)
+            if entity is None:
+                entity = Entity(entity_id=eid)
+                entities[eid] = entity
+            entity.x = state.x[slot]
+            entity.y = state.y[slot]
+            entity.vx = state.vx[slot]
+            entity.vy = state.vy[slot]
+            entity.set_size(state.width[slot], state.height[slot])
+            entity.hp = state.hp[slot]
+            entity.max_hp = state.max_hp[slot]
+            entity.flags = state.flags[slot]
+    
     def serialize_state(self) -> dict:
         """序列化当前物理状态"""
         return {
@@ -435,16 +863,121 @@ class PhysicsEngine:
                 eid: entity.serialize() 
                 for eid, entity in self.entities.items()
             },
-            'collisions': self.collision_pairs.copy()
+            'collisions': self.get_collision_pairs()
         }
     
     def deserialize_state(self, state: dict):
         """反序列化物理状态"""
         self.entities.clear()
+        self._grid_valid = False
         for eid, data in state.get('entities', {}).items():
             self.entities[int(eid)] = Entity.deserialize(data)
 
 
+def pair_key(eid1: int, eid2: int) -> int:
+    """
+    碰撞对的整数键：(较小ID << 32) | 较大ID
+    
+    比 (min, max) 元组少一次分配，哈希也更便宜。要求实体ID在 uint32 范围内。
+    """
+    if eid1 > eid2:
+        eid1, eid2 = eid2, eid1
+    return (eid1 << 32) | eid2
+
+
+def unpack_pair_key(key: int) -> Tuple[int, int]:
+    """pair_key() 的逆运算"""
+    return (key >> 32, key & 0xFFFFFFFF)
+
+
+# 邻居半模板：左、上、左上、右上，每个无序单元格对只访问一次
+_NEIGHBOR_OFFSETS = ((-1, 0), (0, -1), (-1, -1), (1, -1))
+
+
+# ==================== 碰撞内核（纯整数） ====================
+#
+# 只接收/返回整数，不访问任何对象属性，便于逐对调用时减少属性查找，
+# 也是将来替换为编译扩展时的唯一边界。
+
+def _aabb_overlap(ax: int, ay: int, aw: int, ah: int,
+                  bx: int, by: int, bw: int, bh: int) -> bool:
+    """
+    AABB 相交测试
+    
+    Args:
+        ax, ay, aw, ah: 实体 A 的位置和尺寸（定点数）
+        bx, by, bw, bh: 实体 B 的位置和尺寸（定点数）
+    
+    Returns:
+        True 如果两个包围盒相交
+    """
+    return ax < bx + bw and ax + aw > bx and ay < by + bh and ay + ah > by
+
+
+def _aabb_scan(ax: int, ay: int, aw: int, ah: int,
+               xs: List[int], ys: List[int], ws: List[int], hs: List[int],
+               start: int) -> int:
+    """
+    批量 AABB 测试：在候选列表中查找第一个与 A 相交的下标
+    
+    候选以并列整数列表（SoA）给出，循环内只有局部变量和列表索引。
+    
+    Args:
+        ax, ay, aw, ah: 实体 A 的位置和尺寸（定点数）
+        xs, ys, ws, hs: 候选实体的位置和尺寸列表
+        start: 开始扫描的下标
+    
+    Returns:
+        第一个相交候选的下标，没有则返回 -1
+    """
+    ax2 = ax + aw
+    ay2 = ay + ah
+    for j in range(start, len(xs)):
+        bx = xs[j]
+        if ax < bx + ws[j] and ax2 > bx:
+            by = ys[j]
+            if ay < by + hs[j] and ay2 > by:
+                return j
+    return -1
+
+
+def _resolve_overlap(ax: int, ay: int, aw: int, ah: int,
+                     bx: int, by: int, bw: int, bh: int,
+                     rvx: int = 0, rvy: int = 0) -> Tuple[int, int, int, int, int]:
+    """
+    沿最小穿透轴把两个实体各推开一半重叠量
+    
+    如果两者沿该轴已经在相互远离（相对速度与相对位置同号），
+    则不做任何修正，交给下一帧的运动自然分开。
+    
+    Args:
+        ax, ay, aw, ah: 实体 A 的位置和尺寸（定点数）
+        bx, by, bw, bh: 实体 B 的位置和尺寸（定点数）
+        rvx, rvy: A 相对 B 的速度（A.v - B.v）
+    
+    Returns:
+        (ax, ay, bx, by, axis) 元组，axis 为 0 表示沿 X 轴分离，1 表示沿 Y 轴，
+        -1 表示正在远离、位置未修改
+    """
+    overlap_x = min(ax + aw - bx, bx + bw - ax)
+    overlap_y = min(ay + ah - by, by + bh - ay)
+    
+    if overlap_x < overlap_y:
+        if rvx * (ax - bx) > 0:
+            return ax, ay, bx, by, -1
+        half = overlap_x // 2
+        if ax < bx:
+            return ax - half, ay, bx + half, by, 0
+        return ax + half, ay, bx - half, by, 0
+    
+    if rvy * (ay - by) > 0:
+        return ax, ay, bx, by, -1
+    half = overlap_y // 2
+    if ay < by:
+        return ax, ay - half, bx, by + half, 1
+    return ax, ay + half, bx, by - half, 1
+
+
 def distance_squared(a: Entity, b: Entity) -> int:
     """计算两实体间距离的平方"""
     dx = a.x - b.x
@@ -1,16 +1,72 @@
 """
 Replay recording and playback system
+
+文件格式（4 字节魔数 + 负载）：
+- FSRZ: msgpack + zstd（需要可选依赖 zstandard）
+- FSRD: msgpack + 带字典的 zstd，魔数后跟 4 字节字典ID（读取时需提供同一字典）
+- FSRM: msgpack + zlib
+- FSRU: msgpack（不压缩）
+- FSRS: 流式录制，魔数后跟 1 字节压缩方式，之后是（可压缩的）
+  长度前缀 msgpack 记录流：首条为文件头，其余每条一帧 (frame_id, inputs, timestamp)
+- FSRP / FSRJ: 旧版 JSON + zlib / 纯 JSON，仅用于读取
 """
 
+import bisect
 import json
+import struct
+import sys
 import time
 import zlib
-from typing import List, Dict, Optional, Any
+from array import array
+from collections.abc import Sequence
+from itertools import compress, islice
+from typing import List, Dict, Optional, Any, Iterable
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
 
+import msgpack
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖：缺失时退回 zlib
+    zstandard = None
+
+
+MAGIC_MSGPACK_ZSTD = b'FSRZ'
+MAGIC_MSGPACK_ZSTD_DICT = b'FSRD'
+MAGIC_MSGPACK_ZLIB = b'FSRM'
+MAGIC_MSGPACK = b'FSRU'
+MAGIC_STREAM = b'FSRS'
+MAGIC_JSON_ZLIB = b'FSRP'
+MAGIC_JSON = b'FSRJ'
+
+_DICT_ID = struct.Struct('<I')
+_RECORD_LEN = struct.Struct('<I')
+
+# FSRS 流的压缩方式
+STREAM_RAW = 0
+STREAM_ZLIB = 1
+STREAM_ZSTD = 2
+
+
+def _array_to_bytes(arr: array) -> bytes:
+    """array 转小端字节串（文件格式与平台字节序无关）"""
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
 
-@dataclass
+
+def _array_from_bytes(typecode: str, data: bytes) -> array:
+    """小端字节串还原为 array"""
+    arr = array(typecode)
+    arr.frombytes(data)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+
+@dataclass(slots=True)
 class ReplayFrame:
     """回放帧数据"""
     frame_id: int
@@ -31,9 +87,57 @@ class ReplayFrame:
             inputs={int(k): bytes(v) for k, v in data['i'].items()},
             timestamp=data.get('t', 0.0)
         )
+    
+    def to_tuple(self) -> tuple:
+        """msgpack 格式：int 键和 bytes 原样保留，无需转换"""
+        return (self.frame_id, self.inputs, self.timestamp)
+    
+    @classmethod
+    def from_tuple(cls, data) -> 'ReplayFrame':
+        return cls(frame_id=data[0], inputs=data[1], timestamp=data[2])
+
 
+# 单帧 msgpack 体积估算：帧ID/时间戳列各 8 字节 + 输入表头 1 字节，
+# 每个输入额外有键 1 字节 + bin 头 2 字节
+_FRAME_SIZE_OVERHEAD = 17
+_INPUT_SIZE_OVERHEAD = 3
 
-@dataclass
+
+def _estimate_inputs_size(inputs: Dict[int, bytes]) -> int:
+    """估算一帧的序列化体积（字节）"""
+    return _FRAME_SIZE_OVERHEAD + sum(_INPUT_SIZE_OVERHEAD + len(v) for v in inputs.values())
+
+
+class ReplayFrameView(Sequence):
+    """
+    录制器帧数据的只读序列视图
+    
+    录制器按列存储（帧ID / 时间戳 / 输入三个并行数组），
+    索引时才临时构造 ReplayFrame，兼容原来 recorder.frames 的用法。
+    """
+    
+    __slots__ = ('_recorder',)
+    
+    def __init__(self, recorder: 'ReplayRecorder'):
+        self._recorder = recorder
+    
+    def __len__(self) -> int:
+        return len(self._recorder.frame_ids)
+    
+    def __getitem__(self, index):
+        rec = self._recorder
+        if isinstance(index, slice):
+            return [ReplayFrame(fid, inputs, ts) for fid, inputs, ts in
+                    zip(rec.frame_ids[index], rec.inputs[index], rec.timestamps[index])]
+        return ReplayFrame(rec.frame_ids[index], rec.inputs[index], rec.timestamps[index])
+    
+    def __iter__(self):
+        rec = self._recorder
+        for fid, inputs, ts in zip(rec.frame_ids, rec.inputs, rec.timestamps):
+            yield ReplayFrame(fid, inputs, ts)
+
+
+@dataclass(slots=True)
 class ReplayHeader:
     """回放文件头"""
     version: str = "1.0"
@@ -54,12 +158,121 @@ class ReplayHeader:
         return cls(**data)
 
 
+class ReplayStreamWriter:
+    """
+    流式回放写入器（FSRS 格式）
+    
+    每条记录编码后立即写入（压缩）文件，内存占用与录制时长无关。
+    """
+    
+    def __init__(self, filename: str, header: 'ReplayHeader', compress: bool = True):
+        """
+        打开文件并写入文件头记录
+        
+        Args:
+            filename: 文件名
+            header: 回放文件头
+            compress: 是否压缩（优先 zstd，否则 zlib）
+        """
+        self._fp = open(filename, 'wb')
+        self._zlib = None
+        self._zstd = None
+        
+        if not compress:
+            codec = STREAM_RAW
+        elif zstandard is not None:
+            codec = STREAM_ZSTD
+            self._zstd = zstandard.ZstdCompressor(level=6).stream_writer(self._fp, closefd=False)
+        else:
+            codec = STREAM_ZLIB
+            self._zlib = zlib.compressobj(6)
+        
+        self._fp.write(MAGIC_STREAM)
+        self._fp.write(bytes((codec,)))
+        self._packer = msgpack.Packer(use_bin_type=True)
+        self.write_record(header.to_dict())
+    
+    def write_record(self, obj):
+        """写入一条长度前缀 msgpack 记录"""
+        buf = self._packer.pack(obj)
+        data = _RECORD_LEN.pack(len(buf)) + buf
+        if self._zstd is not None:
+            self._zstd.write(data)
+        elif self._zlib is not None:
+            self._fp.write(self._zlib.compress(data))
+        else:
+            self._fp.write(data)
+    
+    def write_frame(self, frame_id: int, inputs: Dict[int, bytes], timestamp: float):
+        """写入一帧"""
+        self.write_record((frame_id, inputs, timestamp))
+    
+    def close(self):
+        """刷新压缩器并关闭文件"""
+        if self._zstd is not None:
+            self._zstd.flush(zstandard.FLUSH_FRAME)
+        elif self._zlib is not None:
+            self._fp.write(self._zlib.flush())
+        self._fp.close()
+
+
+def _iter_stream_chunks(fp, codec: int, chunk_size: int = 65536):
+    """按 FSRS 压缩方式逐块读取并解压（容忍截断的压缩流）"""
+    if codec == STREAM_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd replay requires the 'zstandard' package")
+        yield from zstandard.ZstdDecompressor().read_to_iter(fp, read_size=chunk_size)
+    elif codec == STREAM_ZLIB:
+        decompressor = zlib.decompressobj()
+        while chunk := fp.read(chunk_size):
+            yield decompressor.decompress(chunk)
+    elif codec == STREAM_RAW:
+        while chunk := fp.read(chunk_size):
+            yield chunk
+    else:
+        raise ValueError(f"Unknown replay stream codec: {codec}")
+
+
+def _read_stream(filename: str):
+    """
+    逐条读取 FSRS 文件中的记录（首条为文件头，其余为帧元组）
+    
+    只缓冲当前数据块，内存占用与文件长度无关。
+    末尾不完整的记录（录制中途崩溃）会被忽略。
+    """
+    with open(filename, 'rb') as fp:
+        magic = fp.read(4)
+        if magic != MAGIC_STREAM:
+            raise ValueError(f"Not a streamed replay file: {magic}")
+        codec = fp.read(1)[0]
+        
+        buf = bytearray()
+        header_size = _RECORD_LEN.size
+        for chunk in _iter_stream_chunks(fp, codec):
+            buf += chunk
+            offset = 0
+            while len(buf) - offset >= header_size:
+                (length,) = _RECORD_LEN.unpack_from(buf, offset)
+                start = offset + header_size
+                if len(buf) - start < length:
+                    break
+                yield msgpack.unpackb(buf[start:start + length], raw=False, strict_map_key=False)
+                offset = start + length
+            del buf[:offset]
+
+
 class ReplayRecorder:
     """
     回放录制器
     
     只记录输入，不记录完整状态
     文件很小，适合长时间录制
+    
+    重构说明：
+    - 帧数据按列存储：frame_ids(array q) / timestamps(array d) / inputs(list)
+    - 不再为每帧保留一个 ReplayFrame 对象，frames 属性返回按需构造的视图
+    - start_recording 传入 stream_to 时边录边写盘（FSRS），内存中不保留帧
+    - open 只读取 FSRS 文件头，iter_frames 逐帧从文件解码
     """
     
     def __init__(self, player_count: int = 2, seed: int = 0):
@@ -75,84 +288,182 @@ class ReplayRecorder:
             seed=seed,
             start_time=time.time()
         )
-        self.frames: List[ReplayFrame] = []
+        self.frame_ids = array('q')
+        self.timestamps = array('d')
+        self.inputs: List[Dict[int, bytes]] = []
         self.is_recording = False
         self.player_ids: List[int] = []
-    
-    def start_recording(self, player_ids: List[int], metadata: dict = None):
+        # 体积估算随录制累加；精确体积按需序列化并缓存到下一次修改
+        self._size_estimate = 0
+        self._exact_size: Optional[int] = None
+        self._stream: Optional[ReplayStreamWriter] = None
+        self._last_timestamp = 0.0
+        # open() 打开的 FSRS 文件；不为 None 时帧不在内存中，通过 iter_frames 读取
+        self.source: Optional[str] = None
+    
+    @property
+    def frames(self) -> ReplayFrameView:
+        """帧序列视图（按需构造 ReplayFrame）"""
+        return ReplayFrameView(self)
+    
+    @frames.setter
+    def frames(self, frames: Iterable[ReplayFrame]):
+        self._clear_frames()
+        for frame in frames:
+            self.frame_ids.append(frame.frame_id)
+            self.timestamps.append(frame.timestamp)
+            self.inputs.append(frame.inputs)
+        self._recount_size()
+    
+    def iter_frames(self):
+        """
+        逐帧迭代
+        
+        由 open() 打开时从文件逐帧解码，任一时刻只构造当前帧；否则遍历内存中的帧。
+        
+        Yields:
+            ReplayFrame
+        """
+        if self.source is None:
+            yield from self.frames
+            return
+        records = _read_stream(self.source)
+        next(records, None)  # 跳过文件头
+        for record in records:
+            yield ReplayFrame.from_tuple(record)
+    
+    def _clear_frames(self):
+        """清空帧数据"""
+        self.frame_ids = array('q')
+        self.timestamps = array('d')
+        self.inputs = []
+        self._size_estimate = 0
+        self._exact_size = None
+    
+    def _recount_size(self):
+        """整体替换帧数据后重新计算体积估算"""
+        self._size_estimate = sum(_estimate_inputs_size(i) for i in self.inputs)
+        self._exact_size = None
+    
+    def start_recording(self, player_ids: List[int], metadata: dict = None,
+                        stream_to: Optional[str] = None, compress: bool = True):
         """
         开始录制
         
         Args:
             player_ids: 玩家ID列表
             metadata: 额外元数据
+            stream_to: 流式写入的文件名；为 None 时帧保存在内存中，由 save 写盘
+            compress: 流式写入时是否压缩
         """
         self.player_ids = player_ids
         self.header.player_ids = player_ids
         self.header.start_time = time.time()
         self.header.metadata = metadata or {}
-        self.frames.clear()
+        self.header.frame_count = 0
+        self._clear_frames()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        if stream_to is not None:
+            self._stream = ReplayStreamWriter(stream_to, self.header, compress)
         self.is_recording = True
     
-    def record_frame(self, frame_id: int, inputs: Dict[int, bytes]):
+    def record_frame(self, frame_id: int, inputs: Dict[int, bytes], *, copy: bool = False):
         """
         记录一帧
         
+        默认直接保存传入的 inputs 字典（所有权转交给录制器，调用方之后不应再修改）。
+        需要继续复用该字典的调用方传 copy=True。
+        
         Args:
             frame_id: 帧ID
             inputs: 玩家输入 {player_id: input_data}
+            copy: 是否复制 inputs
         """
         if not self.is_recording:
             return
         
-        replay_frame = ReplayFrame(
-            frame_id=frame_id,
-            inputs=inputs.copy(),
-            timestamp=time.time()
-        )
-        self.frames.append(replay_frame)
+        if self._stream is not None:
+            self._last_timestamp = time.time()
+            self._stream.write_frame(frame_id, inputs, self._last_timestamp)
+            self.header.frame_count += 1
+            return
+        
+        self.frame_ids.append(frame_id)
+        self.timestamps.append(time.time())
+        self.inputs.append(inputs.copy() if copy else inputs)
+        self._size_estimate += _estimate_inputs_size(inputs)
+        self._exact_size = None
     
     def stop_recording(self):
-        """停止录制"""
-        if self.frames:
-            self.header.duration = self.frames[-1].timestamp - self.header.start_time
-            self.header.frame_count = len(self.frames)
+        """停止录制（流式录制时关闭文件）"""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+            if self.header.frame_count:
+                self.header.duration = self._last_timestamp - self.header.start_time
+        elif self.timestamps:
+            self.header.duration = self.timestamps[-1] - self.header.start_time
+            self.header.frame_count = len(self.timestamps)
+            self._exact_size = None
         self.is_recording = False
     
-    def save(self, filename: str, compress: bool = True):
+    def save(self, filename: str, compress: bool = True, zstd_dict: Optional[bytes] = None):
         """
         保存回放文件
         
+        使用 msgpack 编码；压缩时优先 zstd（已安装 zstandard），否则 zlib。
+        帧ID和时间戳列直接以小端字节串写入，输入列为 list。
+        
         Args:
             filename: 文件名
             compress: 是否压缩
+            zstd_dict: zstd 字典（见 train_replay_dictionary），需要 zstandard
         """
         self.stop_recording()
         
-        data = {
-            'header': self.header.to_dict(),
-            'frames': [f.to_dict() for f in self.frames]
-        }
-        
-        json_data = json.dumps(data, separators=(',', ':')).encode('utf-8')
-        
-        if compress:
-            json_data = zlib.compress(json_data, level=9)
+        payload = self._pack()
+        prefix = b''
+        
+        if not compress:
+            magic = MAGIC_MSGPACK
+        elif zstd_dict is not None:
+            if zstandard is None:
+                raise ValueError("zstd dictionary requires the 'zstandard' package")
+            magic = MAGIC_MSGPACK_ZSTD_DICT
+            dict_data = zstandard.ZstdCompressionDict(zstd_dict)
+            prefix = _DICT_ID.pack(dict_data.dict_id())
+            payload = zstandard.ZstdCompressor(level=9, dict_data=dict_data).compress(payload)
+        elif zstandard is not None:
+            magic = MAGIC_MSGPACK_ZSTD
+            payload = zstandard.ZstdCompressor(level=9).compress(payload)
+        else:
+            magic = MAGIC_MSGPACK_ZLIB
+            payload = zlib.compress(payload, level=9)
         
         with open(filename, 'wb') as f:
-            if compress:
-                f.write(b'FSRP')  # Frame Sync Replay (compressed)
-            else:
-                f.write(b'FSRJ')  # Frame Sync Replay (JSON)
-            f.write(json_data)
+            f.write(magic)
+            f.write(prefix)
+            f.write(payload)
+    
+    def _pack(self) -> bytes:
+        """序列化为未压缩的 msgpack 负载"""
+        return msgpack.packb({
+            'header': self.header.to_dict(),
+            'frame_ids': _array_to_bytes(self.frame_ids),
+            'timestamps': _array_to_bytes(self.timestamps),
+            'inputs': self.inputs
+        }, use_bin_type=True)
     
     @classmethod
-    def load(cls, filename: str) -> 'ReplayRecorder':
+    def load(cls, filename: str, zstd_dict: Optional[bytes] = None) -> 'ReplayRecorder':
         """
         加载回放文件
         
         Args:
             filename: 文件名
+            zstd_dict: 保存时使用的 zstd 字典（仅 FSRD 格式需要）
         
         Returns:
             ReplayRecorder 实例
@@ -161,28 +472,143 @@ class ReplayRecorder:
             magic = f.read(4)
             data = f.read()
         
-        if magic == b'FSRP':
-            data = zlib.decompress(data)
-        elif magic != b'FSRJ':
-            raise ValueError(f"Invalid replay file format: {magic}")
+        recorder = cls()
         
-        parsed = json.loads(data.decode('utf-8'))
+        if magic in (MAGIC_MSGPACK_ZSTD, MAGIC_MSGPACK_ZSTD_DICT, MAGIC_MSGPACK_ZLIB, MAGIC_MSGPACK):
+            if magic == MAGIC_MSGPACK_ZSTD_DICT:
+                if zstandard is None:
+                    raise ValueError("zstd replay requires the 'zstandard' package")
+                if zstd_dict is None:
+                    raise ValueError("replay was compressed with a zstd dictionary")
+                dict_data = zstandard.ZstdCompressionDict(zstd_dict)
+                (dict_id,) = _DICT_ID.unpack_from(data)
+                if dict_id != dict_data.dict_id():
+                    raise ValueError(f"zstd dictionary mismatch: file {dict_id}, given {dict_data.dict_id()}")
+                data = zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data[_DICT_ID.size:])
+            elif magic == MAGIC_MSGPACK_ZSTD:
+                if zstandard is None:
+                    raise ValueError("zstd replay requires the 'zstandard' package")
+                data = zstandard.ZstdDecompressor().decompress(data)
+            elif magic == MAGIC_MSGPACK_ZLIB:
+                data = zlib.decompress(data)
+            
+            parsed = msgpack.unpackb(data, raw=False, strict_map_key=False)
+            if 'frames' in parsed:
+                # 早期 msgpack 格式：每帧一个元组
+                recorder.frames = [ReplayFrame.from_tuple(f) for f in parsed['frames']]
+            else:
+                recorder.frame_ids = _array_from_bytes('q', parsed['frame_ids'])
+                recorder.timestamps = _array_from_bytes('d', parsed['timestamps'])
+                recorder.inputs = parsed['inputs']
+                recorder._recount_size()
+        
+        elif magic == MAGIC_STREAM:
+            records = _read_stream(filename)
+            header = next(records, None)
+            if header is None:
+                raise ValueError("Truncated replay stream")
+            parsed = {'header': header}
+            recorder.frames = [ReplayFrame.from_tuple(f) for f in records]
+            # 文件头在录制开始时写入，帧数和时长由帧记录得出
+            if recorder.timestamps:
+                parsed['header']['frame_count'] = len(recorder.timestamps)
+                parsed['header']['duration'] = recorder.timestamps[-1] - parsed['header']['start_time']
+        
+        elif magic in (MAGIC_JSON_ZLIB, MAGIC_JSON):
+            if magic == MAGIC_JSON_ZLIB:
+                data = zlib.decompress(data)
+            parsed = json.loads(data.decode('utf-8'))
+            recorder.frames = [ReplayFrame.from_dict(f) for f in parsed['frames']]
+        
+        else:
+            raise ValueError(f"Invalid replay file format: {magic}")
         
-        recorder = cls()
         recorder.header = ReplayHeader.from_dict(parsed['header'])
-        recorder.frames = [ReplayFrame.from_dict(f) for f in parsed['frames']]
         recorder.player_ids = recorder.header.player_ids
         
         return recorder
     
+    @classmethod
+    def open(cls, filename: str) -> 'ReplayRecorder':
+        """
+        打开流式回放文件（FSRS），不在内存中保留帧
+        
+        帧通过 iter_frames 按需解码。文件头在录制开始时写入，
+        帧数和时长由一次逐条扫描得出。其他格式没有逐帧边界，退回 load。
+        
+        Args:
+            filename: 文件名
+        
+        Returns:
+            ReplayRecorder 实例
+        """
+        with open(filename, 'rb') as f:
+            magic = f.read(4)
+        if magic != MAGIC_STREAM:
+            return cls.load(filename)
+        
+        records = _read_stream(filename)
+        header = next(records, None)
+        if header is None:
+            raise ValueError("Truncated replay stream")
+        frame_count = 0
+        last_timestamp = None
+        for record in records:
+            frame_count += 1
+            last_timestamp = record[2]
+        if frame_count:
+            header['frame_count'] = frame_count
+            header['duration'] = last_timestamp - header['start_time']
+        recorder = cls()
+        recorder.header = ReplayHeader.from_dict(header)
+        recorder.player_ids = recorder.header.player_ids
+        recorder.source = filename
+        return recorder
+    
     def get_stats(self) -> dict:
-        """获取录制统计"""
+        """获取录制统计（file_size_estimate 为未压缩体积的估算值）"""
+        # 流式录制或 open() 打开时帧不在内存中，以文件头计数为准
+        streamed = self._stream is not None or self.source is not None
         return {
-            'frame_count': len(self.frames),
+            'frame_count': self.header.frame_count if streamed else len(self.frame_ids),
             'duration': self.header.duration,
             'player_count': self.header.player_count,
-            'file_size_estimate': len(json.dumps([f.to_dict() for f in self.frames]))
+            'file_size_estimate': self._size_estimate
         }
+    
+    def get_exact_size(self) -> int:
+        """
+        获取未压缩 msgpack 负载的精确体积
+        
+        需要完整序列化一次，结果缓存到下一次录制帧为止。
+        
+        Returns:
+            字节数
+        """
+        if self._exact_size is None:
+            self._exact_size = len(self._pack())
+        return self._exact_size
+
+
+def train_replay_dictionary(recorders: Iterable[ReplayRecorder], dict_size: int = 16384) -> bytes:
+    """
+    用录制样本训练 zstd 字典
+    
+    每帧输入各作为一个样本；输入字节高度重复，字典能显著提高压缩率。
+    训练结果应随发行版一起分发，保存和加载时传入同一份字典。
+    
+    Args:
+        recorders: 录制样本
+        dict_size: 字典大小（字节）
+    
+    Returns:
+        字典字节串
+    """
+    if zstandard is None:
+        raise ValueError("zstd dictionary requires the 'zstandard' package")
+    samples = [msgpack.packb(inputs, use_bin_type=True)
+               for recorder in recorders for inputs in recorder.inputs]
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
 
 
 class ReplayPlayer:
@@ -190,6 +616,9 @@ class ReplayPlayer:
     回放播放器
     
     用于回放录制的游戏
+    
+    录制器由 ReplayRecorder.open 打开（流式）时，逐帧从文件解码；
+    此时跳转需要从头重新读取，总帧数未知时为 0。
     """
     
     def __init__(self, recorder: ReplayRecorder):
@@ -205,16 +634,55 @@ class ReplayPlayer:
         self.playback_speed = 1.0
         self.on_frame_callback = None
         self.on_complete_callback = None
+        # 流式模式状态
+        self._frame_iter = None
+        self._pending: Optional[ReplayFrame] = None
+        self._last_frame: Optional[ReplayFrame] = None
     
     @classmethod
-    def from_file(cls, filename: str) -> 'ReplayPlayer':
-        """从文件创建播放器"""
-        recorder = ReplayRecorder.load(filename)
+    def from_file(cls, filename: str, stream: bool = False) -> 'ReplayPlayer':
+        """
+        从文件创建播放器
+        
+        Args:
+            filename: 文件名
+            stream: 是否流式读取（仅 FSRS 格式有效）
+        """
+        recorder = ReplayRecorder.open(filename) if stream else ReplayRecorder.load(filename)
         return cls(recorder)
     
+    @property
+    def is_streaming(self) -> bool:
+        """是否逐帧从文件读取"""
+        return self.recorder.source is not None
+    
+    def _restart_stream(self, skip: int = 0):
+        """重新打开帧迭代器并跳过前 skip 帧"""
+        self._frame_iter = self.recorder.iter_frames()
+        self._pending = None
+        self._last_frame = None
+        for _ in range(skip):
+            self._last_frame = next(self._frame_iter, None)
+        self.current_frame_index = skip
+    
+    def _seek_stream(self, predicate) -> bool:
+        """流式模式跳转：从头读取到第一个满足条件的帧"""
+        old_index = self.current_frame_index
+        self._restart_stream()
+        for index, frame in enumerate(self._frame_iter):
+            if predicate(frame):
+                self._pending = frame
+                self.current_frame_index = index
+                return True
+            self._last_frame = frame
+        self._restart_stream(old_index)
+        return False
+    
     def play(self):
         """开始播放"""
         self.current_frame_index = 0
+        if self.is_streaming:
+            self._restart_stream()
         self.is_playing = True
     
     def pause(self):
@@ -229,6 +697,9 @@ class ReplayPlayer:
         """停止"""
         self.is_playing = False
         self.current_frame_index = 0
+        self._frame_iter = None
+        self._pending = None
+        self._last_frame = None
     
     def get_next_frame(self) -> Optional[ReplayFrame]:
         """
@@ -240,13 +711,23 @@ class ReplayPlayer:
         if not self.is_playing:
             return None
         
-        if self.current_frame_index >= len(self.recorder.frames):
+        if self.is_streaming:
+            if self._frame_iter is None:
+                self._restart_stream(self.current_frame_index)
+            frame = self._pending or next(self._frame_iter, None)
+            self._pending = None
+        elif self.current_frame_index < len(self.recorder.frames):
+            frame = self.recorder.frames[self.current_frame_index]
+        else:
+            frame = None
+        
+        if frame is None:
             self.is_playing = False
             if self.on_complete_callback:
                 self.on_complete_callback()
             return None
         
-        frame = self.recorder.frames[self.current_frame_index]
+        self._last_frame = frame
         self.current_frame_index += 1
         
         if self.on_frame_callback:
@@ -256,7 +737,7 @@ class ReplayPlayer:
     
     def seek_to_frame(self, frame_id: int) -> bool:
         """
-        跳转到指定帧
+        跳转到指定帧（帧ID按录制顺序递增，二分查找）
         
         Args:
             frame_id: 目标帧ID
@@ -264,15 +745,19 @@ class ReplayPlayer:
         Returns:
             是否成功
         """
-        for i, frame in enumerate(self.recorder.frames):
-            if frame.frame_id >= frame_id:
-                self.current_frame_index = i
-                return True
+        if self.is_streaming:
+            return self._seek_stream(lambda f: f.frame_id >= frame_id)
+        
+        frame_ids = self.recorder.frame_ids
+        i = bisect.bisect_left(frame_ids, frame_id)
+        if i < len(frame_ids):
+            self.current_frame_index = i
+            return True
         return False
     
     def seek_to_time(self, seconds: float) -> bool:
         """
-        跳转到指定时间
+        跳转到指定时间（时间戳按录制顺序递增，二分查找）
         
         Args:
             seconds: 时间（秒）
@@ -281,30 +766,43 @@ class ReplayPlayer:
             是否成功
         """
         target_time = self.recorder.header.start_time + seconds
-        
-        for i, frame in enumerate(self.recorder.frames):
-            if frame.timestamp >= target_time:
-                self.current_frame_index = i
-                return True
+        if self.is_streaming:
+            return self._seek_stream(lambda f: f.timestamp >= target_time)
+        
+        timestamps = self.recorder.timestamps
+        i = bisect.bisect_left(timestamps, target_time)
+        if i < len(timestamps):
+            self.current_frame_index = i
+            return True
         return False
     
     def get_progress(self) -> float:
         """获取播放进度 (0.0 - 1.0)"""
-        if not self.recorder.frames:
+        total = self.get_total_frames()
+        if not total:
             return 0.0
-        return self.current_frame_index / len(self.recorder.frames)
+        return min(self.current_frame_index / total, 1.0)
     
     def get_current_time(self) -> float:
         """获取当前播放时间"""
-        if not self.recorder.frames or self.current_frame_index == 0:
+        if self.current_frame_index == 0:
             return 0.0
         
-        frame = self.recorder.frames[self.current_frame_index - 1]
-        return frame.timestamp - self.recorder.header.start_time
+        if self.is_streaming:
+            if self._last_frame is None:
+                return 0.0
+            timestamp = self._last_frame.timestamp
+        elif self.recorder.timestamps:
+            timestamp = self.recorder.timestamps[self.current_frame_index - 1]
+        else:
+            return 0.0
+        return timestamp - self.recorder.header.start_time
     
     def get_total_frames(self) -> int:
         """获取总帧数"""
-        return len(self.recorder.frames)
+        if self.is_streaming:
+            return self.recorder.header.frame_count
+        return len(self.recorder.frame_ids)
     
     def on_frame(self, callback):
         """设置帧回调"""
@@ -320,10 +818,35 @@ class ReplayAnalyzer:
     回放分析器
     
     用于分析回放数据
+    
+    输入统计在一次遍历中对所有玩家同时累计并缓存，
+    录制继续追加帧时只补算新增部分，generate_report 不再按玩家逐个遍历全部帧。
     """
     
     def __init__(self, recorder: ReplayRecorder):
         self.recorder = recorder
+        # {player_id: [有输入帧数, 空输入帧数]}，覆盖 inputs[:_counted]
+        self._input_counts: Dict[int, List[int]] = {}
+        self._counted = 0
+        self._counted_inputs = None
+    
+    def _update_input_counts(self) -> Dict[int, List[int]]:
+        """补算新增帧的输入统计（帧数据被整体替换时从头重算）"""
+        inputs_list = self.recorder.inputs
+        if inputs_list is not self._counted_inputs or len(inputs_list) < self._counted:
+            self._input_counts = {}
+            self._counted = 0
+            self._counted_inputs = inputs_list
+        
+        counts = self._input_counts
+        for inputs in islice(inputs_list, self._counted, None):
+            for player_id, data in inputs.items():
+                entry = counts.get(player_id)
+                if entry is None:
+                    entry = counts[player_id] = [0, 0]
+                entry[0 if data else 1] += 1
+        self._counted = len(inputs_list)
+        return counts
     
     def get_input_frequency(self, player_id: int) -> dict:
         """
@@ -335,39 +858,29 @@ class ReplayAnalyzer:
         Returns:
             输入频率统计
         """
-        input_count = 0
-        empty_count = 0
-        
-        for frame in self.recorder.frames:
-            if player_id in frame.inputs:
-                if frame.inputs[player_id]:
-                    input_count += 1
-                else:
-                    empty_count += 1
+        input_count, empty_count = self._update_input_counts().get(player_id, (0, 0))
         
+        total = len(self.recorder.inputs)
         return {
-            'total_frames': len(self.recorder.frames),
+            'total_frames': total,
             'input_frames': input_count,
             'empty_frames': empty_count,
-            'input_rate': input_count / len(self.recorder.frames) if self.recorder.frames else 0
+            'input_rate': input_count / total if total else 0
         }
     
     def get_frame_times(self) -> List[float]:
         """获取帧间隔时间"""
-        if len(self.recorder.frames) < 2:
+        ts = self.recorder.timestamps
+        if len(ts) < 2:
             return []
-        
-        times = []
-        for i in range(1, len(self.recorder.frames)):
-            dt = self.recorder.frames[i].timestamp - self.recorder.frames[i-1].timestamp
-            times.append(dt)
-        
-        return times
+        return [b - a for a, b in zip(ts, ts[1:])]
     
     def get_average_frame_time(self) -> float:
-        """获取平均帧时间"""
-        times = self.get_frame_times()
-        return sum(times) / len(times) if times else 0
+        """获取平均帧时间（间隔之和即首尾时间差）"""
+        ts = self.recorder.timestamps
+        if len(ts) < 2:
+            return 0
+        return (ts[-1] - ts[0]) / (len(ts) - 1)
     
     def detect_lag_frames(self, threshold: float = 0.1) -> List[int]:
         """
@@ -379,14 +892,12 @@ class ReplayAnalyzer:
         Returns:
             延迟帧ID列表
         """
-        lag_frames = []
-        times = self.get_frame_times()
-        
-        for i, dt in enumerate(times):
-            if dt > threshold:
-                lag_frames.append(self.recorder.frames[i].frame_id)
-        
-        return lag_frames
+        ts = self.recorder.timestamps
+        fids = self.recorder.frame_ids
+        if len(ts) < 2:
+            return []
+        lagging = [b - a > threshold for a, b in zip(ts, ts[1:])]
+        return list(compress(fids, lagging))
     
     def generate_report(self) -> dict:
         """生成分析报告"""
@@ -6,8 +6,61 @@
 - SeededRNG: 基于线性同余生成器（LCG）的确定性 RNG
 """
 
+import math
 from typing import List
 
+# 2^-32；乘以 2 的幂是精确运算，与除以 2^32 结果完全相同
+_INV_2_32 = 1.0 / 0x100000000
+
+# LCG 参数（Numerical Recipes），SeededRNG.next 直接使用，类常量是它们的别名
+_LCG_MULTIPLIER = 1664525
+_LCG_INCREMENT = 1013904223
+
+
+def _xorshift32_fill(x: int, n: int) -> List[int]:
+    """
+    连续生成 n 个 Xorshift32 输出
+    
+    状态保存在局部变量中，循环内没有属性读写和方法调用。
+    
+    Args:
+        x: 起始状态
+        n: 数量
+    
+    Returns:
+        输出列表（最后一个元素即新的状态）
+    """
+    out = [0] * n
+    for i in range(n):
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        out[i] = x
+    return out
+
+
+def _fisher_yates(x: int, n: int):
+    """
+    用 Xorshift32 对 [0, n) 做 Fisher-Yates 洗牌
+    
+    每步取 j = (next * (i + 1)) >> 32，与逐次调用 range(0, i) 的结果一致。
+    
+    Args:
+        x: 起始状态
+        n: 元素个数
+    
+    Returns:
+        (下标排列, 新状态)
+    """
+    out = list(range(n))
+    for i in range(n - 1, 0, -1):
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        j = (x * (i + 1)) >> 32
+        out[i], out[j] = out[j], out[i]
+    return out, x
+
 
 class DeterministicRNG:
     """
@@ -66,11 +119,30 @@ class DeterministicRNG:
         """
         x = self.state
         x ^= (x << 13) & 0xFFFFFFFF
-        x ^= (x >> 17)
+        x ^= x >> 17
         x ^= (x << 5) & 0xFFFFFFFF
         self.state = x
         return x
     
+    def next_batch(self, n: int) -> List[int]:
+        """
+        批量生成 n 个 32 位无符号整数
+        
+        与连续调用 n 次 next_uint32() 的结果和最终状态完全相同，
+        但只付一次调用开销，适合大批量掷骰、分析工具等场景。
+        
+        Args:
+            n: 数量
+        
+        Returns:
+            随机整数列表
+        """
+        if n <= 0:
+            return []
+        out = _xorshift32_fill(self.state, n)
+        self.state = out[-1]
+        return out
+    
     def next_int(self) -> int:
         """
         生成有符号整数
@@ -84,6 +156,9 @@ class DeterministicRNG:
         """
         生成指定范围的随机整数
         
+        使用 Lemire 乘法-移位映射：(r * span) >> 32，取随机数的高位，
+        没有除法，偏差均匀分散而不是集中在低端（取模的偏差集中在小值上）。
+        
         Args:
             min_val: 最小值（包含）
             max_val: 最大值（包含）
@@ -98,7 +173,30 @@ class DeterministicRNG:
             return min_val
         
         span = max_val - min_val + 1
-        return min_val + (self.next_uint32() % span)
+        return min_val + ((self.next_uint32() * span) >> 32)
+    
+    def range_batch(self, min_val: int, max_val: int, n: int) -> List[int]:
+        """
+        批量生成 n 个指定范围的随机整数
+        
+        与连续调用 n 次 range(min_val, max_val) 的结果和最终状态完全相同，
+        但随机数由 next_batch 一次生成，映射在一个列表推导里完成，
+        没有逐次的方法调用开销。适合每帧大量取随机数的场景（粒子、掉落等）。
+        
+        Args:
+            min_val: 最小值（包含）
+            max_val: 最大值（包含）
+            n: 数量
+        
+        Returns:
+            [min_val, max_val] 范围内的整数列表
+        """
+        if min_val == max_val:
+            # range() 此时不消耗随机数
+            return [min_val] * max(n, 0)
+        
+        span = max_val - min_val + 1
+        return [min_val + ((r * span) >> 32) for r in self.next_batch(n)]
     
     def uniform(self) -> float:
         """
@@ -110,7 +208,21 @@ class DeterministicRNG:
         Returns:
             随机浮点数 [0.0, 1.0)
         """
-        return self.next_uint32() / 0x100000000
+        return self.next_uint32() * _INV_2_32
+    
+    def uniform_batch(self, n: int) -> List[float]:
+        """
+        批量生成 n 个 [0, 1) 范围的浮点数
+        
+        与连续调用 n 次 uniform() 的结果和最终状态完全相同。
+        
+        Args:
+            n: 数量
+        
+        Returns:
+            随机浮点数列表
+        """
+        return [r * _INV_2_32 for r in self.next_batch(n)]
     
     def uniform_range(self, min_val: float, max_val: float) -> float:
         """
@@ -140,8 +252,49 @@ class DeterministicRNG:
         示例:
             if rng.chance(0.3):  # 30% 概率暴击
                 damage *= 2
+        
+        Note:
+            等价于 uniform() < probability，但只做整数比较
+            （见 probability_threshold / chance_threshold）
         """
-        return self.uniform() < probability
+        return self.chance_threshold(self.probability_threshold(probability))
+    
+    @staticmethod
+    def probability_threshold(probability: float) -> int:
+        """
+        概率 -> 32 位整数阈值
+        
+        next_uint32() < 阈值 与 uniform() < probability 完全等价。
+        固定概率（如技能表中的暴击率）可以预先换算并缓存阈值。
+        
+        Args:
+            probability: 概率 [0.0, 1.0]
+        
+        Returns:
+            阈值 [0, 2^32]；NaN 视为 0（与 uniform() < NaN 恒为 False 一致）
+        """
+        if not probability > 0:
+            return 0
+        if probability >= 1:
+            return 0x100000000
+        return math.ceil(probability * 0x100000000)
+    
+    def chance_threshold(self, threshold: int) -> bool:
+        """
+        按预先换算的整数阈值判定
+        
+        Args:
+            threshold: probability_threshold() 的结果
+        
+        Returns:
+            True 以 threshold / 2^32 的概率
+        
+        示例:
+            CRIT_THRESHOLD = DeterministicRNG.probability_threshold(0.3)
+            if rng.chance_threshold(CRIT_THRESHOLD):
+                damage *= 2
+        """
+        return self.next_uint32() < threshold
     
     def pick(self, items: List) -> any:
         """
@@ -177,12 +330,26 @@ class DeterministicRNG:
         示例:
             deck = rng.shuffle(list(range(52)))  # 洗一副牌
         """
-        result = items.copy()
-        n = len(result)
-        for i in range(n - 1, 0, -1):
-            j = self.range(0, i)
-            result[i], result[j] = result[j], result[i]
-        return result
+        return [items[i] for i in self.shuffle_indices(len(items))]
+    
+    def shuffle_indices(self, n: int) -> List[int]:
+        """
+        生成 [0, n) 的确定性随机排列
+        
+        只交换整数下标，调用方按下标取元素（shuffle 即基于此实现），
+        同一张表可以反复按排列取用而不必复制对象列表。
+        
+        Args:
+            n: 元素个数
+        
+        Returns:
+            下标列表
+        
+        示例:
+            order = rng.shuffle_indices(len(spawn_points))
+        """
+        out, self.state = _fisher_yates(self.state, n)
+        return out
     
     def get_state(self) -> int:
         """
@@ -220,15 +387,14 @@ class SeededRNG:
     类常量:
         MULTIPLIER (1664525): LCG 乘数
         INCREMENT (1013904223): LCG 增量
-        MODULUS (2^32): 模数
+        （模数固定为 2^32）
     
     属性:
         state (int): RNG 内部状态
     """
     
-    MULTIPLIER = 1664525
-    INCREMENT = 1013904223
-    MODULUS = 2 ** 32
+    MULTIPLIER = _LCG_MULTIPLIER
+    INCREMENT = _LCG_INCREMENT
     
     def __init__(self, seed: int):
         """
@@ -237,7 +403,7 @@ class SeededRNG:
         Args:
             seed: 随机种子
         """
-        self.state = seed % self.MODULUS
+        self.state = seed & 0xFFFFFFFF
         if self.state == 0:
             self.state = 1
     
@@ -248,8 +414,8 @@ class SeededRNG:
         Returns:
             随机整数 [0, 2^32-1]
         """
-        self.state = (self.MULTIPLIER * self.state + self.INCREMENT) % self.MODULUS
-        return self.state
+        self.state = s = (_LCG_MULTIPLIER * self.state + _LCG_INCREMENT) & 0xFFFFFFFF
+        return s
     
     def range(self, min_val: int, max_val: int) -> int:
         """
@@ -271,4 +437,4 @@ class SeededRNG:
         Returns:
             随机浮点数
         """
-        return self.next() / self.MODULUS
+        return self.next() * _INV_2_32
@@ -3,18 +3,132 @@
 
 本模块提供游戏状态的管理功能：
 - StateSnapshot: 状态快照，用于保存和恢复状态
+- SnapshotRing: 按帧号取模定位的定长快照环
 - GameState: 游戏状态管理器，负责状态更新、快照和恢复
 - StateValidator: 状态校验器，用于检测状态不一致
 """
 
+from collections.abc import Mapping
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any, Union
 import copy
 import json
 import hashlib
 
+import msgpack
 
-@dataclass
+# 状态哈希摘要长度（字节）；十六进制后与原 MD5 同为 32 字符
+HASH_DIGEST_SIZE = 16
+_DIGEST_MASK = (1 << (HASH_DIGEST_SIZE * 8)) - 1
+# 128 位黄金分割常数，用于把 frame_id 混入实体摘要的异或和
+_FRAME_MIX = 0x9E3779B97F4A7C15F39CC0605CEDC835
+
+
+def entity_digest(data: dict) -> int:
+    """
+    单个实体的摘要
+    
+    对实体序列化字典做 msgpack 编码后计算 BLAKE2b。
+    字典包含实体ID，不同实体的摘要不会在异或中互相抵消。
+    
+    Args:
+        data: 实体序列化字典（键顺序由 serialize() 固定）
+    
+    Returns:
+        128 位无符号整数
+    """
+    buf = msgpack.packb(data, use_bin_type=True)
+    return int.from_bytes(hashlib.blake2b(buf, digest_size=HASH_DIGEST_SIZE).digest(), 'big')
+
+
+def frame_digest_seed(frame_id: int) -> int:
+    """状态摘要的初始值（由帧ID决定）"""
+    return (frame_id * _FRAME_MIX) & _DIGEST_MASK
+
+
+def _splitmix64(x: int) -> int:
+    """SplitMix64 混合函数"""
+    x = (x + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+def mix_entity_digest(entity_id: int, digest: int) -> int:
+    """
+    把实体ID混入实体摘要，再参与异或合并
+    
+    数据相同的两个实体（例如不带ID的字典）直接异或会互相抵消；
+    先与 splitmix64(entity_id) 异或再乘奇数常数（模 2^128 下可逆、非线性），
+    不同实体的贡献不会抵消，也不会因数据同步变化而保持不变。
+    
+    Args:
+        entity_id: 实体ID
+        digest: entity_digest 的结果
+    
+    Returns:
+        128 位无符号整数
+    """
+    return ((digest ^ _splitmix64(entity_id)) * _FRAME_MIX) & _DIGEST_MASK
+
+
+def digest_to_hex(digest: int) -> str:
+    """整数摘要 -> 十六进制字符串（仅在网络/日志边界使用）"""
+    return format(digest, '0%dx' % (HASH_DIGEST_SIZE * 2))
+
+
+def hex_to_digest(hex_hash: str) -> int:
+    """十六进制字符串 -> 整数摘要"""
+    return int(hex_hash, 16)
+
+
+def _as_digest(hash_value: Union[int, str]) -> int:
+    """
+    统一为整数摘要：整数原样返回，十六进制字符串（compute_state_hash()
+    的返回值、网络消息中的哈希）经 hex_to_digest 转换
+    """
+    return hash_value if isinstance(hash_value, int) else hex_to_digest(hash_value)
+
+
+# 实体类型 -> 序列化函数
+_SERIALIZERS: Dict[type, Callable[[Any], dict]] = {}
+
+
+def _entity_serializer(cls: type) -> Callable[[Any], dict]:
+    """
+    解析并缓存某个实体类型的序列化函数
+    
+    - 定义了 serialize() 的类型：直接使用类上的函数
+    - dict（从快照恢复的实体）：原样返回
+    - 其他类型：只保留 entity_id
+    
+    Args:
+        cls: 实体类型
+    
+    Returns:
+        接受实体、返回序列化字典的函数
+    """
+    serializer = getattr(cls, 'serialize', None)
+    if serializer is None:
+        if issubclass(cls, dict):
+            serializer = _serialize_dict
+        else:
+            serializer = _serialize_unknown
+    _SERIALIZERS[cls] = serializer
+    return serializer
+
+
+def _serialize_dict(entity: dict) -> dict:
+    """快照恢复的实体已经是序列化字典"""
+    return entity
+
+
+def _serialize_unknown(entity) -> dict:
+    """未知类型的实体只保留ID"""
+    return {'id': getattr(entity, 'entity_id', 0)}
+
+
+@dataclass(slots=True, init=False)
 class StateSnapshot:
     """
     游戏状态快照
@@ -39,34 +153,141 @@ class StateSnapshot:
             可包含游戏模式、地图信息等。
         
         hash (str): 
-            状态的 MD5 哈希值。
+            状态的 BLAKE2b 哈希值（128 位，十六进制）。
             用于快速比较两个状态是否相同。
+            首次访问时才计算并缓存（只用于回滚的快照不必计算）。
+            构造时仍可通过 hash 参数直接给出已知的值。
             例如："a1b2c3d4e5f6..."
     """
     frame_id: int
     entities: Dict[int, dict] = field(default_factory=dict)
     metadata: dict = field(default_factory=dict)
-    hash: str = ""
+    _hash: Optional[str] = field(default=None, repr=False, compare=False)
+    
+    def __init__(self, frame_id: int, entities: Optional[Dict[int, dict]] = None,
+                 metadata: Optional[dict] = None, hash: str = ""):
+        """
+        初始化快照
+        
+        Args:
+            frame_id: 帧ID
+            entities: 实体数据
+            metadata: 元数据
+            hash: 已知的状态哈希；为空时首次访问 hash 才计算
+        """
+        self.frame_id = frame_id
+        self.entities = {} if entities is None else entities
+        self.metadata = {} if metadata is None else metadata
+        self._hash = hash or None
+    
+    @property
+    def hash(self) -> str:
+        """状态哈希（惰性计算，见 compute_hash）"""
+        if self._hash is None:
+            self._hash = self.compute_hash()
+        return self._hash
+    
+    @hash.setter
+    def hash(self, value: str):
+        self._hash = value
     
     def compute_hash(self) -> str:
         """
         计算状态的确定性哈希
         
-        使用 MD5 算法对序列化后的状态计算哈希。
+        每个实体单独计算摘要（见 entity_digest），混入实体ID后
+        （见 mix_entity_digest）与帧ID种子异或合并。
+        异或与顺序无关，不需要按实体ID排序；单个实体的摘要可以缓存，
+        GameState 因此只需重新计算变化过的实体。
         相同的状态永远产生相同的哈希。
         
+        Returns:
+            32字符的十六进制哈希字符串
+        """
+        return digest_to_hex(self.compute_digest())
+    
+    def compute_digest(self) -> int:
+        """
+        计算状态摘要（整数形式）
+        
+        与 compute_hash() 是同一个值，比较和存储时比十六进制字符串更省。
+        
+        Returns:
+            128 位无符号整数
+        """
+        digest = frame_digest_seed(self.frame_id)
+        for eid, data in self.entities.items():
+            digest ^= mix_entity_digest(int(eid), entity_digest(data))
+        return digest
+    
+    def compute_legacy_hash(self) -> str:
+        """
+        旧版哈希（JSON + MD5）
+        
+        仅用于和旧版本客户端/旧快照文件对比，正常流程使用 compute_hash()。
+        sort_keys 已按实体ID排序，无需预先构造有序字典；
+        MD5 只用于一致性比较，usedforsecurity=False 跳过 FIPS 检查。
+        
         Returns:
             32字符的十六进制哈希字符串
         """
         state_str = json.dumps(
-            {
-                'frame': self.frame_id,
-                'entities': {k: v for k, v in sorted(self.entities.items())}
-            },
+            {'frame': self.frame_id, 'entities': self.entities},
             sort_keys=True,
             separators=(',', ':')
         )
-        return hashlib.md5(state_str.encode()).hexdigest()
+        return hashlib.md5(state_str.encode(), usedforsecurity=False).hexdigest()
+
+
+class SnapshotRing(Mapping):
+    """
+    定长快照环
+    
+    预分配 capacity 个槽位，快照存放在 frame_id % capacity 处，
+    覆盖即淘汰，不需要额外的淘汰逻辑；查找时校验槽位中快照的 frame_id。
+    只读接口与 Dict[int, StateSnapshot] 相同（in / [] / get / len / 迭代）。
+    
+    属性:
+        capacity (int): 槽位数（保留最近 capacity 帧内的快照）
+    """
+    
+    __slots__ = ('capacity', '_slots')
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._slots: List[Optional[StateSnapshot]] = [None] * capacity
+    
+    def put(self, snapshot: StateSnapshot):
+        """保存快照（覆盖同一槽位中的旧快照）"""
+        self._slots[snapshot.frame_id % self.capacity] = snapshot
+    
+    def get(self, frame_id: int, default=None) -> Optional[StateSnapshot]:
+        """按帧ID查找快照，槽位已被其他帧覆盖时返回 default"""
+        snapshot = self._slots[frame_id % self.capacity]
+        if snapshot is None or snapshot.frame_id != frame_id:
+            return default
+        return snapshot
+    
+    def __getitem__(self, frame_id: int) -> StateSnapshot:
+        snapshot = self.get(frame_id)
+        if snapshot is None:
+            raise KeyError(frame_id)
+        return snapshot
+    
+    def __contains__(self, frame_id) -> bool:
+        return isinstance(frame_id, int) and self.get(frame_id) is not None
+    
+    def __iter__(self):
+        for snapshot in self._slots:
+            if snapshot is not None:
+                yield snapshot.frame_id
+    
+    def __len__(self) -> int:
+        return self.capacity - self._slots.count(None)
+    
+    def clear(self):
+        """清空所有槽位"""
+        self._slots = [None] * self.capacity
 
 
 class GameState:
@@ -96,10 +317,12 @@ class GameState:
             用于快速查找玩家对应的实体。
             例如：{0: 0, 1: 1} 表示玩家0控制实体0
         
-        snapshots (Dict[int, StateSnapshot]): 
+        snapshots (SnapshotRing): 
             保存的状态快照。
-            键为 frame_id，值为 StateSnapshot。
+            键为 frame_id，值为 StateSnapshot（只读映射接口）。
             用于回滚和状态校验。
+            存放在 frame_id % MAX_SNAPSHOTS 槽位中，只保留最近
+            MAX_SNAPSHOTS 帧内的快照，新快照直接覆盖旧槽位。
         
         is_running (bool): 
             游戏是否正在运行。
@@ -120,9 +343,13 @@ class GameState:
         self.frame_id = 0
         self.entities: Dict[int, Any] = {}
         self.player_entities: Dict[int, int] = {}
-        self.snapshots: Dict[int, StateSnapshot] = {}
+        self.snapshots = SnapshotRing(self.MAX_SNAPSHOTS)
         self.is_running = False
         self.is_paused = False
+        # 每个实体最近一次序列化结果 {eid: (字段元组或数据, 数据)}，快照间共享未变化的实体数据
+        self._last_serialized: Dict[int, Tuple[Any, dict]] = {}
+        # 实体摘要缓存 {eid: (fast_hash() 结果或序列化数据, 混入ID后的摘要)}
+        self._entity_hash_cache: Dict[int, Tuple[Any, int]] = {}
     
     def add_entity(self, entity) -> int:
         """
@@ -146,6 +373,8 @@ class GameState:
         """
         if entity_id in self.entities:
             del self.entities[entity_id]
+        self._last_serialized.pop(entity_id, None)
+        self._entity_hash_cache.pop(entity_id, None)
     
     def get_entity(self, entity_id: int):
         """
@@ -194,25 +423,35 @@ class GameState:
         创建并保存当前帧的完整状态快照，
         用于后续的回滚或校验。
         
+        结构共享：实体数据与上次序列化结果相同时直接复用那份字典，
+        保留的快照内存从 O(快照数 × 实体数) 降到 O(实体数 + 变化量)。
+        快照中的实体字典因此是只读的，不要原地修改。
+        实体提供 record() 时先比较字段元组，未变化的实体不再构造字典。
+        
         Returns:
             创建的 StateSnapshot
         """
-        snapshot = StateSnapshot(
-            frame_id=self.frame_id,
-            entities={
-                eid: self._serialize_entity(entity)
-                for eid, entity in self.entities.items()
-            }
-        )
-        snapshot.hash = snapshot.compute_hash()
-        
-        self.snapshots[self.frame_id] = snapshot
-        
-        # 清理旧快照
-        oldest = self.frame_id - self.MAX_SNAPSHOTS
-        for fid in list(self.snapshots.keys()):
-            if fid < oldest:
-                del self.snapshots[fid]
+        last = self._last_serialized
+        entities = {}
+        for eid, entity in self.entities.items():
+            record = getattr(entity, 'record', None)
+            key = record() if record is not None else self._serialize_entity(entity)
+            prev = last.get(eid)
+            if prev is not None and prev[0] == key:
+                data = prev[1]
+            elif record is not None:
+                data = entity.serialize()
+                last[eid] = (key, data)
+            else:
+                # 字典实体的序列化结果就是实体本身：快照保存副本，
+                # 之后原地修改实体既不会改动快照，也能被上面的比较发现
+                data = dict(key)
+                last[eid] = (data, data)
+            entities[eid] = data
+        
+        snapshot = StateSnapshot(frame_id=self.frame_id, entities=entities)
+        
+        self.snapshots.put(snapshot)
         
         return snapshot
     
@@ -229,11 +468,10 @@ class GameState:
         Returns:
             True 如果恢复成功，False 如果快照不存在
         """
-        if frame_id not in self.snapshots:
+        snapshot = self.snapshots.get(frame_id)
+        if snapshot is None:
             return False
         
-        snapshot = self.snapshots[frame_id]
-        
         self.frame_id = snapshot.frame_id
         self.entities = {
             int(eid): self._deserialize_entity(data)
@@ -308,31 +546,94 @@ class GameState:
         用于快速比较两个状态是否相同。
         
         Returns:
-            MD5 哈希字符串
+            十六进制哈希字符串（见 StateSnapshot.compute_hash）
         """
-        snapshot = StateSnapshot(
-            frame_id=self.frame_id,
-            entities={
-                eid: self._serialize_entity(entity)
-                for eid, entity in self.entities.items()
-            }
-        )
-        return snapshot.compute_hash()
+        return digest_to_hex(self.compute_state_digest())
+    
+    def get_frame_hash(self, frame_id: int) -> Optional[str]:
+        """
+        获取指定帧的状态哈希（按帧缓存）
+        
+        同一帧的哈希常被多次查询（日志、网络发送、本地校验）。
+        已保存快照的帧直接返回快照中记录的哈希，不再遍历实体；
+        当前帧没有快照时现算。实体在帧内被修改后，请用
+        compute_state_hash() 获取实时值。
+        
+        Args:
+            frame_id: 帧ID
+        
+        Returns:
+            十六进制哈希字符串；既没有快照也不是当前帧时返回 None
+        """
+        snapshot = self.snapshots.get(frame_id)
+        if snapshot is not None:
+            return snapshot.hash
+        if frame_id == self.frame_id:
+            return self.compute_state_hash()
+        return None
+    
+    def compute_state_digest(self) -> int:
+        """
+        计算当前状态的整数摘要
+        
+        实体提供 fast_hash() 时使用其缓存的摘要；其他实体以序列化数据为键。
+        混入实体ID后的摘要缓存在 _entity_hash_cache 中，
+        未变化的实体既不重新编码哈希，也不重新混合。
+        与对应快照的 StateSnapshot.compute_digest() 结果一致。
+        
+        Returns:
+            与 compute_state_hash() 对应的整数值
+        """
+        digest = frame_digest_seed(self.frame_id)
+        cache = self._entity_hash_cache
+        for eid, entity in self.entities.items():
+            fast_hash = getattr(entity, 'fast_hash', None)
+            key = fast_hash() if fast_hash is not None else self._serialize_entity(entity)
+            cached = cache.get(eid)
+            if cached is not None and cached[0] == key:
+                digest ^= cached[1]
+                continue
+            if fast_hash is not None:
+                entity_hash = key
+            else:
+                entity_hash = entity_digest(key)
+                # 字典实体的序列化结果就是实体本身，缓存一份副本作为键，
+                # 否则原地修改后 cached[0] == key 恒为真，哈希不会更新
+                key = dict(key)
+            mixed = mix_entity_digest(eid, entity_hash)
+            cache[eid] = (key, mixed)
+            digest ^= mixed
+        return digest
     
     def _serialize_entity(self, entity) -> dict:
-        """序列化单个实体"""
-        if hasattr(entity, 'serialize'):
-            return entity.serialize()
-        return {'id': getattr(entity, 'entity_id', 0)}
+        """
+        序列化单个实体（从快照恢复的实体本身就是序列化字典）
+        
+        序列化函数按实体类型解析一次并缓存（见 _entity_serializer），
+        之后每次调用只有一次字典查找，没有 hasattr/isinstance 判断。
+        """
+        serializer = _SERIALIZERS.get(type(entity))
+        if serializer is None:
+            serializer = _entity_serializer(type(entity))
+        return serializer(entity)
     
     def _deserialize_entity(self, data: dict):
-        """反序列化实体（需要子类实现）"""
-        return data
+        """
+        反序列化实体（需要子类实现）
+        
+        默认返回快照字典的浅副本：快照是只读的，恢复出的实体会被原地修改。
+        """
+        return dict(data)
     
     def copy(self) -> 'GameState':
         """
         创建状态的深拷贝
         
+        按实体类型选择复制方式，避免 copy.deepcopy 的通用对象图遍历：
+        - 提供 clone() 的实体（Entity）直接调用
+        - 从快照恢复的实体是扁平的序列化字典（值都是 int），浅复制即可
+        - 其他实体仍使用 deepcopy
+        
         Returns:
             新的 GameState 实例
         """
@@ -341,8 +642,19 @@ class GameState:
         new_state.is_running = self.is_running
         new_state.is_paused = self.is_paused
         new_state.player_entities = self.player_entities.copy()
-        new_state.entities = copy.deepcopy(self.entities)
+        new_state.entities = {eid: self._clone_entity(entity)
+                              for eid, entity in self.entities.items()}
         return new_state
+    
+    @staticmethod
+    def _clone_entity(entity):
+        """复制单个实体（见 copy）"""
+        clone = getattr(entity, 'clone', None)
+        if clone is not None:
+            return clone()
+        if type(entity) is dict:
+            return entity.copy()
+        return copy.deepcopy(entity)
 
 
 class StateValidator:
@@ -357,51 +669,57 @@ class StateValidator:
     2. 客户端自检（与服务器哈希对比）
     3. 调试帧同步问题
     
+    哈希统一以整数摘要存储（见 StateSnapshot.compute_digest），
+    比较是一次整数比较。各方法既接受整数摘要（compute_state_digest()），
+    也接受十六进制字符串（compute_state_hash()、网络消息），入口处统一转换，
+    调用方不必自己调用 hex_to_digest。
+    
     属性:
-        hash_history (Dict[int, str]): 
-            记录每帧的状态哈希。
-            键为 frame_id，值为哈希字符串。
+        hash_history (Dict[int, int]): 
+            记录每帧的状态摘要。
+            键为 frame_id，值为整数摘要。
             用于后续校验。
-            例如：{100: "a1b2c3...", 101: "d4e5f6..."}
+            例如：{100: 0xa1b2c3..., 101: 0xd4e5f6...}
         
         mismatches (List[dict]): 
             记录所有哈希不匹配的情况。
             每个元素包含 frame_id、期望值、实际值。
             用于调试和分析同步问题。
-            例如：[{'frame_id': 100, 'expected': 'a1b2...', 'actual': 'x9y8...'}]
+            期望值和实际值都是整数摘要（需要展示时用 digest_to_hex）。
+            例如：[{'frame_id': 100, 'expected': 0xa1b2..., 'actual': 0x9f8e...}]
     """
     
     def __init__(self):
         """初始化校验器"""
-        self.hash_history: Dict[int, str] = {}
+        self.hash_history: Dict[int, int] = {}
         self.mismatches: List[dict] = []
     
-    def record_hash(self, frame_id: int, hash_value: str):
+    def record_hash(self, frame_id: int, hash_value: Union[int, str]):
         """
         记录帧的哈希值
         
         Args:
             frame_id: 帧ID
-            hash_value: 状态哈希
+            hash_value: 状态摘要（整数或十六进制字符串）
         """
-        self.hash_history[frame_id] = hash_value
+        self.hash_history[frame_id] = _as_digest(hash_value)
     
-    def verify_hash(self, frame_id: int, expected_hash: str) -> bool:
+    def verify_hash(self, frame_id: int, expected_hash: Union[int, str]) -> bool:
         """
         验证帧的哈希是否匹配
         
         Args:
             frame_id: 帧ID
-            expected_hash: 期望的哈希值
+            expected_hash: 期望的摘要（整数或十六进制字符串）
         
         Returns:
             True 如果匹配或没有记录，False 如果不匹配
         """
-        if frame_id not in self.hash_history:
+        actual = self.hash_history.get(frame_id)
+        if actual is None:
             return True  # 没有记录，跳过
         
-        actual = self.hash_history[frame_id]
-        
+        expected_hash = _as_digest(expected_hash)
         if actual != expected_hash:
             self.mismatches.append({
                 'frame_id': frame_id,
@@ -412,6 +730,34 @@ class StateValidator:
         
         return True
     
+    def verify_range(self, start_frame: int, expected_hashes: List[Union[int, str]]) -> List[bool]:
+        """
+        批量验证连续帧的哈希（例如回滚后校验最近一段帧）
+        
+        与逐帧调用 verify_hash 结果相同：没有记录的帧视为匹配，
+        不匹配的帧记入 mismatches。
+        
+        Args:
+            start_frame: 第一帧的帧ID
+            expected_hashes: 从 start_frame 起每帧的期望摘要（整数或十六进制字符串）
+        
+        Returns:
+            每帧是否匹配
+        """
+        history = self.hash_history
+        expected_hashes = [_as_digest(h) for h in expected_hashes]
+        actual = [history.get(fid) for fid in range(start_frame, start_frame + len(expected_hashes))]
+        results = [a is None or a == e for a, e in zip(actual, expected_hashes)]
+        if not all(results):
+            for offset, ok in enumerate(results):
+                if not ok:
+                    self.mismatches.append({
+                        'frame_id': start_frame + offset,
+                        'expected': expected_hashes[offset],
+                        'actual': actual[offset]
+                    })
+        return results
+    
     def get_mismatches(self) -> List[dict]:
         """
         获取所有不匹配记录
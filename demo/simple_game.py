@@ -11,7 +11,6 @@ import asyncio
 import pygame
 import sys
 import time
-import math
 from typing import Optional, List, Dict, Tuple
 from dataclasses import dataclass
 
@@ -44,6 +43,13 @@ COLORS = {
 
 PLAYER_COLORS = [COLORS['player1'], COLORS['player2'], COLORS['player3'], COLORS['player4']]
 
+PLAYER_SIZE = 40
+
+# 攻击特效持续时间
+ATTACK_EFFECT_NS = 200_000_000
+# 单帧最多推进的逻辑时间（卡顿后避免一次追太多帧）
+MAX_FRAME_DELTA_NS = 100_000_000
+
 
 # ==================== 演示专用配置 ====================
 
@@ -61,6 +67,37 @@ class DemoConfig:
     attack_damage: int = 10
 
 
+# ==================== 攻击判定 ====================
+
+def find_hits(ax: float, ay: float, xs: List[float], ys: List[float],
+              hps: List[int], attacker_index: int, range_sq: float) -> List[int]:
+    """
+    找出攻击范围内的存活目标
+    
+    位置按列传入（xs/ys/hps 下标对应同一个目标），循环内没有实体查找和属性访问。
+    比较距离平方，不开方。
+    
+    Args:
+        ax, ay: 攻击者坐标
+        xs, ys: 目标坐标列
+        hps: 目标生命值列
+        attacker_index: 攻击者在列中的下标（跳过）
+        range_sq: 攻击范围的平方
+    
+    Returns:
+        命中目标的下标列表
+    """
+    hits = []
+    for i in range(len(xs)):
+        if i == attacker_index or hps[i] <= 0:
+            continue
+        dx = ax - xs[i]
+        dy = ay - ys[i]
+        if dx * dx + dy * dy <= range_sq:
+            hits.append(i)
+    return hits
+
+
 # ==================== 本地游戏模拟器 ====================
 
 class LocalGameSimulator:
@@ -69,8 +106,13 @@ class LocalGameSimulator:
     用于演示和理解帧同步原理
     """
     
+    __slots__ = ('config', '_attack_range_sq', 'game_state', 'physics', 'frame_engine',
+                 'pending_inputs', 'player_inputs', 'current_frame', 'frame_history',
+                 '_last_attacks')
+    
     def __init__(self, config: DemoConfig):
         self.config = config
+        self._attack_range_sq = float(config.attack_range) ** 2
         
         # 更新全局配置
         CONFIG.physics.WORLD_WIDTH = float(config.width)
@@ -84,9 +126,11 @@ class LocalGameSimulator:
         self.physics = PhysicsEngine()  # 使用更新后的 CONFIG
         
         # 帧引擎
+        # 单机模拟没有网络层，输入以 PlayerInput 对象直接存入帧
         self.frame_engine = FrameEngine(
             player_count=config.player_count,
-            buffer_size=config.buffer_size
+            buffer_size=config.buffer_size,
+            local_mode=True
         )
         
         # 玩家输入
@@ -127,13 +171,13 @@ class LocalGameSimulator:
         for player_id in range(self.config.player_count):
             flags = self.player_inputs.get(player_id, 0)
             
-            input_data = PlayerInput(
+            player_input = PlayerInput(
                 frame_id=self.current_frame,
                 player_id=player_id,
                 flags=flags
-            ).serialize()
+            )
             
-            self.frame_engine.add_input(self.current_frame, player_id, input_data)
+            self.frame_engine.add_input(self.current_frame, player_id, player_input)
         
         frame = self.frame_engine.tick()
         
@@ -148,22 +192,20 @@ class LocalGameSimulator:
         """应用帧输入到游戏"""
         self._last_attacks = []
         
-        for player_id, input_data in frame.inputs.items():
-            if not input_data:
+        # 帧引擎处于 local_mode，输入就是 tick() 存入的 PlayerInput 对象
+        for player_id, player_input in frame.inputs.items():
+            if player_input is None:
                 continue
             
-            try:
-                parsed = PlayerInput.deserialize(input_data)
-                entity = self.game_state.get_entity(player_id)
-                if entity:
-                    self.physics.apply_input(entity.entity_id, parsed.flags)
-                    
-                    if parsed.flags & InputFlags.ATTACK:
-                        attack_info = self._handle_attack(player_id)
-                        if attack_info:
-                            self._last_attacks.append(attack_info)
-            except Exception:
-                pass
+            entity = self.game_state.get_entity(player_id)
+            if entity:
+                flags = player_input.flags
+                self.physics.apply_input(entity.entity_id, flags)
+                
+                if flags & InputFlags.ATTACK:
+                    attack_info = self._handle_attack(player_id)
+                    if attack_info:
+                        self._last_attacks.append(attack_info)
         
         self.physics.update(33)
     
@@ -174,22 +216,18 @@ class LocalGameSimulator:
             return None
         
         ax, ay = attacker.to_float()
-        hits = []
         
-        for target_id in range(self.config.player_count):
-            if target_id == attacker_id:
-                continue
-            
-            target = self.game_state.get_entity(target_id)
-            if not target or target.hp <= 0:
-                continue
-            
-            tx, ty = target.to_float()
-            dist = math.sqrt((ax - tx) ** 2 + (ay - ty) ** 2)
-            
-            if dist <= self.config.attack_range:
-                target.hp = max(0, target.hp - self.config.attack_damage)
-                hits.append(target_id)
+        # 按玩家ID收集目标列（缺失的玩家以 hp=0 占位，不会被命中）
+        targets = [self.game_state.get_entity(pid) for pid in range(self.config.player_count)]
+        xs = [t.x / FixedPoint.SCALE if t else 0.0 for t in targets]
+        ys = [t.y / FixedPoint.SCALE if t else 0.0 for t in targets]
+        hps = [t.hp if t else 0 for t in targets]
+        
+        hits = find_hits(ax, ay, xs, ys, hps, attacker_id, self._attack_range_sq)
+        damage = self.config.attack_damage
+        for target_id in hits:
+            target = targets[target_id]
+            target.hp = max(0, target.hp - damage)
         
         return {'attacker_id': attacker_id, 'x': ax, 'y': ay, 'hits': hits}
     
@@ -217,6 +255,10 @@ class LocalGameSimulator:
 class GameRenderer:
     """PyGame 渲染器"""
     
+    __slots__ = ('config', 'screen', 'clock', 'font', 'large_font',
+                 'show_grid', 'show_debug', 'show_help', 'attack_effects',
+                 '_grid_surface', '_player_sprites', '_player_labels', '_fx_surface')
+    
     def __init__(self, config: DemoConfig):
         self.config = config
         
@@ -232,13 +274,46 @@ class GameRenderer:
         self.show_debug = True
         self.show_help = True
         self.attack_effects: List[dict] = []
+        
+        # 背景网格是静态的，只画一次
+        self._grid_surface = pygame.Surface((config.width, config.height))
+        self._grid_surface.fill(COLORS['background'])
+        self._draw_grid(self._grid_surface)
+        
+        # 玩家方块和标签每帧都一样，预先渲染好，绘制时只需 blit
+        self._player_sprites = [self._make_player_sprite(color) for color in PLAYER_COLORS]
+        self._player_labels = [self.font.render(f"P{i + 1}", True, (0, 0, 0))
+                               for i in range(len(PLAYER_COLORS))]
+        
+        # 攻击特效半径在 [attack_range, 2 * attack_range) 之间扩散，
+        # 按最大半径分配一块透明画布，所有特效复用
+        max_radius = config.attack_range * 2
+        self._fx_surface = pygame.Surface((max_radius * 2, max_radius * 2), pygame.SRCALPHA)
+    
+    @staticmethod
+    def _make_player_sprite(color: Tuple[int, int, int]) -> pygame.Surface:
+        """
+        预渲染玩家方块（圆角填充 + 白色描边）
+        
+        Args:
+            color: 玩家颜色
+        
+        Returns:
+            带透明通道的 Surface
+        """
+        size = PLAYER_SIZE
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        rect = pygame.Rect(0, 0, size, size)
+        pygame.draw.rect(sprite, color, rect, border_radius=8)
+        pygame.draw.rect(sprite, (255, 255, 255), rect, 2, border_radius=8)
+        return sprite
     
     def render(self, simulator: LocalGameSimulator, extra_info: dict = None):
         """渲染游戏画面"""
-        self.screen.fill(COLORS['background'])
-        
         if self.show_grid:
-            self._draw_grid()
+            self.screen.blit(self._grid_surface, (0, 0))
+        else:
+            self.screen.fill(COLORS['background'])
         
         self._draw_attack_effects()
         
@@ -253,35 +328,37 @@ class GameRenderer:
         
         pygame.display.flip()
     
-    def _draw_grid(self):
-        """绘制背景网格"""
+    def _draw_grid(self, surface: pygame.Surface):
+        """绘制背景网格（初始化时画到缓存 Surface 上）"""
         for x in range(0, self.config.width, 50):
-            pygame.draw.line(self.screen, COLORS['grid'], (x, 0), (x, self.config.height))
+            pygame.draw.line(surface, COLORS['grid'], (x, 0), (x, self.config.height))
         for y in range(0, self.config.height, 50):
-            pygame.draw.line(self.screen, COLORS['grid'], (0, y), (self.config.width, y))
+            pygame.draw.line(surface, COLORS['grid'], (0, y), (self.config.width, y))
     
     def _draw_attack_effects(self):
         """绘制攻击效果"""
-        current_time = time.time() * 1000
+        now_ns = time.monotonic_ns()
         self.attack_effects = [e for e in self.attack_effects 
-                               if current_time - e['time'] < 200]
+                               if now_ns - e['time_ns'] < ATTACK_EFFECT_NS]
         
         for effect in self.attack_effects:
-            age = current_time - effect['time']
+            age = (now_ns - effect['time_ns']) / 1_000_000
             alpha = max(0, 255 - int(age * 1.275))
             
             radius = int(self.config.attack_range * (1 + age / 200))
             color = PLAYER_COLORS[effect['player_id'] % len(PLAYER_COLORS)]
             
-            surface = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            surface = self._fx_surface
+            surface.fill((0, 0, 0, 0), (0, 0, radius * 2, radius * 2))
             pygame.draw.circle(surface, (*color, alpha // 2), (radius, radius), radius, 3)
-            self.screen.blit(surface, (int(effect['x'] - radius), int(effect['y'] - radius)))
+            self.screen.blit(surface, (int(effect['x'] - radius), int(effect['y'] - radius)),
+                             (0, 0, radius * 2, radius * 2))
     
     def add_attack_effect(self, x: float, y: float, player_id: int):
         """添加攻击效果"""
         self.attack_effects.append({
             'x': x, 'y': y,
-            'time': time.time() * 1000,
+            'time_ns': time.monotonic_ns(),
             'player_id': player_id
         })
     
@@ -289,15 +366,11 @@ class GameRenderer:
         """绘制玩家"""
         x, y = simulator.get_player_position(player_id)
         hp = simulator.get_player_hp(player_id)
-        color = PLAYER_COLORS[player_id % len(PLAYER_COLORS)]
-        
-        size = 40
-        rect = pygame.Rect(int(x - size/2), int(y - size/2), size, size)
-        pygame.draw.rect(self.screen, color, rect, border_radius=8)
-        pygame.draw.rect(self.screen, (255, 255, 255), rect, 2, border_radius=8)
+        index = player_id % len(PLAYER_COLORS)
         
-        text = self.font.render(f"P{player_id + 1}", True, (0, 0, 0))
-        self.screen.blit(text, (int(x - 10), int(y - 8)))
+        size = PLAYER_SIZE
+        self.screen.blit(self._player_sprites[index], (int(x - size/2), int(y - size/2)))
+        self.screen.blit(self._player_labels[index], (int(x - 10), int(y - 8)))
         
         hp_bar_width = 50
         hp_bar_height = 6
@@ -369,19 +442,44 @@ class InputHandler:
         pygame.K_RETURN: InputFlags.ATTACK,
     }
     
+    # 每个玩家的 (按键, 标志) 表，类加载时构建一次
+    _TABLES: List[List[Tuple[int, int]]] = [
+        list(P1_KEYS.items()),
+        list(P2_KEYS.items()),
+    ]
+    
     @classmethod
-    def get_player_input(cls, player_id: int) -> int:
-        """获取玩家输入标志"""
-        keys = pygame.key.get_pressed()
-        
-        key_map = cls.P1_KEYS if player_id == 0 else cls.P2_KEYS
+    def _flags_from_keys(cls, keys, player_id: int) -> int:
+        """根据按键状态计算玩家输入标志"""
+        table = cls._TABLES[0] if player_id == 0 else cls._TABLES[1]
         flags = 0
         
-        for key, flag in key_map.items():
+        for key, flag in table:
             if keys[key]:
                 flags |= flag
         
         return flags
+    
+    @classmethod
+    def get_player_input(cls, player_id: int) -> int:
+        """获取玩家输入标志"""
+        return cls._flags_from_keys(pygame.key.get_pressed(), player_id)
+    
+    @classmethod
+    def get_all_inputs(cls, n_players: int) -> List[int]:
+        """
+        获取所有玩家的输入标志
+        
+        每个逻辑帧只调用一次 pygame.key.get_pressed()。
+        
+        Args:
+            n_players: 玩家数量
+        
+        Returns:
+            按玩家 ID 排列的输入标志列表
+        """
+        keys = pygame.key.get_pressed()
+        return [cls._flags_from_keys(keys, player_id) for player_id in range(n_players)]
 
 
 # ==================== 主游戏类 ====================
@@ -397,9 +495,10 @@ class DemoGame:
         self.running = True
         self.paused = False
         
-        self.logic_accumulator = 0.0
-        self.logic_frame_time = 1000 / self.config.logic_fps
-        self.last_time = time.time() * 1000
+        # 计时统一用单调时钟的整数纳秒，不受系统时间调整影响，长时间运行也没有浮点误差累积
+        self.logic_accumulator_ns = 0
+        self.logic_frame_time_ns = 1_000_000_000 // self.config.logic_fps
+        self.last_time_ns = time.monotonic_ns()
     
     def handle_events(self):
         """处理事件"""
@@ -423,22 +522,22 @@ class DemoGame:
         if self.paused:
             return
         
-        current_time = time.time() * 1000
-        delta_time = current_time - self.last_time
-        self.last_time = current_time
+        now_ns = time.monotonic_ns()
+        delta_ns = now_ns - self.last_time_ns
+        self.last_time_ns = now_ns
         
-        delta_time = min(delta_time, 100)
+        delta_ns = min(delta_ns, MAX_FRAME_DELTA_NS)
         
-        self.logic_accumulator += delta_time
+        self.logic_accumulator_ns += delta_ns
         
-        while self.logic_accumulator >= self.logic_frame_time:
-            for player_id in range(self.config.player_count):
-                flags = InputHandler.get_player_input(player_id)
+        while self.logic_accumulator_ns >= self.logic_frame_time_ns:
+            inputs = InputHandler.get_all_inputs(self.config.player_count)
+            for player_id, flags in enumerate(inputs):
                 self.simulator.set_player_input(player_id, flags)
             
             self.simulator.tick()
             
-            self.logic_accumulator -= self.logic_frame_time
+            self.logic_accumulator_ns -= self.logic_frame_time_ns
     
     def render(self):
         """渲染画面"""
@@ -6,25 +6,62 @@ Performance benchmarks for frame synchronization
 import time
 import sys
 import os
+import csv
 import json
+import struct
+import tracemalloc
+from array import array
+from itertools import repeat
 from typing import List, Dict, Callable
 
 # 添加父目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.frame import FrameEngine, Frame, FrameBuffer
-from core.input import PlayerInput, InputFlags
-from core.physics import PhysicsEngine, Entity
+from core.input import PlayerInput, InputFlags, COMBO_MOVE_RIGHT_ATTACK
+from core.physics import PhysicsEngine, Entity, EntityPool
+from core.fixed import FixedPoint
 from core.state import GameState
 from core.rng import DeterministicRNG
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 可选依赖：百分位统计、碰撞内核基准（未安装时回退/跳过）
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# 可选依赖：更快的报告写入（未安装时使用标准库 json）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class Benchmark:
-    """基准测试类"""
+    """
+    基准测试类
+    
+    前 warmup 次调用不计入统计：让 CPython 3.11+ 的自适应特化、
+    各级缓存和 numba 编译先进入稳态，避免首轮偏慢拉低 min/拉高 p99。
+    """
     
-    def __init__(self, name: str):
+    def __init__(self, name: str, warmup: int = 10):
         self.name = name
-        self.times: List[float] = []
+        self.warmup = warmup
+        self._warmup_left = warmup
+        self.times = array('d')  # 每次（或每批平均）耗时，秒
+        self.ops = 0              # 计入统计的调用次数
+        self.elapsed = 0.0        # 计入统计的实际总耗时，秒
         self.results: Dict = {}
     
     def start(self):
@@ -34,37 +71,91 @@ class Benchmark:
     def stop(self):
         """停止计时"""
         elapsed = time.perf_counter() - self._start_time
+        if self._warmup_left > 0:
+            self._warmup_left -= 1  # 预热，丢弃
+            return elapsed
         self.times.append(elapsed)
+        self.ops += 1
+        self.elapsed += elapsed
         return elapsed
     
+    def measure(self, fn: Callable, iterations: int, *args, batches: int = 10):
+        """
+        批量计时
+        
+        每批只取两次时间戳，计时开销摊到整批调用上；适合单次耗时
+        只有几百纳秒、与 start()/stop() 本身开销相当的操作。
+        每批记录一次平均单次耗时，最小/最大/百分位统计按批计算；
+        总耗时和平均值按实际经过的时间和调用次数计算。
+        
+        Args:
+            fn: 被测函数（传绑定方法本身，不要再包一层 lambda）
+            iterations: 总调用次数
+            *args: 传给 fn 的参数
+            batches: 分批数
+        """
+        per_batch = max(1, iterations // batches)
+        perf_counter_ns = time.perf_counter_ns
+        for _ in repeat(None, self._warmup_left):
+            fn(*args)
+        self._warmup_left = 0
+        for _ in range(batches):
+            t0 = perf_counter_ns()
+            for _ in repeat(None, per_batch):
+                fn(*args)
+            dt = (perf_counter_ns() - t0) / 1e9
+            self.times.append(dt / per_batch)
+            self.elapsed += dt
+        self.ops += per_batch * batches
+    
     def get_stats(self) -> Dict:
         """获取统计信息"""
         if not self.times:
             return {}
         
-        total = sum(self.times)
-        avg = total / len(self.times)
+        total = self.elapsed
+        avg = total / self.ops
         min_t = min(self.times)
         max_t = max(self.times)
         
-        # 计算百分位
-        sorted_times = sorted(self.times)
-        p50 = sorted_times[len(sorted_times) // 2]
-        p99 = sorted_times[int(len(sorted_times) * 0.99)]
+        # 计算百分位（有 numpy 时用 O(n) 的 partition，不做完整排序）
+        n = len(self.times)
+        i50 = n // 2
+        i99 = int(n * 0.99)
+        if np is not None:
+            part = np.partition(np.frombuffer(self.times, dtype=np.float64), [i50, i99])
+            p50 = float(part[i50])
+            p99 = float(part[i99])
+        else:
+            sorted_times = sorted(self.times)
+            p50 = sorted_times[i50]
+            p99 = sorted_times[i99]
         
         return {
             'name': self.name,
-            'iterations': len(self.times),
+            'iterations': self.ops,
             'total_ms': total * 1000,
             'avg_ms': avg * 1000,
             'min_ms': min_t * 1000,
             'max_ms': max_t * 1000,
             'p50_ms': p50 * 1000,
             'p99_ms': p99 * 1000,
-            'ops_per_sec': len(self.times) / total if total > 0 else 0
+            'ops_per_sec': self.ops / total if total > 0 else 0
         }
 
 
+COLLISION_ENTITY_COUNTS = [10, 50, 100, 200]
+
+# PlayerInput.FORMAT 的第一个字段（frame_id，网络字节序，偏移 0）
+INPUT_FRAME_ID = struct.Struct(PlayerInput.FORMAT[:2])
+
+
+def make_collision_entities(entity_count: int) -> List[Entity]:
+    """碰撞基准的实体布局（每行 10 个，间距 50 像素）"""
+    return [Entity.from_float(i, (i % 10) * 50.0, (i // 10) * 50.0)
+            for i in range(entity_count)]
+
+
 def benchmark_collision_detection():
     """碰撞检测性能测试"""
     print("\n" + "=" * 50)
@@ -73,20 +164,17 @@ def benchmark_collision_detection():
     
     results = {}
     
-    for entity_count in [10, 50, 100, 200]:
+    for entity_count in COLLISION_ENTITY_COUNTS:
         physics = PhysicsEngine()
         
         # 创建实体
-        for i in range(entity_count):
-            x = (i % 10) * 50.0
-            y = (i // 10) * 50.0
-            entity = Entity.from_float(i, x, y)
+        for entity in make_collision_entities(entity_count):
             physics.add_entity(entity)
         
         # 基准测试
         bench = Benchmark(f"collision_{entity_count}")
         
-        for _ in range(100):
+        for _ in range(bench.warmup + 100):
             bench.start()
             physics.update(33)
             bench.stop()
@@ -102,6 +190,88 @@ def benchmark_collision_detection():
     return results
 
 
+if numba is not None:
+    @numba.njit(cache=True, parallel=True)
+    def _aabb_pairs_kernel(xs, ys, ws, hs):
+        """全对 AABB 相交计数（int64 定点数，与引擎的 _aabb_overlap 判定相同）"""
+        n = xs.shape[0]
+        counts = np.zeros(n, dtype=np.int64)
+        for i in numba.prange(n):
+            ax = xs[i]
+            ay = ys[i]
+            ax2 = ax + ws[i]
+            ay2 = ay + hs[i]
+            c = 0
+            for j in range(i + 1, n):
+                bx = xs[j]
+                by = ys[j]
+                if ax < bx + ws[j] and ax2 > bx and ay < by + hs[j] and ay2 > by:
+                    c += 1
+            counts[i] = c
+        return counts.sum()
+
+
+def _aabb_pairs_numpy(xs, ys, ws, hs) -> int:
+    """
+    全对 AABB 相交计数（NumPy 广播）
+    
+    一次生成 n×n 相交掩码，只统计上三角（i < j）。
+    """
+    x1 = xs[:, None]
+    y1 = ys[:, None]
+    overlap = ((x1 < xs + ws) & (x1 + ws[:, None] > xs)
+               & (y1 < ys + hs) & (y1 + hs[:, None] > ys))
+    return int(np.triu(overlap, 1).sum())
+
+
+def benchmark_collision_kernel():
+    """
+    碰撞内核性能测试（需要 numpy，numba 可选）
+    
+    与 benchmark_collision_detection 使用相同的实体布局，但只测 O(n²) 全对
+    AABB 判定本身：SoA 数组在计时循环外构建一次，分别用 NumPy 广播和
+    编译好的并行内核计算，不含解释器逐对分派开销。
+    结果作为引擎 update() 的对照，不参与游戏逻辑。
+    numba 内核首次运行的编译结果缓存在 __pycache__ 中，编译发生在预热调用里。
+    """
+    print("\n" + "=" * 50)
+    print("Benchmark: Collision Kernel")
+    print("=" * 50)
+    
+    if np is None:
+        print("numpy not installed, skipped")
+        return {}
+    
+    kernels = {'numpy': _aabb_pairs_numpy}
+    if numba is not None:
+        kernels['numba'] = _aabb_pairs_kernel
+    else:
+        print("numba not installed, numba kernel skipped")
+    
+    results = {}
+    
+    for entity_count in COLLISION_ENTITY_COUNTS:
+        entities = make_collision_entities(entity_count)
+        # 定点数坐标用 int64，判定结果与引擎一致
+        xs = np.array([e.x for e in entities], dtype=np.int64)
+        ys = np.array([e.y for e in entities], dtype=np.int64)
+        ws = np.array([e.width for e in entities], dtype=np.int64)
+        hs = np.array([e.height for e in entities], dtype=np.int64)
+        
+        print(f"\nEntities: {entity_count}")
+        results[entity_count] = {}
+        
+        for name, kernel in kernels.items():
+            bench = Benchmark(f"collision_{name}_{entity_count}")
+            bench.measure(kernel, 1000, xs, ys, ws, hs)
+            
+            stats = bench.get_stats()
+            results[entity_count][name] = stats
+            print(f"  {name}: {stats['avg_ms'] * 1000:.3f}μs")
+    
+    return results
+
+
 def benchmark_frame_throughput():
     """帧处理吞吐量测试"""
     print("\n" + "=" * 50)
@@ -115,16 +285,34 @@ def benchmark_frame_throughput():
         
         bench = Benchmark(f"frame_{player_count}p")
         
+        # 每个玩家的输入只有 frame_id 不同：序列化一次作模板，改写 frame_id 字段，
+        # 在计时循环外把所有帧的输入都生成好，循环内只剩 add_input 和 tick
+        templates = [
+            bytearray(PlayerInput(
+                frame_id=0,
+                player_id=player_id,
+                flags=InputFlags.MOVE_RIGHT
+            ).serialize())
+            for player_id in range(player_count)
+        ]
+        pack_frame_id = INPUT_FRAME_ID.pack_into
+        
+        # 每次 tick 都能提交（所有玩家输入都已加入），帧数 = 预热 + 计时次数
+        n_frames = bench.warmup + 1000
+        frame_inputs = []
+        for frame_id in range(n_frames):
+            row = []
+            for player_id, template in enumerate(templates):
+                pack_frame_id(template, 0, frame_id)
+                row.append((player_id, bytes(template)))
+            frame_inputs.append(row)
+        
+        add_input = engine.add_input
         frame_id = 0
         while len(bench.times) < 1000:
             # 添加输入
-            for player_id in range(player_count):
-                input_data = PlayerInput(
-                    frame_id=frame_id,
-                    player_id=player_id,
-                    flags=InputFlags.MOVE_RIGHT
-                ).serialize()
-                engine.add_input(frame_id, player_id, input_data)
+            for player_id, payload in frame_inputs[frame_id]:
+                add_input(frame_id, player_id, payload)
             
             bench.start()
             frame = engine.tick()
@@ -155,27 +343,22 @@ def benchmark_serialization():
     input_data = PlayerInput(
         frame_id=12345,
         player_id=1,
-        flags=InputFlags.MOVE_RIGHT | InputFlags.ATTACK,
+        flags=COMBO_MOVE_RIGHT_ATTACK,
         target_x=500 << 16,
         target_y=300 << 16
     )
     
-    bench_serialize = Benchmark("input_serialize")
-    for _ in range(10000):
-        bench_serialize.start()
-        serialized = input_data.serialize()
-        bench_serialize.stop()
+    bench_serialize = Benchmark("input_serialize", warmup=100)
+    bench_serialize.measure(input_data.serialize, 10000)
+    serialized = input_data.serialize()
     
     stats = bench_serialize.get_stats()
     results['input_serialize'] = stats
     print(f"\nInput Serialize: {stats['avg_ms']*1000:.3f}μs")
     
     # PlayerInput 反序列化
-    bench_deserialize = Benchmark("input_deserialize")
-    for _ in range(10000):
-        bench_deserialize.start()
-        restored = PlayerInput.deserialize(serialized)
-        bench_deserialize.stop()
+    bench_deserialize = Benchmark("input_deserialize", warmup=100)
+    bench_deserialize.measure(PlayerInput.deserialize, 10000, serialized)
     
     stats = bench_deserialize.get_stats()
     results['input_deserialize'] = stats
@@ -184,11 +367,8 @@ def benchmark_serialization():
     # Entity 序列化
     entity = Entity.from_float(1, 100.5, 200.5)
     
-    bench_entity_ser = Benchmark("entity_serialize")
-    for _ in range(10000):
-        bench_entity_ser.start()
-        data = entity.serialize()
-        bench_entity_ser.stop()
+    bench_entity_ser = Benchmark("entity_serialize", warmup=100)
+    bench_entity_ser.measure(entity.serialize, 10000)
     
     stats = bench_entity_ser.get_stats()
     results['entity_serialize'] = stats
@@ -198,7 +378,13 @@ def benchmark_serialization():
 
 
 def benchmark_state_hash():
-    """状态哈希性能测试"""
+    """
+    状态哈希性能测试
+    
+    compute_state_hash 按实体缓存摘要，实体未变化时只做一次字段元组比较，
+    所以分两种情况测：实体都不动（缓存命中）和每帧所有实体都移动
+    （每个实体都要重新编码和哈希）。移动实体在计时范围外进行。
+    """
     print("\n" + "=" * 50)
     print("Benchmark: State Hash")
     print("=" * 50)
@@ -210,19 +396,30 @@ def benchmark_state_hash():
         entity = Entity.from_float(i, i * 10.0, i * 10.0)
         state.add_entity(entity)
     
-    bench = Benchmark("state_hash")
+    results = {}
+    
+    bench = Benchmark("state_hash_unchanged")
+    for _ in range(bench.warmup + 1000):
+        bench.start()
+        hash_value = state.compute_state_hash()
+        bench.stop()
+    results['unchanged'] = bench.get_stats()
     
-    for _ in range(1000):
+    entities = list(state.entities.values())
+    bench = Benchmark("state_hash_all_moved")
+    for _ in range(bench.warmup + 1000):
+        for entity in entities:
+            entity.x += 1
         bench.start()
         hash_value = state.compute_state_hash()
         bench.stop()
+    results['all_moved'] = bench.get_stats()
     
-    stats = bench.get_stats()
     print(f"\nState Hash (50 entities):")
-    print(f"  Avg: {stats['avg_ms']:.3f}ms")
-    print(f"  P99: {stats['p99_ms']:.3f}ms")
+    for case, stats in results.items():
+        print(f"  {case}: avg {stats['avg_ms']:.3f}ms, p99 {stats['p99_ms']:.3f}ms")
     
-    return stats
+    return results
 
 
 def benchmark_rng():
@@ -237,21 +434,24 @@ def benchmark_rng():
     
     # 整数随机数
     bench_int = Benchmark("rng_int")
-    for _ in range(100000):
-        bench_int.start()
-        val = rng.range(0, 100)
-        bench_int.stop()
+    bench_int.measure(rng.range, 100000, 0, 100)
     
     stats = bench_int.get_stats()
     results['rng_int'] = stats
     print(f"\nRNG Integer: {stats['avg_ms']*1000000:.3f}ns")
     
+    # 批量整数随机数（每次 1000 个，统计换算为单个值的耗时）
+    batch_size = 1000
+    bench_batch = Benchmark("rng_int_batch")
+    bench_batch.measure(rng.range_batch, 100, 0, 100, batch_size)
+    
+    stats = bench_batch.get_stats()
+    results['rng_int_batch'] = stats
+    print(f"RNG Integer (batch of {batch_size}): {stats['avg_ms']*1000000/batch_size:.3f}ns per value")
+    
     # 浮点随机数
     bench_float = Benchmark("rng_float")
-    for _ in range(100000):
-        bench_float.start()
-        val = rng.uniform()
-        bench_float.stop()
+    bench_float.measure(rng.uniform, 100000)
     
     stats = bench_float.get_stats()
     results['rng_float'] = stats
@@ -260,22 +460,72 @@ def benchmark_rng():
     return results
 
 
-def benchmark_memory():
-    """内存使用测试"""
+class MemoryProbe:
+    """
+    内存测量
+    
+    默认读取 getrusage 的 ru_maxrss（进程峰值 RSS）前后差值，几乎没有开销，
+    但只是粗粒度数字：工作负载没有推高进程峰值时差值为 0。
+    deep=True 时使用 tracemalloc 逐次分配追踪（会让分配慢 2~4 倍，仅用于排查）。
+    没有 resource 模块的平台（Windows）总是使用 tracemalloc。
+    """
+    
+    def __init__(self, deep: bool = False):
+        self.deep = deep or resource is None
+    
+    def start(self):
+        """开始测量"""
+        if self.deep:
+            tracemalloc.start()
+        else:
+            self._before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    def stop(self) -> Dict:
+        """
+        结束测量
+        
+        Returns:
+            deep 模式：current_mb / peak_mb；否则：rss_delta_mb
+        """
+        if self.deep:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return {
+                'current_mb': current / 1024 / 1024,
+                'peak_mb': peak / 1024 / 1024
+            }
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss 在 Linux 上单位是 KB，macOS 上是字节
+        unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return {'rss_delta_mb': (after - self._before) / unit}
+
+
+def _print_memory(title: str, stats: Dict):
+    """打印一项内存测量结果"""
+    print(f"\n{title}:")
+    if 'rss_delta_mb' in stats:
+        print(f"  Peak RSS delta: {stats['rss_delta_mb']:.2f} MB")
+    else:
+        print(f"  Current: {stats['current_mb']:.2f} MB")
+        print(f"  Peak: {stats['peak_mb']:.2f} MB")
+
+
+def benchmark_memory(deep: bool = False):
+    """
+    内存使用测试
+    
+    Args:
+        deep: 使用 tracemalloc 精确追踪（较慢，见 MemoryProbe）
+    """
     print("\n" + "=" * 50)
     print("Benchmark: Memory Usage")
     print("=" * 50)
     
-    try:
-        import tracemalloc
-    except ImportError:
-        print("tracemalloc not available")
-        return {}
-    
     results = {}
+    probe = MemoryProbe(deep)
     
     # 帧历史内存
-    tracemalloc.start()
+    probe.start()
     
     engine = FrameEngine(player_count=4)
     for frame_id in range(1000):
@@ -283,43 +533,109 @@ def benchmark_memory():
             engine.add_input(frame_id, player_id, b'input')
         engine.tick()
     
-    current, peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
-    
-    results['frame_history'] = {
-        'current_mb': current / 1024 / 1024,
-        'peak_mb': peak / 1024 / 1024
-    }
-    
-    print(f"\nFrame History (1000 frames):")
-    print(f"  Current: {current / 1024 / 1024:.2f} MB")
-    print(f"  Peak: {peak / 1024 / 1024:.2f} MB")
+    results['frame_history'] = probe.stop()
+    _print_memory("Frame History (1000 frames)", results['frame_history'])
     
     # 物理引擎内存
-    tracemalloc.start()
+    # 实体从预先分配好的对象池取出（在测量范围外分配），
+    # 统计的是引擎自身的稳态开销，而不是 1000 次 Entity 对象分配
+    pool = EntityPool(1000)
+    scale = FixedPoint.SCALE
+    
+    probe.start()
     
     physics = PhysicsEngine()
     for i in range(1000):
-        entity = Entity.from_float(i, i * 10.0, i * 10.0)
+        entity = pool.acquire(i)
+        entity.x = int(i * 10.0 * scale)
+        entity.y = int(i * 10.0 * scale)
         physics.add_entity(entity)
     
-    current, peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
-    
-    results['physics_entities'] = {
-        'current_mb': current / 1024 / 1024,
-        'peak_mb': peak / 1024 / 1024
-    }
-    
-    print(f"\nPhysics (1000 entities):")
-    print(f"  Current: {current / 1024 / 1024:.2f} MB")
-    print(f"  Peak: {peak / 1024 / 1024:.2f} MB")
+    results['physics_entities'] = probe.stop()
+    _print_memory("Physics (1000 entities)", results['physics_entities'])
     
     return results
 
 
-def run_all_benchmarks():
-    """运行所有基准测试"""
+def write_report(path: str, results: Dict):
+    """
+    写出 JSON 报告
+    
+    有 orjson 时用它编码（整数键、numpy 标量原生支持），否则用标准库 json。
+    
+    Args:
+        path: 输出文件路径
+        results: 各项基准结果
+    """
+    if orjson is not None:
+        data = orjson.dumps(
+            results,
+            default=str,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+        with open(path, 'wb') as f:
+            f.write(data)
+    else:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+
+
+STAT_FIELDS = ('iterations', 'total_ms', 'avg_ms', 'min_ms', 'max_ms',
+               'p50_ms', 'p99_ms', 'ops_per_sec')
+
+
+def summary_rows(results: Dict) -> List[tuple]:
+    """
+    把嵌套的基准结果展开成扁平行
+    
+    每个 get_stats() 结果一行：(benchmark, config, *STAT_FIELDS)，
+    config 是从基准名到统计字典之间的各级键，用 '/' 连接。
+    内存测试等非计时结果不含这些字段，跳过。
+    
+    Args:
+        results: run_all_benchmarks 的结果
+    
+    Returns:
+        行列表
+    """
+    rows = []
+    
+    def walk(benchmark: str, path: List[str], node):
+        if not isinstance(node, dict):
+            return
+        if 'avg_ms' in node:
+            rows.append((benchmark, '/'.join(path),
+                         *(node.get(field) for field in STAT_FIELDS)))
+            return
+        for key, value in node.items():
+            walk(benchmark, path + [str(key)], value)
+    
+    for benchmark, node in results.items():
+        walk(benchmark, [], node)
+    return rows
+
+
+def write_csv_summary(path: str, results: Dict):
+    """
+    写出 CSV 汇总（每项计时一行，便于跨次运行对比）
+    
+    Args:
+        path: 输出文件路径
+        results: 各项基准结果
+    """
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('benchmark', 'config') + STAT_FIELDS)
+        writer.writerows(summary_rows(results))
+
+
+def run_all_benchmarks(deep_memory: bool = False):
+    """
+    运行所有基准测试
+    
+    Args:
+        deep_memory: 内存测试使用 tracemalloc 精确追踪
+    """
     print("\n" + "=" * 60)
     print("  Frame Sync Performance Benchmarks")
     print("=" * 60)
@@ -327,11 +643,12 @@ def run_all_benchmarks():
     all_results = {}
     
     all_results['collision'] = benchmark_collision_detection()
+    all_results['collision_kernel'] = benchmark_collision_kernel()
     all_results['throughput'] = benchmark_frame_throughput()
     all_results['serialization'] = benchmark_serialization()
     all_results['state_hash'] = benchmark_state_hash()
     all_results['rng'] = benchmark_rng()
-    all_results['memory'] = benchmark_memory()
+    all_results['memory'] = benchmark_memory(deep_memory)
     
     # 生成报告
     print("\n" + "=" * 60)
@@ -349,13 +666,23 @@ def run_all_benchmarks():
     
     # 保存结果
     report_path = '/tmp/benchmark_report.json'
-    with open(report_path, 'w') as f:
-        json.dump(all_results, f, indent=2, default=str)
+    write_report(report_path, all_results)
+    
+    summary_path = '/tmp/benchmark_report.csv'
+    write_csv_summary(summary_path, all_results)
     
     print(f"\nFull report saved to: {report_path}")
+    print(f"CSV summary saved to: {summary_path}")
     
     return all_results
 
 
 if __name__ == '__main__':
-    run_all_benchmarks()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Frame Sync Performance Benchmarks')
+    parser.add_argument('--deep', action='store_true',
+                        help='use tracemalloc for the memory benchmark (slow)')
+    args = parser.parse_args()
+    
+    run_all_benchmarks(deep_memory=args.deep)
@@ -8,20 +8,123 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 import asyncio
+from dataclasses import dataclass
+import logging
+import logging.handlers
+import queue
 import websockets
-import msgpack
-import time
+from msgpack import Packer, Unpacker
 
-async def test_client(client_id: int, server_url: str = "ws://localhost:8765"):
-    """测试客户端"""
-    print(f"[客户端 {client_id}] 连接到 {server_url}...")
+logger = logging.getLogger('test_client')
+
+# 纯 Python 实现的 msgpack 慢一个数量级，压测结果会失真
+if Packer.__module__ != 'msgpack._cmsgpack':
+    logger.warning("msgpack C 扩展不可用，正在使用纯 Python 实现")
+
+_PACKER = Packer(use_bin_type=True)
+
+# 同时进行握手的连接数上限，避免大量客户端同时连接压垮服务器
+MAX_CONCURRENT_CONNECTS = 16
+
+# 心跳输入消息除 frame_id 外内容固定：预编码到 frame_id 之前的部分，
+# frame_id 放在最后，每次只需编码一个整数再拼接
+HEARTBEAT_PREFIX = b''.join((
+    _PACKER.pack_map_header(2),
+    _PACKER.pack('type'), _PACKER.pack('input'),
+    _PACKER.pack('payload'), _PACKER.pack_map_header(2),
+    _PACKER.pack('input_data'), _PACKER.pack(b'test_input'),
+    _PACKER.pack('frame_id'),
+))
+
+
+def pack_heartbeat(frame_id: int) -> bytes:
+    """编码心跳输入消息（与 msgpack.packb 的结果解码后相同）"""
+    return HEARTBEAT_PREFIX + _PACKER.pack(frame_id)
+
+
+@dataclass(slots=True)
+class ClientState:
+    """单个测试客户端的运行状态"""
+    client_id: int
+    frame_count: int = 0
+
+
+def _on_joined(state: ClientState, msg: dict):
+    logger.info("[客户端 %s] 加入成功! 玩家ID: %s", state.client_id, msg['payload']['player_id'])
+
+
+def _on_game_start(state: ClientState, msg: dict):
+    logger.info("[客户端 %s] 游戏开始! 起始帧: %s", state.client_id, msg['payload']['start_frame'])
+
+
+def _on_game_frame(state: ClientState, msg: dict):
+    state.frame_count += 1
+    if state.frame_count % 30 == 0 and logger.isEnabledFor(logging.INFO):
+        logger.info("[客户端 %s] 收到帧 %s, 总计: %d",
+                    state.client_id, msg['payload']['frame_id'], state.frame_count)
+
+
+def _on_unknown(state: ClientState, msg: dict):
+    pass
+
+
+# 消息类型 -> 处理函数，一次字典查找代替 if/elif 链
+_DISPATCH = {
+    'joined': _on_joined,
+    'game_start': _on_game_start,
+    'game_frame': _on_game_frame,
+}
+
+
+def start_log_listener() -> logging.handlers.QueueListener:
+    """
+    启动后台日志线程
+    
+    事件循环里的 logger 调用只把记录放进队列，写 stdout 由监听线程完成，
+    多个客户端同时输出时不会阻塞事件循环。
+    
+    Returns:
+        已启动的 QueueListener，退出前调用 stop() 刷新剩余日志
+    """
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
+
+async def test_client(client_id: int, server_url: str = "ws://localhost:8765",
+                      connect_limit: asyncio.Semaphore = None):
+    """
+    测试客户端
+    
+    Args:
+        client_id: 客户端编号
+        server_url: 服务器地址
+        connect_limit: 限制同时握手数量的信号量，None 表示不限制
+    """
+    logger.info("[客户端 %s] 连接到 %s...", client_id, server_url)
     
     try:
-        async with websockets.connect(server_url) as ws:
-            print(f"[客户端 {client_id}] 连接成功!")
+        if connect_limit is None:
+            ws = await websockets.connect(server_url)
+        else:
+            async with connect_limit:
+                ws = await websockets.connect(server_url)
+        
+        async with ws:
+            logger.info("[客户端 %s] 连接成功!", client_id)
+            
+            # 整个连接复用一个 Unpacker，编码共用模块级的 Packer
+            unpacker = Unpacker(raw=False, use_list=False, max_buffer_size=1 << 20)
             
             # 发送加入请求
-            join_msg = msgpack.packb({
+            join_msg = _PACKER.pack({
                 'type': 'join',
                 'payload': {
                     'player_id': f'player_{client_id}',
@@ -29,56 +132,49 @@ async def test_client(client_id: int, server_url: str = "ws://localhost:8765"):
                 }
             })
             await ws.send(join_msg)
-            print(f"[客户端 {client_id}] 发送加入请求")
+            logger.info("[客户端 %s] 发送加入请求", client_id)
             
             # 接收消息
-            frame_count = 0
-            start_time = time.time()
+            state = ClientState(client_id)
+            dispatch = _DISPATCH.get
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + 10  # 运行10秒
             
-            while time.time() - start_time < 10:  # 运行10秒
+            while loop.time() < deadline:
                 try:
                     data = await asyncio.wait_for(ws.recv(), timeout=2.0)
-                    msg = msgpack.unpackb(data, raw=False)
+                    unpacker.feed(data)
                     
-                    if msg.get('type') == 'joined':
-                        print(f"[客户端 {client_id}] 加入成功! 玩家ID: {msg['payload']['player_id']}")
-                    elif msg.get('type') == 'game_start':
-                        print(f"[客户端 {client_id}] 游戏开始! 起始帧: {msg['payload']['start_frame']}")
-                    elif msg.get('type') == 'game_frame':
-                        frame_count += 1
-                        if frame_count % 30 == 0:
-                            print(f"[客户端 {client_id}] 收到帧 {msg['payload']['frame_id']}, 总计: {frame_count}")
+                    for msg in unpacker:
+                        dispatch(msg.get('type'), _on_unknown)(state, msg)
                     
                 except asyncio.TimeoutError:
                     # 发送心跳/输入
-                    input_msg = msgpack.packb({
-                        'type': 'input',
-                        'payload': {
-                            'frame_id': frame_count,
-                            'input_data': b'test_input'
-                        }
-                    })
-                    await ws.send(input_msg)
+                    await ws.send(pack_heartbeat(state.frame_count))
             
-            print(f"[客户端 {client_id}] 测试完成，共收到 {frame_count} 帧")
+            logger.info("[客户端 %s] 测试完成，共收到 %s 帧", client_id, state.frame_count)
             
     except Exception as e:
-        print(f"[客户端 {client_id}] 错误: {e}")
+        logger.error("[客户端 %s] 错误: %s", client_id, e)
 
-async def main():
-    """启动多个测试客户端"""
-    print("=== 开始多客户端测试 ===\n")
+async def main(n: int = 3):
+    """
+    启动多个测试客户端
     
-    # 同时启动3个客户端
-    tasks = [
-        test_client(1),
-        test_client(2),
-        test_client(3),
-    ]
+    Args:
+        n: 客户端数量
+    """
+    logger.info("=== 开始多客户端测试 ===\n")
     
-    await asyncio.gather(*tasks)
+    connect_limit = asyncio.Semaphore(MAX_CONCURRENT_CONNECTS)
+    await asyncio.gather(*(test_client(i, connect_limit=connect_limit)
+                           for i in range(1, n + 1)))
     
-    print("\n=== 测试完成 ===")
+    logger.info("\n=== 测试完成 ===")
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    listener = start_log_listener()
+    try:
+        asyncio.run(main())
+    finally:
+        listener.stop()
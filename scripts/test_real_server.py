@@ -12,6 +12,8 @@ import websockets
 import msgpack
 import time
 
+INPUT_INTERVAL = 1 / 30  # 客户端输入频率 30Hz
+
 async def test_real_server():
     """测试真实服务器"""
     print("=" * 50)
@@ -37,7 +39,9 @@ async def test_real_server():
             '127.0.0.1',
             8767,
             ping_interval=20,
-            ping_timeout=10
+            ping_timeout=10,
+            # 与 GameServer.start() 的连接参数保持一致，测到的是实际部署的配置
+            compression=None
         ):
             print("[服务器] 监听 127.0.0.1:8767")
             # 启动帧循环
@@ -70,32 +74,42 @@ async def test_real_server():
                 await ws.send(auth_msg)
                 print(f"[客户端 {cid}] 发送认证请求")
                 
-                # 接收消息
+                # 接收和发送分成两个并发任务：接收不再靠超时轮询，
+                # 输入按 30Hz 截止时间发送
                 frames = 0
                 joined = False
                 game_started = False
-                start = asyncio.get_event_loop().time()
+                loop = asyncio.get_running_loop()
+                recv = ws.recv
+                unpackb = msgpack.unpackb
+                
+                def handle(msg):
+                    nonlocal frames, joined, game_started
+                    msg_type = msg.get('type')
+                    
+                    if msg_type == 'batch':
+                        for inner in msg['payload']['messages']:
+                            handle(unpackb(inner, raw=False))
+                    elif msg_type == 'join_success':
+                        joined = True
+                        print(f"[客户端 {cid}] 加入成功! 房间: {msg['payload']['room_id']}")
+                    elif msg_type == 'game_start':
+                        game_started = True
+                        print(f"[客户端 {cid}] 游戏开始!")
+                    elif msg_type == 'game_frame':
+                        frames += 1
+                        if frames % 30 == 0:
+                            print(f"[客户端 {cid}] 收到帧 {msg['payload']['frame_id']}")
+                    elif msg_type == 'player_joined':
+                        print(f"[客户端 {cid}] 收到玩家加入通知: {msg['payload']['player_id']}")
                 
-                while asyncio.get_event_loop().time() - start < 6:
-                    try:
-                        data = await asyncio.wait_for(ws.recv(), timeout=0.5)
-                        msg = msgpack.unpackb(data, raw=False)
-                        msg_type = msg.get('type')
-                        
-                        if msg_type == 'join_success':
-                            joined = True
-                            print(f"[客户端 {cid}] 加入成功! 房间: {msg['payload']['room_id']}")
-                        elif msg_type == 'game_start':
-                            game_started = True
-                            print(f"[客户端 {cid}] 游戏开始!")
-                        elif msg_type == 'game_frame':
-                            frames += 1
-                            if frames % 30 == 0:
-                                print(f"[客户端 {cid}] 收到帧 {msg['payload']['frame_id']}")
-                        elif msg_type == 'player_joined':
-                            print(f"[客户端 {cid}] 收到玩家加入通知: {msg['payload']['player_id']}")
-                            
-                    except asyncio.TimeoutError:
+                async def recv_loop():
+                    while True:
+                        handle(unpackb(await recv(), raw=False))
+                
+                async def send_loop():
+                    next_tick = loop.time()
+                    while True:
                         # 发送输入
                         if joined:
                             input_msg = msgpack.packb({
@@ -106,6 +120,19 @@ async def test_real_server():
                                 }
                             })
                             await ws.send(input_msg)
+                        next_tick += INPUT_INTERVAL
+                        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+                
+                tasks = [asyncio.create_task(recv_loop()), asyncio.create_task(send_loop())]
+                done, pending = await asyncio.wait(
+                    tasks, timeout=6, return_when=asyncio.FIRST_EXCEPTION
+                )
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                for task in done:
+                    # 连接提前断开等错误交给外层处理
+                    task.result()
                 
                 print(f"[客户端 {cid}] 测试完成: 加入={joined}, 游戏开始={game_started}, 帧={frames}")
                 return {'joined': joined, 'started': game_started, 'frames': frames}
@@ -12,10 +12,48 @@ import websockets
 import msgpack
 import time
 import signal
+import struct
 
 # 全局变量
 server_running = True
 clients_connected = []
+# 已加入、接收帧广播的连接
+frame_subscribers = set()
+
+FRAME_INTERVAL = 1 / 30  # 30fps
+
+# msgpack uint32：0xce + 大端 4 字节
+_FRAME_ID = struct.Struct('>BI')
+
+
+def _make_frame_template():
+    """
+    预编码 game_frame 消息，按 frame_id 的位置切成前后两段
+    
+    除 frame_id 外消息内容固定，每帧只需拼接，不再构建字典和重新编码。
+    frame_id 固定用 uint32 编码（msgpack 解码器接受非最短编码）。
+    """
+    sentinel = 0xFFFFFFFF
+    packed = msgpack.packb({
+        'type': 'game_frame',
+        'payload': {
+            'frame_id': sentinel,
+            'inputs': {},
+            'confirmed': True
+        }
+    })
+    marker = _FRAME_ID.pack(0xce, sentinel)
+    i = packed.index(marker)
+    return packed[:i], packed[i + len(marker):]
+
+
+FRAME_PREFIX, FRAME_SUFFIX = _make_frame_template()
+
+
+def pack_game_frame(frame_id: int) -> bytes:
+    """编码 game_frame 消息（与 msgpack.packb 的结果解码后相同）"""
+    return b''.join((FRAME_PREFIX, _FRAME_ID.pack(0xce, frame_id), FRAME_SUFFIX))
+
 
 async def handle_client(websocket):
     """处理客户端连接"""
@@ -23,33 +61,28 @@ async def handle_client(websocket):
     clients_connected.append(websocket)
     print(f"[服务器] 客户端 {client_id} 已连接")
     
+    # 每个连接复用一个 Packer/Unpacker，不必每条消息重新创建
+    packer = msgpack.Packer()
+    unpacker = msgpack.Unpacker(raw=False, max_buffer_size=1 << 20)
+    
     try:
         # 等待认证
         data = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-        msg = msgpack.unpackb(data, raw=False)
-        print(f"[服务器] 收到消息: {msg}")
+        unpacker.feed(data)
+        for msg in unpacker:
+            print(f"[服务器] 收到消息: {msg}")
         
         # 发送确认
-        response = msgpack.packb({
+        response = packer.pack({
             'type': 'joined',
             'payload': {'player_id': f'player_{client_id}', 'room_id': 'test_room'}
         })
         await websocket.send(response)
         
-        # 模拟帧同步
-        frame_id = 0
-        while server_running:
-            frame = msgpack.packb({
-                'type': 'game_frame',
-                'payload': {
-                    'frame_id': frame_id,
-                    'inputs': {},
-                    'confirmed': True
-                }
-            })
-            await websocket.send(frame)
-            frame_id += 1
-            await asyncio.sleep(0.033)  # 30fps
+        # 帧由 broadcast_frames 统一发送，这里只负责接收直到断开
+        frame_subscribers.add(websocket)
+        async for _ in websocket:
+            pass
             
     except asyncio.TimeoutError:
         print(f"[服务器] 客户端 {client_id} 认证超时")
@@ -57,6 +90,30 @@ async def handle_client(websocket):
         print(f"[服务器] 客户端 {client_id} 断开连接")
     except Exception as e:
         print(f"[服务器] 客户端 {client_id} 错误: {e}")
+    finally:
+        frame_subscribers.discard(websocket)
+
+
+async def broadcast_frames():
+    """
+    模拟帧同步：每帧编码一次，并发发送给所有已加入的客户端
+    
+    发送失败（连接已关闭）的客户端由 handle_client 负责注销。
+    按截止时间推进：每帧只睡到下一个 deadline，唤醒延迟不会逐帧累积。
+    """
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    frame_id = 0
+    while server_running:
+        if frame_subscribers:
+            frame = pack_game_frame(frame_id)
+            await asyncio.gather(
+                *(ws.send(frame) for ws in list(frame_subscribers)),
+                return_exceptions=True
+            )
+        frame_id += 1
+        next_tick += FRAME_INTERVAL
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
 
 async def test_client(client_id: int, server_url: str = "ws://127.0.0.1:8765"):
     """测试客户端"""
@@ -66,8 +123,11 @@ async def test_client(client_id: int, server_url: str = "ws://127.0.0.1:8765"):
         async with websockets.connect(server_url) as ws:
             print(f"[客户端 {client_id}] 连接成功!")
             
+            packer = msgpack.Packer()
+            unpacker = msgpack.Unpacker(raw=False, max_buffer_size=1 << 20)
+            
             # 发送加入请求
-            join_msg = msgpack.packb({
+            join_msg = packer.pack({
                 'type': 'join',
                 'payload': {
                     'player_id': f'player_{client_id}',
@@ -84,14 +144,15 @@ async def test_client(client_id: int, server_url: str = "ws://127.0.0.1:8765"):
             while time.time() - start_time < 5:  # 运行5秒
                 try:
                     data = await asyncio.wait_for(ws.recv(), timeout=1.0)
-                    msg = msgpack.unpackb(data, raw=False)
+                    unpacker.feed(data)
                     
-                    if msg.get('type') == 'joined':
-                        print(f"[客户端 {client_id}] 加入成功!")
-                    elif msg.get('type') == 'game_frame':
-                        frame_count += 1
-                        if frame_count % 30 == 0:
-                            print(f"[客户端 {client_id}] 收到 {frame_count} 帧")
+                    for msg in unpacker:
+                        if msg.get('type') == 'joined':
+                            print(f"[客户端 {client_id}] 加入成功!")
+                        elif msg.get('type') == 'game_frame':
+                            frame_count += 1
+                            if frame_count % 30 == 0:
+                                print(f"[客户端 {client_id}] 收到 {frame_count} 帧")
                     
                 except asyncio.TimeoutError:
                     pass
@@ -111,10 +172,13 @@ async def run_server():
     
     async with websockets.serve(handle_client, "127.0.0.1", 8765):
         print("[服务器] 监听 127.0.0.1:8765")
+        broadcast_task = asyncio.create_task(broadcast_frames())
         
         # 等待一段时间
         await asyncio.sleep(8)
         
+        broadcast_task.cancel()
+        
     print("[服务器] 关闭")
 
 async def main():
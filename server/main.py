@@ -1,5 +1,8 @@
 """
 Frame synchronization game server
+
+线路格式：所有消息都是 msgpack 编码的二进制帧，
+格式为 {'type': 消息类型, 'payload': 消息内容}。
 """
 
 import sys
@@ -11,11 +14,12 @@ PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
 import asyncio
+import hashlib
 import time
 import logging
-from typing import Dict, Set, Optional, Tuple
+from typing import Dict, Optional, Tuple
 from dataclasses import dataclass, field
-from collections import deque
+from functools import lru_cache
 import msgpack
 import websockets
 
@@ -25,32 +29,58 @@ from core.input import InputValidator
 
 logger = logging.getLogger(__name__)
 
+# 复用的 msgpack 编码器（C 实现，避免每次 packb 都构造新的 Packer）
+# 服务器所有发送都在事件循环线程内完成，共享一个实例是安全的
+_pack = msgpack.Packer(use_bin_type=True).pack
+
+# 每个玩家发送队列的容量（约 2 秒的帧）；队列满说明客户端已落后太多，断开连接
+SEND_QUEUE_SIZE = 60
+
+
+@lru_cache(maxsize=4096)
+def _anonymize(identifier: str) -> str:
+    """匿名化标识符（玩家/房间ID数量有限，结果缓存复用）"""
+    return hashlib.sha256(identifier.encode()).hexdigest()[:8]
+
 
 # ==================== 安全组件 ====================
 
 class RateLimiter:
-    """速率限制器"""
+    """
+    速率限制器
+    
+    滑动窗口计数：每个玩家只保存当前窗口和上一窗口的请求数，
+    用上一窗口计数按剩余比例加权估算最近一个窗口内的请求数，O(1) 且内存固定。
+    """
     
     def __init__(self, max_requests: int = 100, window: float = 1.0):
         self.max_requests = max_requests
         self.window = window
-        self.requests: Dict[str, deque] = {}
+        # player_id -> [窗口开始时间, 当前窗口计数, 上一窗口计数]
+        self.requests: Dict[str, list] = {}
     
     def is_allowed(self, player_id: str) -> bool:
         """检查是否允许请求"""
-        now = time.time()
-        
-        if player_id not in self.requests:
-            self.requests[player_id] = deque()
-        
-        # 清理过期记录
-        while self.requests[player_id] and now - self.requests[player_id][0] > self.window:
-            self.requests[player_id].popleft()
-        
-        if len(self.requests[player_id]) >= self.max_requests:
+        now = time.monotonic()
+        window = self.window
+        
+        state = self.requests.get(player_id)
+        if state is None:
+            state = self.requests[player_id] = [now, 0, 0]
+        
+        # 进入新窗口：当前计数转为上一窗口计数（间隔超过两个窗口则清零）
+        elapsed = now - state[0]
+        if elapsed >= window:
+            state[2] = state[1] if elapsed < 2 * window else 0
+            state[1] = 0
+            state[0] = now
+            elapsed = 0.0
+        
+        estimated = state[2] * (1.0 - elapsed / window) + state[1]
+        if estimated >= self.max_requests:
             return False
         
-        self.requests[player_id].append(now)
+        state[1] += 1
         return True
 
 
@@ -65,13 +95,13 @@ class MessageValidator:
         """验证消息格式"""
         # 大小限制
         if len(message) > cls.MAX_MESSAGE_SIZE:
-            logger.warning(f"Message too large: {len(message)} bytes")
+            logger.warning("Message too large: %d bytes", len(message))
             return None
         
         try:
             data = msgpack.unpackb(message, raw=False)
         except Exception as e:
-            logger.warning(f"Invalid msgpack format: {e}")
+            logger.warning("Invalid msgpack format: %s", e)
             return None
         
         # 类型检查
@@ -97,21 +127,27 @@ class Player:
     player_id: str
     room_id: str
     websocket: any
+    numeric_id: int = 0
     last_input_frame: int = -1
     connected_at: float = 0.0
     message_count: int = 0
+    send_queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=SEND_QUEUE_SIZE))
+    sender_task: Optional[asyncio.Task] = None
+    closing: bool = False  # 已因发送队列溢出而开始关闭连接
 
 
 @dataclass
 class GameRoom:
     """游戏房间"""
     room_id: str
-    players: Set[str]
+    players: Dict[str, Player]  # player_id -> Player，按加入顺序
     frame_engine: FrameEngine
     game_state: GameState
     created_at: float
     is_started: bool = False
     start_frame: int = 0
+    # 广播目标缓存 (player_id, Player)，只在加入/离开时重建
+    broadcast_targets: Tuple[Tuple[str, Player], ...] = ()
 
 
 # ==================== 服务器类 ====================
@@ -154,10 +190,18 @@ class GameServer:
         )
         self.input_validator = InputValidator()
         
+        # 消息类型 -> 处理函数（认证后的消息，auth 不在此列）
+        self._message_handlers = {
+            'input': self._handle_input,
+            'leave': self._handle_leave,
+            'reconnect': self._handle_reconnect,
+        }
+        
         # 服务器状态
         self.running = False
         self.frame_task = None
         self.current_frame = 0
+        self._stats_snapshot: Optional[dict] = None
     
     async def start(self, host: str = '0.0.0.0', port: int = 8765):
         """
@@ -167,7 +211,7 @@ class GameServer:
             host: 监听地址
             port: 监听端口
         """
-        logger.info(f"Starting server on {host}:{port}")
+        logger.info("Starting server on %s:%s", host, port)
         self.running = True
         
         # 启动帧循环
@@ -179,7 +223,9 @@ class GameServer:
             host,
             port,
             ping_interval=20,
-            ping_timeout=10
+            ping_timeout=10,
+            # 消息是小的 msgpack 二进制帧，压缩得不偿失，且每个连接都要单独压缩同一份广播
+            compression=None
         ):
             logger.info("Server started")
             await self._wait_shutdown()
@@ -205,29 +251,28 @@ class GameServer:
             # 保存连接
             self.connections[ws_id] = player_id
             
-            logger.info(f"Player {self._anonymize(player_id)} connected")
+            logger.info("Player %s connected", _anonymize(player_id))
             
             # 消息循环
             async for message in websocket:
+                # 同一 player_id 已由新连接接管（旧连接因溢出被移除后重新认证）
+                current = self.players.get(player_id)
+                if current is not None and current.websocket is not websocket:
+                    break
                 await self._handle_message(player_id, message)
                 
         except asyncio.TimeoutError:
             await websocket.close(4002, "Authentication timeout")
-        except websockets.exceptions.ConnectionClosed:
+        except websockets.ConnectionClosed:
             pass
         except Exception as e:
-            logger.error(f"Connection error: {e}")
+            logger.error("Connection error: %s", e)
         finally:
             if player_id:
-                await self._handle_disconnect(player_id)
+                await self._handle_disconnect(player_id, websocket)
             if ws_id in self.connections:
                 del self.connections[ws_id]
     
-    def _anonymize(self, identifier: str) -> str:
-        """匿名化标识符"""
-        import hashlib
-        return hashlib.sha256(identifier.encode()).hexdigest()[:8]
-    
     async def _authenticate(self, message: bytes, websocket) -> Optional[str]:
         """认证玩家"""
         # 验证消息格式
@@ -255,14 +300,19 @@ class GameServer:
     
     async def _join_room(self, player_id: str, room_id: str, websocket) -> bool:
         """加入房间"""
+        # 同一 player_id 已在线时拒绝（覆盖会泄漏旧连接的发送任务）
+        if player_id in self.players:
+            await websocket.close(4005, "Player already connected")
+            return False
+        
         # 创建房间（如果不存在）
         if room_id not in self.rooms:
             self.rooms[room_id] = GameRoom(
                 room_id=room_id,
-                players=set(),
+                players={},
                 frame_engine=FrameEngine(player_count=self.max_players_per_room),
                 game_state=GameState(),
-                created_at=time.time()
+                created_at=time.monotonic()
             )
         
         room = self.rooms[room_id]
@@ -273,25 +323,30 @@ class GameServer:
             return False
         
         # 添加玩家
-        room.players.add(player_id)
-        self.players[player_id] = Player(
+        player = Player(
             player_id=player_id,
             room_id=room_id,
             websocket=websocket,
-            connected_at=time.time()
+            numeric_id=self._numeric_player_id(player_id),
+            connected_at=time.monotonic()
         )
+        player.sender_task = asyncio.create_task(self._sender_loop(player))
+        room.players[player_id] = player
+        self.players[player_id] = player
+        self._refresh_broadcast_targets(room)
+        self._stats_snapshot = None
         
         # 通知房间内其他玩家
-        await self._broadcast_to_room(room_id, {
+        await self._broadcast_to_room(room_id, _pack({
             'type': 'player_joined',
             'payload': {
                 'player_id': player_id,
                 'player_count': len(room.players)
             }
-        }, exclude_player=player_id)
+        }), exclude_player=player_id)
         
         # 发送加入成功消息
-        await self._send_to_player(player_id, {
+        await self._send_to_player(player_id, _pack({
             'type': 'join_success',
             'payload': {
                 'room_id': room_id,
@@ -299,37 +354,51 @@ class GameServer:
                 'player_count': len(room.players),
                 'players': list(room.players)
             }
-        })
+        }))
         
-        logger.info(f"Player {self._anonymize(player_id)} joined room {self._anonymize(room_id)}")
+        logger.info("Player %s joined room %s", _anonymize(player_id), _anonymize(room_id))
         return True
     
+    @staticmethod
+    def _numeric_player_id(player_id: str) -> int:
+        """
+        解析玩家数字ID（从 player_id 字符串中提取数字）
+        
+        只在加入房间时调用一次，结果保存在 Player.numeric_id。
+        
+        Args:
+            player_id: 玩家ID，如 "player_1"
+        
+        Returns:
+            帧引擎使用的数字ID
+        """
+        try:
+            return int(player_id.split('_')[-1]) if '_' in player_id else hash(player_id) % 1000
+        except ValueError:
+            return hash(player_id) % 1000
+    
     async def _handle_message(self, player_id: str, message: bytes):
         """处理玩家消息"""
         # 速率限制
         if not self.rate_limiter.is_allowed(player_id):
-            logger.warning(f"Rate limit exceeded for {self._anonymize(player_id)}")
+            logger.warning("Rate limit exceeded for %s", _anonymize(player_id))
             return
         
         # 验证消息
         data = MessageValidator.validate(message)
         if not data:
-            logger.warning(f"Invalid message from {self._anonymize(player_id)}")
+            logger.warning("Invalid message from %s", _anonymize(player_id))
             return
         
-        msg_type = data.get('type')
-        payload = data.get('payload', {})
-        
         # 更新消息计数
-        if player_id in self.players:
-            self.players[player_id].message_count += 1
+        player = self.players.get(player_id)
+        if player:
+            player.message_count += 1
         
-        if msg_type == 'input':
-            await self._handle_input(player_id, payload)
-        elif msg_type == 'leave':
-            await self._handle_leave(player_id)
-        elif msg_type == 'reconnect':
-            await self._handle_reconnect(player_id, payload)
+        # 类型已由 MessageValidator 检查
+        handler = self._message_handlers.get(data['type'])
+        if handler:
+            await handler(player_id, data.get('payload', {}))
     
     async def _handle_input(self, player_id: str, payload: dict):
         """处理玩家输入"""
@@ -346,7 +415,7 @@ class GameServer:
         if not isinstance(frame_id, int):
             return
         if frame_id < 0 or frame_id > self.current_frame + self.MAX_FRAME_AHEAD:
-            logger.warning(f"Invalid frame_id {frame_id} from {self._anonymize(player_id)}")
+            logger.warning("Invalid frame_id %d from %s", frame_id, _anonymize(player_id))
             return
         
         # 验证输入数据
@@ -354,25 +423,19 @@ class GameServer:
         if not isinstance(input_data, bytes):
             return
         if len(input_data) > self.MAX_INPUT_SIZE:
-            logger.warning(f"Input data too large from {self._anonymize(player_id)}")
+            logger.warning("Input data too large from %s", _anonymize(player_id))
             return
         
         # 防止重放攻击
         if frame_id <= player.last_input_frame:
-            logger.warning(f"Duplicate frame_id {frame_id} from {self._anonymize(player_id)}")
+            logger.warning("Duplicate frame_id %d from %s", frame_id, _anonymize(player_id))
             return
         
-        # 解析玩家ID（从 player_id 字符串中提取数字）
-        try:
-            numeric_id = int(player_id.split('_')[-1]) if '_' in player_id else hash(player_id) % 1000
-        except ValueError:
-            numeric_id = hash(player_id) % 1000
-        
         # 添加到帧引擎
-        room.frame_engine.add_input(frame_id, numeric_id, input_data)
+        room.frame_engine.add_input(frame_id, player.numeric_id, input_data)
         player.last_input_frame = frame_id
     
-    async def _handle_leave(self, player_id: str):
+    async def _handle_leave(self, player_id: str, payload: dict = None):
         """处理玩家离开"""
         await self._handle_disconnect(player_id)
     
@@ -391,140 +454,237 @@ class GameServer:
             for fid in range(last_frame + 1, room.frame_engine.get_current_frame_id()):
                 frame = room.frame_engine.get_frame(fid)
                 if frame:
-                    frames_to_send.append({
-                        'frame_id': frame.frame_id,
-                        'inputs': {str(k): v for k, v in frame.inputs.items()},
-                        'confirmed': frame.confirmed
-                    })
+                    frames_to_send.append(frame.to_payload())
             
-            await self._send_to_player(player_id, {
+            await self._send_to_player(player_id, _pack({
                 'type': 'sync_frames',
                 'payload': {
                     'frames': frames_to_send,
                     'current_frame': room.frame_engine.get_current_frame_id()
                 }
-            })
+            }))
     
-    async def _handle_disconnect(self, player_id: str):
-        """处理玩家断线"""
+    async def _handle_disconnect(self, player_id: str, websocket=None):
+        """
+        处理玩家断线
+        
+        Args:
+            player_id: 玩家ID
+            websocket: 断开的连接；玩家已换用其他连接时不做处理
+        """
         player = self.players.get(player_id)
         if not player:
-            logger.debug(f"Player {self._anonymize(player_id)} not found in players dict")
+            logger.debug("Player %s not found in players dict", _anonymize(player_id))
+            return
+        if websocket is not None and player.websocket is not websocket:
             return
         
-        room_id = player.room_id
-        room = self.rooms.get(room_id)
+        room = self._detach_player(player)
         
-        if room:
-            room.players.discard(player_id)
-            
-            # 通知其他玩家
+        # 通知其他玩家
+        if room is not None:
             try:
-                await self._broadcast_to_room(room_id, {
+                await self._broadcast_to_room(room.room_id, _pack({
                     'type': 'player_left',
                     'payload': {'player_id': player_id}
-                })
+                }))
             except Exception as e:
-                logger.error(f"Error broadcasting player_left: {e}")
+                logger.error("Error broadcasting player_left: %s", e)
+    
+    def _detach_player(self, player: Player) -> Optional[GameRoom]:
+        """
+        同步移除玩家：离开房间、停止发送任务、从在线列表删除
+        
+        Args:
+            player: 玩家连接信息
+        
+        Returns:
+            玩家离开后仍有其他玩家的房间（由调用方通知 player_left），否则 None
+        """
+        player_id = player.player_id
+        room_id = player.room_id
+        room = self.rooms.get(room_id)
+        
+        if room:
+            room.players.pop(player_id, None)
+            self._refresh_broadcast_targets(room)
             
             # 如果房间空了，清理
             if not room.players:
-                # 再次检查房间是否还存在（防止竞态）
-                if room_id in self.rooms:
-                    del self.rooms[room_id]
-                    logger.info(f"Room {self._anonymize(room_id)} cleaned up")
+                del self.rooms[room_id]
+                logger.info("Room %s cleaned up", _anonymize(room_id))
+                room = None
+        
+        # 停止发送任务
+        if player.sender_task:
+            player.sender_task.cancel()
         
         # 安全删除玩家
-        if player_id in self.players:
+        if self.players.get(player_id) is player:
             del self.players[player_id]
-            logger.info(f"Player {self._anonymize(player_id)} disconnected")
+            logger.info("Player %s disconnected", _anonymize(player_id))
+        self._stats_snapshot = None
+        return room
     
     async def _frame_loop(self):
         """帧同步主循环"""
         logger.info("Frame loop started")
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
         
         while self.running:
-            frame_start = time.time()
-            
-            # 处理所有房间
+            # 逐个推进房间（_tick_room 只入队不等待 I/O，错误在房间内隔离）
             for room_id, room in list(self.rooms.items()):
-                try:
-                    # 检查是否可以开始游戏（玩家数量足够且未开始）
-                    if not room.is_started and len(room.players) >= 2:
-                        room.is_started = True
-                        room.start_frame = room.frame_engine.current_frame
-                        logger.info(f"Room {self._anonymize(room_id)} game started with {len(room.players)} players")
-                        await self._broadcast_to_room(room_id, {
-                            'type': 'game_start',
-                            'payload': {'start_frame': room.start_frame}
-                        })
-                    
-                    # 如果游戏已开始，推进帧
-                    if room.is_started:
-                        # 先尝试正常tick
-                        frame = room.frame_engine.tick()
-                        
-                        # 如果没有足够的输入，使用 force_tick
-                        if not frame:
-                            frame = room.frame_engine.force_tick()
-                    else:
-                        # 游戏未开始，正常tick
-                        frame = room.frame_engine.tick()
-                    
-                    if frame:
-                        # 广播帧数据
-                        await self._broadcast_frame(room_id, frame)
-                    
-                except Exception as e:
-                    logger.error(f"Frame loop error in room {room_id}: {e}")
+                await self._tick_room(room_id, room)
             
             self.current_frame += 1
             
-            # 精确帧率控制
-            elapsed = time.time() - frame_start
-            sleep_time = self.FRAME_TIME - elapsed
-            if sleep_time > 0:
-                await asyncio.sleep(sleep_time)
+            # 按绝对截止时间调度下一帧，避免误差累积
+            next_tick += self.FRAME_TIME
+            now = loop.time()
+            if now - next_tick > 2 * self.FRAME_TIME:
+                # 严重超时：重新对齐，不连续补帧
+                logger.warning("Frame loop behind by %.3fs, resyncing", now - next_tick)
+                next_tick = now + self.FRAME_TIME
+            await asyncio.sleep(max(0.0, next_tick - now))
+    
+    async def _tick_room(self, room_id: str, room: GameRoom):
+        """
+        推进单个房间一帧并广播
+        
+        Args:
+            room_id: 房间ID
+            room: 房间
+        """
+        try:
+            # 检查是否可以开始游戏（玩家数量足够且未开始）
+            if not room.is_started and len(room.players) >= 2:
+                room.is_started = True
+                room.start_frame = room.frame_engine.current_frame
+                logger.info("Room %s game started with %d players", _anonymize(room_id), len(room.players))
+                await self._broadcast_to_room(room_id, _pack({
+                    'type': 'game_start',
+                    'payload': {'start_frame': room.start_frame}
+                }))
+            
+            # 如果游戏已开始，推进帧
+            if room.is_started:
+                # 先尝试正常tick
+                frame = room.frame_engine.tick()
+                
+                # 如果没有足够的输入，使用 force_tick
+                if not frame:
+                    frame = room.frame_engine.force_tick()
+            else:
+                # 游戏未开始，正常tick
+                frame = room.frame_engine.tick()
+            
+            if frame:
+                # 广播帧数据
+                await self._broadcast_frame(room_id, frame)
+            
+        except Exception as e:
+            logger.error("Frame loop error in room %s: %s", room_id, e)
     
     async def _broadcast_frame(self, room_id: str, frame: Frame):
         """广播帧数据"""
-        message = msgpack.packb({
+        message = _pack({
             'type': 'game_frame',
-            'payload': {
-                'frame_id': frame.frame_id,
-                'inputs': {str(k): v for k, v in frame.inputs.items()},
-                'confirmed': frame.confirmed
-            }
+            'payload': frame.to_payload()
         })
         
-        await self._broadcast_to_room(room_id, message, binary=True)
+        await self._broadcast_to_room(room_id, message)
     
-    async def _broadcast_to_room(self, room_id: str, message, binary=False, exclude_player=None):
-        """向房间广播消息"""
+    async def _broadcast_to_room(self, room_id: str, message: bytes, exclude_player=None):
+        """
+        向房间广播消息
+        
+        Args:
+            room_id: 房间ID
+            message: 已编码好的 msgpack 字节
+            exclude_player: 不发送的玩家ID
+        
+        消息只编码一次，所有接收者共享同一份字节。
+        只把消息放入各玩家的发送队列，实际发送由各自的发送任务完成。
+        """
         room = self.rooms.get(room_id)
         if not room:
             return
         
-        tasks = []
-        for player_id in room.players:
-            if player_id == exclude_player:
-                continue
-            
-            player = self.players.get(player_id)
-            if player and player.websocket:
-                if binary:
-                    tasks.append(player.websocket.send(message))
-                else:
-                    tasks.append(player.websocket.send(msgpack.packb(message)))
-        
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
-    
-    async def _send_to_player(self, player_id: str, message):
-        """发送消息给指定玩家"""
+        for player_id, player in room.broadcast_targets:
+            if player_id != exclude_player:
+                try:
+                    player.send_queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    self._enqueue_overflow(player, message)
+    
+    def _refresh_broadcast_targets(self, room: GameRoom):
+        """重建房间的广播目标缓存"""
+        room.broadcast_targets = tuple(room.players.items())
+    
+    async def _send_to_player(self, player_id: str, message: bytes):
+        """发送已编码的 msgpack 消息给指定玩家"""
         player = self.players.get(player_id)
-        if player and player.websocket:
-            await player.websocket.send(msgpack.packb(message))
+        if player:
+            try:
+                player.send_queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._enqueue_overflow(player, message)
+    
+    def _enqueue_overflow(self, player: Player, message: bytes):
+        """
+        发送队列已满：断开慢客户端
+        
+        客户端收到的帧流不能有缺口（客户端不检测缺帧），控制消息
+        （join_success、game_start 等）更不能丢，所以不丢弃任何消息，
+        而是关闭连接（4004）。玩家立即从房间和在线列表中移除
+        （不等待与卡住的客户端完成关闭握手），房间内其他玩家收到
+        player_left；同一 player_id 可以马上重新认证，作为新玩家加入。
+        旧连接随后断开时不会影响新连接。
+        
+        Args:
+            player: 玩家连接信息
+            message: 已编码好的 msgpack 字节
+        """
+        if player.closing:
+            return
+        player.closing = True
+        logger.warning("Player %s too slow, disconnecting", _anonymize(player.player_id))
+        asyncio.create_task(player.websocket.close(4004, "Client too slow"))
+        
+        room = self._detach_player(player)
+        if room is not None:
+            asyncio.create_task(self._broadcast_to_room(room.room_id, _pack({
+                'type': 'player_left',
+                'payload': {'player_id': player.player_id}
+            })))
+    
+    async def _sender_loop(self, player: Player):
+        """
+        玩家发送任务
+        
+        按顺序取出发送队列中的消息写入连接，连接关闭或任务被取消时退出。
+        队列中积压了多条消息时（慢客户端或突发），合并为一条 batch 消息发送，
+        payload.messages 按顺序保存各条已编码的消息字节。
+        
+        Args:
+            player: 玩家连接信息
+        """
+        queue = player.send_queue
+        send = player.websocket.send
+        try:
+            while True:
+                message = await queue.get()
+                if not queue.empty():
+                    batch = [message]
+                    while not queue.empty():
+                        batch.append(queue.get_nowait())
+                    message = _pack({'type': 'batch', 'payload': {'messages': batch}})
+                await send(message)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error("Send error: %s", e)
     
     async def _wait_shutdown(self):
         """等待关闭信号"""
@@ -546,20 +706,31 @@ class GameServer:
         logger.info("Server shutting down...")
     
     def get_stats(self) -> dict:
-        """获取服务器统计信息"""
-        return {
-            'rooms': len(self.rooms),
-            'players': len(self.players),
-            'current_frame': self.current_frame,
-            'room_details': {
-                room_id: {
-                    'players': len(room.players),
-                    'frame': room.frame_engine.get_current_frame_id(),
-                    'is_started': room.is_started
+        """
+        获取服务器统计信息
+        
+        快照在每帧或玩家加入/离开后才重建，两次之间的重复调用（监控轮询）
+        直接返回同一个字典，调用方不要修改返回值。
+        
+        Returns:
+            统计信息字典
+        """
+        snapshot = self._stats_snapshot
+        if snapshot is None or snapshot['current_frame'] != self.current_frame:
+            snapshot = self._stats_snapshot = {
+                'rooms': len(self.rooms),
+                'players': len(self.players),
+                'current_frame': self.current_frame,
+                'room_details': {
+                    room_id: {
+                        'players': len(room.players),
+                        'frame': room.frame_engine.get_current_frame_id(),
+                        'is_started': room.is_started
+                    }
+                    for room_id, room in self.rooms.items()
                 }
-                for room_id, room in self.rooms.items()
             }
-        }
+        return snapshot
 
 
 # 启动入口
@@ -576,4 +747,13 @@ if __name__ == '__main__':
     }
     
     server = GameServer(config)
+    
+    # 有 uvloop 时使用更快的事件循环，否则退回标准 asyncio
+    try:
+        import uvloop
+        uvloop.install()
+        logger.info("Using uvloop event loop")
+    except ImportError:
+        pass
+    
     asyncio.run(server.start())
@@ -9,14 +9,18 @@ Unit tests for frame synchronization core
 import pytest
 import time
 from core.frame import Frame, FrameBuffer, FrameEngine
-from core.input import PlayerInput, InputManager, InputFlags, InputValidator
-from core.physics import Entity, PhysicsEngine, distance, EntityPool
+from core.input import PlayerInput, InputManager, InputFlags, InputValidator, COMBO_MOVE_RIGHT_ATTACK
+from core.physics import Entity, PhysicsEngine, PhysicsState, distance, EntityPool, pair_key
 from core.rng import DeterministicRNG
-from core.state import GameState, StateSnapshot, StateValidator
+from core.state import GameState, StateSnapshot, StateValidator, digest_to_hex, hex_to_digest, entity_digest
 from core.fixed import fixed, FixedPoint
 from core.config import CONFIG
 
 
+# 超长输入（模块级复用，避免每个用例重新分配）
+_OVERSIZE_INPUT = b'\x00' * 2000
+
+
 # ==================== Frame 测试 ====================
 
 class TestFrame:
@@ -41,25 +45,39 @@ class TestFrame:
         assert frame.get_input(2) == b'input2'
         assert frame.is_complete(2)
         assert not frame.is_complete(3)
+    
+    def test_frame_payload_cached(self):
+        """测试网络帧数据只转换一次，输入变化后重新生成"""
+        frame = Frame(frame_id=7, inputs={0: b'a'}, confirmed=True)
+        
+        payload = frame.to_payload()
+        assert payload == {'frame_id': 7, 'inputs': {'0': b'a'}, 'confirmed': True}
+        assert frame.to_payload() is payload
+        
+        frame.set_input(1, b'b')
+        assert frame.to_payload()['inputs'] == {'0': b'a', '1': b'b'}
+        assert frame == Frame(frame_id=7, inputs={0: b'a', 1: b'b'}, confirmed=True,
+                              timestamp=frame.timestamp)
 
 
 class TestFrameBuffer:
     """FrameBuffer 测试"""
     
-    def test_add_input(self):
+    @pytest.fixture
+    def buffer(self):
+        """每个测试一个新的缓冲区（测试会修改其内容）"""
+        return FrameBuffer(buffer_size=2)
+    
+    def test_add_input(self, buffer):
         """测试添加输入"""
-        buffer = FrameBuffer(buffer_size=2)
-        
         buffer.add_input(1, 1, b'input1')
         buffer.add_input(1, 2, b'input2')
         
         assert 1 in buffer.pending_inputs
         assert len(buffer.pending_inputs[1]) == 2
     
-    def test_frame_commit(self):
+    def test_frame_commit(self, buffer):
         """测试帧提交"""
-        buffer = FrameBuffer(buffer_size=2)
-        
         buffer.add_input(1, 1, b'input1')
         buffer.add_input(1, 2, b'input2')
         
@@ -70,20 +88,16 @@ class TestFrameBuffer:
         assert 1 in frame.inputs
         assert 2 in frame.inputs
     
-    def test_partial_frame_not_committed(self):
+    def test_partial_frame_not_committed(self, buffer):
         """测试部分输入不提交"""
-        buffer = FrameBuffer(buffer_size=2)
-        
         buffer.add_input(1, 1, b'input1')
         
         frame = buffer.try_commit_frame(1, player_count=2)
         
         assert frame is None
     
-    def test_cleanup(self):
+    def test_cleanup(self, buffer):
         """测试清理旧帧"""
-        buffer = FrameBuffer(buffer_size=2)
-        
         buffer.add_input(1, 1, b'input1')
         buffer.try_commit_frame(1, player_count=1)
         
@@ -91,18 +105,22 @@ class TestFrameBuffer:
         
         assert 1 not in buffer.frames
     
-    def test_invalid_input_rejected(self):
+    def test_invalid_input_rejected(self, buffer):
         """测试无效输入被拒绝"""
-        buffer = FrameBuffer(buffer_size=2)
-        
         # 负帧ID
         buffer.add_input(-1, 1, b'input')
         assert -1 not in buffer.pending_inputs
         
         # 过大输入
-        large_input = b'x' * 2000
-        buffer.add_input(1, 1, large_input)
+        buffer.add_input(1, 1, _OVERSIZE_INPUT)
         assert 1 not in buffer.pending_inputs
+    
+    @pytest.mark.parametrize("size", [FrameBuffer.MAX_INPUT_SIZE + 1, 2000, 100_000])
+    def test_oversize_input_rejected(self, buffer, size):
+        """测试超过 MAX_INPUT_SIZE 的输入被拒绝，恰好等于上限的输入被接受"""
+        buffer.add_input(1, 1, bytes(size))
+        buffer.add_input(2, 1, bytes(FrameBuffer.MAX_INPUT_SIZE))
+        assert list(buffer.pending_inputs) == [2]
 
 
 class TestFrameEngine:
@@ -154,14 +172,69 @@ class TestFrameEngine:
         engine = FrameEngine(player_count=1)
         engine.max_history = 5
         
-        for i in range(10):
-            engine.add_input(i, 1, b'input')
-            engine.tick()
+        # 直接填充历史，只测试清理策略（tick 行为由 test_engine_tick 覆盖）
+        for fid in range(10):
+            engine.frame_history[fid] = Frame(frame_id=fid)
+        engine.current_frame = 10
+        engine._trim_history()
         
         # max_history=5 时，保留的帧数是 max_history + 1 = 6
         # 因为清理逻辑是 oldest = current_frame - max_history
         # 当 current_frame=10, oldest=5，保留 frame_id >= 5 的帧（5,6,7,8,9）
         assert len(engine.frame_history) <= engine.max_history + 1
+        assert list(engine.frame_history) == list(range(5, 10))
+    
+    def test_run_n(self):
+        """测试批量推进与逐帧 add_input/tick 结果一致，遇到缺输入的帧停止"""
+        engine = FrameEngine(player_count=2)
+        inputs = [{0: b'a%d' % i, 1: b'b%d' % i} for i in range(5)]
+        inputs.insert(3, {0: b'only'})
+        
+        frames = engine.run_n(inputs)
+        
+        assert [f.to_payload() for f in frames] == [
+            {'frame_id': i, 'inputs': {'0': b'a%d' % i, '1': b'b%d' % i}, 'confirmed': True}
+            for i in range(3)
+        ]
+        assert (engine.current_frame, engine.frame_buffer.pending_inputs[3]) == (3, {0: b'only'})
+    
+    def test_frame_history_trim_keeps_window(self):
+        """测试 tick/force_tick 混合推进时历史只保留最近的窗口"""
+        engine = FrameEngine(player_count=1)
+        engine.max_history = 4
+        
+        for i in range(20):
+            if i % 3:
+                engine.add_input(i, 0, b'input')
+                engine.tick()
+            else:
+                engine.force_tick()
+        
+        assert list(engine.frame_history) == list(range(15, 20))
+        
+        # 运行中缩小历史上限，下次推进时一次清理多帧
+        engine.max_history = 1
+        engine.force_tick()
+        assert list(engine.frame_history) == [19, 20]
+    
+    def test_local_mode_keeps_input_objects(self):
+        """测试单机模式下输入对象不经过序列化"""
+        engine = FrameEngine(player_count=2, local_mode=True)
+        
+        inputs = [PlayerInput(frame_id=0, player_id=pid, flags=InputFlags.ATTACK)
+                  for pid in range(2)]
+        for pid, player_input in enumerate(inputs):
+            engine.add_input(0, pid, player_input)
+        
+        frame = engine.tick()
+        assert frame is not None
+        assert frame.inputs[0] is inputs[0]
+        assert frame.inputs[1].flags == InputFlags.ATTACK
+        
+        # 网络模式仍然只接受字节
+        engine = FrameEngine(player_count=1)
+        engine.add_input(0, 0, inputs[0])
+        assert engine.tick() is None
 
 
 # ==================== Input 测试 ====================
@@ -174,7 +247,7 @@ class TestPlayerInput:
         input1 = PlayerInput(
             frame_id=1,
             player_id=2,
-            flags=InputFlags.MOVE_RIGHT | InputFlags.ATTACK,
+            flags=COMBO_MOVE_RIGHT_ATTACK,
             target_x=100,
             target_y=200
         )
@@ -182,11 +255,8 @@ class TestPlayerInput:
         data = input1.serialize()
         input2 = PlayerInput.deserialize(data)
         
-        assert input2.frame_id == input1.frame_id
-        assert input2.player_id == input1.player_id
-        assert input2.flags == input1.flags
-        assert input2.target_x == input1.target_x
-        assert input2.target_y == input1.target_y
+        # dataclass 相等比较覆盖所有字段
+        assert input2 == input1
     
     def test_input_flags(self):
         """测试输入标志"""
@@ -215,6 +285,23 @@ class TestPlayerInput:
         """测试无效数据反序列化"""
         with pytest.raises(ValueError):
             PlayerInput.deserialize(b'short')
+    
+    def test_pack_into_unpack_from(self):
+        """测试写入/解析共享缓冲区中连续排列的多条输入"""
+        inputs = [
+            PlayerInput(frame_id=1, player_id=0, flags=COMBO_MOVE_RIGHT_ATTACK, target_x=-5),
+            PlayerInput(frame_id=1, player_id=1, extra=b'skill'),
+        ]
+        buf = bytearray(sum(i.packed_size() for i in inputs))
+        
+        end = inputs[1].pack_into(buf, inputs[0].pack_into(buf))
+        assert (end, bytes(buf)) == (len(buf), inputs[0].serialize() + inputs[1].serialize())
+        
+        view = memoryview(buf)
+        first = PlayerInput.unpack_from(view)
+        assert [first, PlayerInput.unpack_from(view, first.packed_size())] == inputs
+        with pytest.raises(ValueError):
+            PlayerInput.unpack_from(view, len(buf) - 1)
 
 
 class TestInputManager:
@@ -225,7 +312,7 @@ class TestInputManager:
         manager = InputManager(player_id=1)
         
         manager.begin_frame(1)
-        manager.set_input(InputFlags.MOVE_RIGHT | InputFlags.ATTACK)
+        manager.set_input(COMBO_MOVE_RIGHT_ATTACK)
         result = manager.end_frame()
         
         assert result is not None
@@ -288,8 +375,7 @@ class TestInputValidator:
         assert validator.validate(1, serialized)
         
         # 过大的输入
-        large_data = b'x' * 2000
-        assert not validator.validate(1, large_data)
+        assert not validator.validate(1, _OVERSIZE_INPUT)
 
 
 # ==================== Physics 测试 ====================
@@ -301,10 +387,7 @@ class TestEntity:
         """测试实体创建"""
         entity = Entity.from_float(1, 100.0, 200.0)
         
-        assert entity.entity_id == 1
-        x, y = entity.to_float()
-        assert x == 100.0
-        assert y == 200.0
+        assert (entity.entity_id, entity.to_float()) == (1, (100.0, 200.0))
     
     def test_entity_position_update(self):
         """测试位置更新"""
@@ -332,9 +415,26 @@ class TestEntity:
         
         entity.reset()
         
-        assert entity.x == 0
-        assert entity.y == 0
-        assert entity.vx == 0
+        assert (entity.x, entity.y, entity.vx) == (0, 0, 0)
+    
+    def test_set_size_updates_half_extent(self):
+        """测试修改尺寸时刷新半宽/半高缓存"""
+        entity = Entity(entity_id=1)
+        assert entity._half_w == entity.width // 2
+        
+        entity.set_size(fixed(10).raw, fixed(20).raw)
+        assert (entity.width, entity._half_w, entity._half_h) == \
+            (fixed(10).raw, fixed(5).raw, fixed(10).raw)
+    
+    def test_entity_slots_and_clone(self):
+        """测试实体没有实例 __dict__，clone 复制字段但不带网格位置"""
+        engine = PhysicsEngine()
+        entity = Entity.from_float(1, 10.0, 20.0)
+        engine.add_entity(entity)
+        
+        c = entity.clone()
+        assert not hasattr(entity, '__dict__')
+        assert (c == entity, c._half_w, c._cell, c._cell_index) == (True, entity._half_w, None, -1)
 
 
 class TestPhysicsEngine:
@@ -351,6 +451,21 @@ class TestPhysicsEngine:
         engine.remove_entity(1)
         assert engine.get_entity(1) is None
     
+    def test_batch_apply_inputs_matches_apply_input(self):
+        """测试批量应用输入与逐个 apply_input 结果一致（覆盖全部方向组合）"""
+        batch, single = PhysicsEngine(), PhysicsEngine()
+        for engine in (batch, single):
+            for flags in range(16):
+                engine.add_entity(Entity(entity_id=flags, vx=7, vy=7))
+        inputs = [(flags, flags | InputFlags.ATTACK) for flags in range(16)] + [(99, 1)]
+        
+        batch.batch_apply_inputs(inputs, 5)
+        for eid, flags in inputs:
+            single.apply_input(eid, flags, 5)
+        
+        assert [(e.vx, e.vy) for e in batch.entities.values()] == \
+            [(e.vx, e.vy) for e in single.entities.values()]
+    
     def test_physics_determinism(self):
         """测试物理确定性"""
         # 两个独立的物理引擎
@@ -367,17 +482,16 @@ class TestPhysicsEngine:
         engine1.add_entity(entity1)
         engine2.add_entity(entity2)
         
-        # 执行100帧
+        # 执行100帧：一个逐帧调用，一个批量推进
         for _ in range(100):
             engine1.update(33)
-            engine2.update(33)
+        engine2.update(33, steps=100)
         
         # 验证状态一致
         e1 = engine1.get_entity(1)
         e2 = engine2.get_entity(1)
         
-        assert e1.x == e2.x
-        assert e1.y == e2.y
+        assert (e1.x, e1.y, e1.vx, e1.vy) == (e2.x, e2.y, e2.vx, e2.vy)
     
     def test_collision_detection(self):
         """测试碰撞检测"""
@@ -393,6 +507,75 @@ class TestPhysicsEngine:
         engine.update(33)
         
         assert len(engine.collision_pairs) == 1
+        assert engine.get_collision_pairs() == [(1, 2)]
+        assert engine.collision_pairs[0] == pair_key(2, 1)
+    
+    def test_collision_resolution(self):
+        """测试碰撞分离（沿最小穿透轴推开）"""
+        engine = PhysicsEngine()
+        
+        entity1 = Entity.from_float(1, 0.0, 0.0)
+        entity2 = Entity.from_float(2, 16.0, 0.0)
+        gap_before = entity2.x - entity1.x
+        
+        engine.add_entity(entity1)
+        engine.add_entity(entity2)
+        engine.update(33)
+        
+        # X 方向重叠更小，沿 X 轴分离并清零 X 速度
+        assert entity2.x - entity1.x > gap_before
+        assert entity1.vx == 0
+        assert entity2.vx == 0
+    
+    def test_sweep_and_prune_matches_grid(self):
+        """测试扫描排除法与网格法检测到相同的碰撞对"""
+        def build():
+            engine = PhysicsEngine()
+            positions = [(0, 0), (16, 0), (200, 200), (200, 220), (600, 50), (900, 900)]
+            for i, (x, y) in enumerate(positions):
+                engine.add_entity(Entity.from_float(i, float(x), float(y)))
+            return engine
+        
+        grid = build()
+        grid._handle_entity_collision_optimized()
+        sap = build()
+        sap._handle_entity_collision_sap()
+        
+        assert sorted(sap.get_collision_pairs()) == sorted(grid.get_collision_pairs()) == [(0, 1), (2, 3)]
+    
+    def test_lazy_grid_matches_rebuild(self):
+        """测试增量维护的空间网格与整体重建一致"""
+        rng = DeterministicRNG(3)
+        engine = PhysicsEngine()
+        for i in range(PhysicsEngine.SAP_MAX_ENTITIES + 50):
+            entity = Entity(entity_id=i,
+                            x=fixed(rng.range(0, 1800)).raw,
+                            y=fixed(rng.range(0, 1000)).raw)
+            entity.set_velocity(float(rng.range(-300, 300)), float(rng.range(-300, 300)))
+            engine.add_entity(entity)
+        
+        for frame in range(10):
+            if frame == 5:
+                engine.remove_entity(0)
+            engine.update(33)
+        
+        lazy = {cell: sorted(ids) for cell, ids in engine.spatial_grid.items()}
+        engine._update_spatial_grid()
+        rebuilt = {cell: sorted(ids) for cell, ids in engine.spatial_grid.items()}
+        assert lazy == rebuilt
+    
+    def test_separating_pair_not_resolved(self):
+        """测试已经相互远离的重叠实体不做位置修正"""
+        engine = PhysicsEngine()
+        a = Entity.from_float(1, 100.0, 100.0)
+        b = Entity.from_float(2, 116.0, 100.0)
+        a.set_velocity(-100.0, 0.0)
+        b.set_velocity(100.0, 0.0)
+        
+        engine._resolve_collision(a, b)
+        
+        assert (a.x, b.x) == (fixed(100).raw, fixed(116).raw)
+        assert a.vx < 0 and b.vx > 0
     
     def test_zero_dt_update(self):
         """测试零时间增量更新"""
@@ -436,18 +619,67 @@ class TestEntityPool:
         assert entity is not None
 
 
+class TestPhysicsState:
+    """PhysicsState 测试"""
+    
+    def test_capture_restore(self):
+        """测试 SoA 捕获/恢复保持实体对象引用"""
+        engine = PhysicsEngine()
+        entity = Entity.from_float(1, 100.0, 100.0)
+        entity.set_velocity(50.0, 0.0)
+        engine.add_entity(entity)
+        engine.add_entity(Entity.from_float(2, 300.0, 100.0))
+        
+        state = engine.capture_state()
+        x_before = entity.x
+        assert state.count == 2
+        assert state.eid_of(state.slot_of(1)) == 1
+        
+        engine.update(33)
+        engine.add_entity(Entity.from_float(3, 500.0, 500.0))
+        engine.restore_state(state)
+        
+        assert engine.get_entity(1) is entity
+        assert entity.x == x_before
+        assert engine.get_entity(3) is None
+    
+    def test_restore_recreated_entity_keeps_all_fields(self):
+        """测试回滚时重建的实体保留 max_hp 等非物理字段"""
+        engine = PhysicsEngine()
+        engine.add_entity(Entity(entity_id=1, x=5, hp=30, max_hp=250, flags=3))
+        state = engine.capture_state()
+        
+        engine.remove_entity(1)
+        engine.restore_state(state)
+        
+        assert engine.get_entity(1) == Entity(entity_id=1, x=5, hp=30, max_hp=250, flags=3)
+    
+    def test_grow(self):
+        """测试容量自动扩展"""
+        state = PhysicsState(capacity=2)
+        state.load(Entity(entity_id=i) for i in range(5))
+        
+        assert state.count == 5
+        assert state.capacity >= 5
+        assert state.eid_of(4) == 4
+
+
 # ==================== RNG 测试 ====================
 
 class TestDeterministicRNG:
     """DeterministicRNG 测试"""
     
+    @pytest.fixture
+    def rng(self):
+        """固定种子的生成器（每个测试重新创建，状态互不影响）"""
+        return DeterministicRNG(12345)
+    
     def test_determinism(self):
         """测试确定性"""
         rng1 = DeterministicRNG(12345)
         rng2 = DeterministicRNG(12345)
         
-        for _ in range(100):
-            assert rng1.range(0, 100) == rng2.range(0, 100)
+        assert rng1.range_batch(0, 100, 100) == rng2.range_batch(0, 100, 100)
     
     def test_different_seeds(self):
         """测试不同种子"""
@@ -459,21 +691,24 @@ class TestDeterministicRNG:
         
         assert values1 != values2
     
-    def test_range(self):
-        """测试范围"""
-        rng = DeterministicRNG(12345)
+    @pytest.mark.parametrize("min_val,max_val", [(10, 20), (0, 1), (-50, 50), (7, 7)])
+    def test_range(self, rng, min_val, max_val):
+        """测试范围（range_batch 与逐个 range 的一致性见 test_range_batch_matches_sequential）"""
+        values = rng.range_batch(min_val, max_val, 1000)
         
-        for _ in range(1000):
-            val = rng.range(10, 20)
-            assert 10 <= val <= 20
+        assert min(values) >= min_val
+        assert max(values) <= max_val
     
-    def test_uniform(self):
+    def test_uniform(self, rng):
         """测试均匀分布"""
-        rng = DeterministicRNG(12345)
+        values = rng.uniform_batch(1000)
+        
+        assert min(values) >= 0
+        assert max(values) < 1
         
-        for _ in range(1000):
-            val = rng.uniform()
-            assert 0 <= val < 1
+        # 与逐个 uniform() 的结果和最终状态一致
+        rng2 = DeterministicRNG(12345)
+        assert ([rng2.uniform() for _ in range(1000)], rng2.state) == (values, rng.state)
     
     def test_zero_seed(self):
         """测试零种子"""
@@ -482,6 +717,71 @@ class TestDeterministicRNG:
         # 零种子应该被转换为非零
         assert rng.state != 0
         assert rng.range(0, 100) >= 0
+    
+    def test_next_batch_matches_sequential(self):
+        """测试批量生成与逐个生成结果一致"""
+        rng1 = DeterministicRNG(12345)
+        rng2 = DeterministicRNG(12345)
+        
+        assert rng1.next_batch(100) == [rng2.next_uint32() for _ in range(100)]
+        assert rng1.get_state() == rng2.get_state()
+    
+    def test_range_multiply_shift(self):
+        """测试 range 用高位映射，覆盖两端"""
+        rng1 = DeterministicRNG(99)
+        rng2 = DeterministicRNG(99)
+        values = [rng1.range(-3, 3) for _ in range(500)]
+        
+        assert values == [-3 + ((rng2.next_uint32() * 7) >> 32) for _ in range(500)]
+        assert set(values) == set(range(-3, 4))
+    
+    def test_range_batch_matches_sequential(self):
+        """批量 range 与逐次调用结果和状态一致"""
+        a = DeterministicRNG(777)
+        b = DeterministicRNG(777)
+        
+        assert a.range_batch(-5, 37, 500) == [b.range(-5, 37) for _ in range(500)]
+        assert a.get_state() == b.get_state()
+        
+        # 空范围不消耗随机数
+        assert a.range_batch(3, 3, 4) == [3, 3, 3, 3]
+        assert a.get_state() == b.get_state()
+    
+    def test_chance_threshold(self):
+        """测试整数阈值判定与浮点比较等价，且都消耗一个随机数"""
+        for p in (0.0, 0.3, 0.5, 1 / 3, 0.999, 1.0, float('nan')):
+            rng1 = DeterministicRNG(5)
+            rng2 = DeterministicRNG(5)
+            results = [rng1.chance(p) for _ in range(200)]
+            assert results == [rng2.uniform() < p for _ in range(200)]
+            assert rng1.get_state() == rng2.get_state()
+        
+        assert DeterministicRNG.probability_threshold(0.5) == 0x80000000
+    
+    def test_shuffle_determinism(self):
+        """测试洗牌结果与逐次调用 range 的 Fisher-Yates 一致"""
+        rng1 = DeterministicRNG(42)
+        rng2 = DeterministicRNG(42)
+        
+        shuffled = rng1.shuffle(list(range(52)))
+        expected = list(range(52))
+        for i in range(51, 0, -1):
+            j = rng2.range(0, i)
+            expected[i], expected[j] = expected[j], expected[i]
+        
+        assert shuffled == expected
+        assert rng1.get_state() == rng2.get_state()
+    
+    def test_shuffle_indices(self):
+        """测试下标洗牌是排列，且与对象洗牌一致"""
+        rng1 = DeterministicRNG(7)
+        rng2 = DeterministicRNG(7)
+        deck = ['c%d' % i for i in range(20)]
+        
+        order = rng1.shuffle_indices(len(deck))
+        assert sorted(order) == list(range(20))
+        assert [deck[i] for i in order] == rng2.shuffle(deck)
+        assert rng1.get_state() == rng2.get_state()
 
 
 # ==================== State 测试 ====================
@@ -489,9 +789,13 @@ class TestDeterministicRNG:
 class TestGameState:
     """GameState 测试"""
     
-    def test_snapshot_save_restore(self):
+    @pytest.fixture
+    def state(self):
+        """每个测试一个新的状态（测试会修改帧号、实体和快照）"""
+        return GameState()
+    
+    def test_snapshot_save_restore(self, state):
         """测试快照保存和恢复"""
-        state = GameState()
         state.frame_id = 100
         
         snapshot = state.save_snapshot()
@@ -505,9 +809,8 @@ class TestGameState:
         assert success
         assert state.frame_id == 100
     
-    def test_state_hash(self):
+    def test_state_hash(self, state):
         """测试状态哈希"""
-        state = GameState()
         state.frame_id = 100
         
         hash1 = state.compute_state_hash()
@@ -517,6 +820,174 @@ class TestGameState:
         
         assert hash1 != hash2
     
+    def test_snapshot_hash_matches_state_hash(self, state):
+        """测试快照哈希与当前状态哈希一致，且随实体变化"""
+        state.frame_id = 5
+        entity = Entity.from_float(1, 10.0, 20.0)
+        state.add_entity(entity)
+        
+        snapshot = state.save_snapshot()
+        assert snapshot.hash == state.compute_state_hash()
+        assert len(snapshot.hash) == 32
+        
+        entity.x += 1
+        assert state.compute_state_hash() != snapshot.hash
+    
+    def test_copy_clones_entities(self):
+        """测试状态复制：实体独立，哈希一致，副本不在物理网格中"""
+        engine = PhysicsEngine()
+        entity = Entity.from_float(1, 10.0, 20.0)
+        engine.add_entity(entity)
+        engine.update(1 / 30)
+        state = GameState()
+        state.add_entity(entity)
+        
+        copied = state.copy()
+        clone = copied.get_entity(1)
+        
+        assert clone is not entity
+        assert clone == entity
+        assert clone._cell is None
+        assert copied.compute_state_hash() == state.compute_state_hash()
+        
+        clone.x += 1
+        assert entity.x != clone.x
+        
+        # 回滚后实体是快照中的字典：复制后互不影响
+        state.save_snapshot()
+        state.restore_snapshot(state.frame_id)
+        restored = state.copy()
+        assert restored.entities[1] == state.entities[1]
+        assert restored.entities[1] is not state.entities[1]
+    
+    def test_restored_state_hash(self, state):
+        """测试从快照恢复（实体为字典）后哈希与快照一致，相同数据的实体不会抵消"""
+        state.frame_id = 9
+        state.add_entity(Entity.from_float(1, 10.0, 20.0))
+        state.add_entity(Entity.from_float(2, 30.0, 40.0))
+        snapshot = state.save_snapshot()
+        
+        state.restore_snapshot(9)
+        assert state.compute_state_hash() == snapshot.hash
+        assert state.compute_state_hash() == snapshot.hash
+        
+        twins = GameState()
+        twins.entities = {1: {'hp': 100}, 2: {'hp': 100}}
+        empty = GameState()
+        assert twins.compute_state_digest() != empty.compute_state_digest()
+        twins.entities = {1: {'hp': 90}, 2: {'hp': 90}}
+        assert twins.compute_state_digest() != empty.compute_state_digest()
+    
+    def test_restored_entity_mutation_updates_hash(self, state):
+        """测试恢复后原地修改字典实体：哈希随之变化，已保存的快照不受影响"""
+        state.add_entity(Entity.from_float(1, 10.0, 20.0))
+        first = state.save_snapshot()
+        state.restore_snapshot(0)
+        assert state.compute_state_hash() == first.hash
+        
+        state.entities[1]['x'] += 1
+        assert state.compute_state_hash() != first.hash
+        assert first.entities[1]['x'] == state.entities[1]['x'] - 1
+        
+        state.frame_id = 1
+        second = state.save_snapshot()
+        state.entities[1]['x'] += 1
+        assert second.entities[1]['x'] == state.entities[1]['x'] - 1
+        assert state.save_snapshot().hash == state.compute_state_hash()
+    
+    def test_legacy_hash(self):
+        """测试旧版 JSON + MD5 哈希格式不变"""
+        import hashlib
+        import json
+        
+        snapshot = StateSnapshot(frame_id=3, entities={2: {'id': 2, 'x': 1}, 1: {'id': 1, 'x': 5}})
+        expected = hashlib.md5(json.dumps(
+            {'frame': 3, 'entities': {1: {'id': 1, 'x': 5}, 2: {'id': 2, 'x': 1}}},
+            sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+        
+        assert snapshot.compute_legacy_hash() == expected
+    
+    def test_incremental_hash(self):
+        """测试实体摘要缓存：与快照摘要一致，字段变化后失效，与插入顺序无关"""
+        a = Entity.from_float(1, 10.0, 20.0)
+        b = Entity.from_float(2, 30.0, 40.0)
+        state1 = GameState()
+        state1.add_entity(a)
+        state1.add_entity(b)
+        state2 = GameState()
+        state2.add_entity(Entity.from_float(2, 30.0, 40.0))
+        state2.add_entity(Entity.from_float(1, 10.0, 20.0))
+        
+        assert state1.compute_state_digest() == state2.compute_state_digest()
+        assert a.fast_hash() == entity_digest(a.serialize())
+        
+        a.hp -= 10
+        assert a.fast_hash() == entity_digest(a.serialize())
+        assert state1.compute_state_digest() != state2.compute_state_digest()
+        assert state1.compute_state_digest() == state1.save_snapshot().compute_digest()
+    
+    def test_snapshot_hash_lazy(self):
+        """测试快照哈希在首次访问时才计算"""
+        state = GameState()
+        state.add_entity(Entity.from_float(1, 10.0, 20.0))
+        snapshot = state.save_snapshot()
+        
+        assert snapshot._hash is None
+        assert snapshot.hash == state.compute_state_hash()
+        assert snapshot._hash == snapshot.hash
+        
+        # 构造时给出的哈希直接使用，不重新计算
+        given = StateSnapshot(frame_id=1, entities={}, hash='ab' * 16)
+        assert given.hash == 'ab' * 16
+        assert StateSnapshot(frame_id=1).hash == StateSnapshot(frame_id=1).compute_hash()
+    
+    def test_get_frame_hash(self):
+        """测试按帧获取哈希：已保存的帧返回快照中的值"""
+        state = GameState()
+        entity = Entity.from_float(1, 10.0, 20.0)
+        state.add_entity(entity)
+        state.frame_id = 3
+        saved = state.save_snapshot().hash
+        
+        entity.x += 1
+        assert state.get_frame_hash(3) == saved
+        state.frame_id = 4
+        assert state.get_frame_hash(4) == state.compute_state_hash()
+        assert state.get_frame_hash(2) is None
+    
+    def test_serialize_entity_dispatch(self):
+        """按实体类型缓存的序列化函数"""
+        class Marker:
+            entity_id = 7
+        
+        state = GameState()
+        entity = Entity(entity_id=1, x=fixed(10), y=fixed(20))
+        restored = {'id': 2, 'x': 0}
+        
+        assert state._serialize_entity(entity) == entity.serialize()
+        assert state._serialize_entity(restored) is restored
+        assert state._serialize_entity(Marker()) == {'id': 7}
+        # 第二次调用走缓存，结果不变
+        assert state._serialize_entity(Marker()) == {'id': 7}
+    
+    def test_snapshot_structural_sharing(self):
+        """测试未变化的实体在快照间共享同一份数据"""
+        state = GameState()
+        moving = Entity.from_float(1, 0.0, 0.0)
+        still = Entity.from_float(2, 100.0, 100.0)
+        state.add_entity(moving)
+        state.add_entity(still)
+        
+        state.frame_id = 1
+        snap1 = state.save_snapshot()
+        moving.x += fixed(1).raw
+        state.frame_id = 2
+        snap2 = state.save_snapshot()
+        
+        assert snap2.entities[2] is snap1.entities[2]
+        assert snap2.entities[1] is not snap1.entities[1]
+        assert snap2.entities[1]['x'] == moving.x
+    
     def test_rollback(self):
         """测试回滚"""
         state = GameState()
@@ -536,6 +1007,25 @@ class TestGameState:
         
         # 回滚到不存在的快照
         assert not state.rollback_to(999)
+    
+    def test_snapshot_eviction(self):
+        """测试只保留最近 MAX_SNAPSHOTS 帧的快照，被覆盖的槽位按帧ID校验"""
+        state = GameState()
+        
+        for fid in range(GameState.MAX_SNAPSHOTS + 10):
+            state.frame_id = fid
+            state.save_snapshot()
+        
+        assert len(state.snapshots) == GameState.MAX_SNAPSHOTS
+        assert 9 not in state.snapshots
+        assert 10 in state.snapshots
+        assert not state.restore_snapshot(9)
+        assert sorted(state.snapshots) == list(range(10, GameState.MAX_SNAPSHOTS + 10))
+        
+        # 回滚后重新保存同一帧，淘汰旧对象时不能误删新快照
+        state.frame_id = 10
+        resaved = state.save_snapshot()
+        assert state.snapshots[10] is resaved
 
 
 class TestStateValidator:
@@ -548,18 +1038,52 @@ class TestStateValidator:
         validator.record_hash(1, "abc123")
         
         assert validator.verify_hash(1, "abc123")
-        assert not validator.verify_hash(1, "xyz789")
+        assert not validator.verify_hash(1, "def789")
     
     def test_mismatch_tracking(self):
         """测试不匹配追踪"""
         validator = StateValidator()
         
         validator.record_hash(1, "abc")
-        validator.verify_hash(1, "xyz")
+        validator.verify_hash(1, "def")
         
         mismatches = validator.get_mismatches()
         assert len(mismatches) == 1
         assert mismatches[0]['frame_id'] == 1
+    
+    def test_digest_verification(self):
+        """测试整数摘要校验及十六进制互转"""
+        state = GameState()
+        state.frame_id = 7
+        state.add_entity(Entity.from_float(1, 10.0, 20.0))
+        
+        digest = state.compute_state_digest()
+        assert digest_to_hex(digest) == state.compute_state_hash()
+        assert hex_to_digest(state.compute_state_hash()) == digest
+        
+        validator = StateValidator()
+        validator.record_hash(7, digest)
+        assert validator.verify_hash(7, digest)
+        assert not validator.verify_hash(7, digest ^ 1)
+        
+        # 十六进制哈希在入口处转换，与整数摘要可以混用
+        assert validator.verify_hash(7, state.compute_state_hash())
+        validator.record_hash(8, state.compute_state_hash())
+        assert validator.hash_history[8] == digest
+        assert not validator.verify_hash(8, digest_to_hex(digest ^ 1))
+        assert validator.get_mismatches()[-1]['expected'] == digest ^ 1
+    
+    def test_verify_range(self):
+        """测试批量验证与逐帧验证一致"""
+        validator = StateValidator()
+        for fid in range(10, 15):
+            validator.record_hash(fid, fid * 100)
+        
+        results = validator.verify_range(12, [1200, 1301, 1400, 0])
+        
+        assert results == [True, False, True, True]
+        assert [m['frame_id'] for m in validator.get_mismatches()] == [13]
+        assert validator.get_mismatches()[0]['actual'] == 1300
 
 
 # ==================== 运行测试 ====================
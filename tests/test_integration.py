@@ -8,6 +8,7 @@ Integration tests for frame synchronization
 
 import pytest
 import asyncio
+import struct
 import time
 from typing import List, Dict
 import sys
@@ -23,30 +24,52 @@ from core.state import GameState, StateValidator
 from core.rng import DeterministicRNG
 from core.fixed import fixed, FixedPoint
 from core.config import CONFIG
-from server.main import GameServer, RateLimiter, MessageValidator
+from server.main import GameServer, RateLimiter, MessageValidator, _pack
 from client.game_client import GameClient
 from client.predictor import ClientPredictor
 
 
+# 按 (player_id, flags) 缓存的序列化输入模板，生成时只改写头部的 frame_id
+_INPUT_TEMPLATES: Dict[tuple, bytearray] = {}
+_INPUT_FRAME_ID = struct.Struct(PlayerInput.FORMAT[:2])
+
+
+def make_input(frame_id: int, player_id: int, flags: int) -> bytes:
+    """与 PlayerInput(frame_id, player_id, flags).serialize() 相同，但不重复构造和序列化"""
+    buf = _INPUT_TEMPLATES.get((player_id, flags))
+    if buf is None:
+        buf = _INPUT_TEMPLATES[(player_id, flags)] = bytearray(
+            PlayerInput(frame_id=0, player_id=player_id, flags=flags).serialize())
+    _INPUT_FRAME_ID.pack_into(buf, 0, frame_id)
+    return bytes(buf)
+
+
 # ==================== 帧同步集成测试 ====================
 
 class TestFrameSyncIntegration:
     """帧同步集成测试"""
     
+    def test_make_input_matches_serialize(self):
+        """测试模板生成的输入与逐个序列化的结果一致（模板复用不会串帧）"""
+        a = make_input(5, 1, InputFlags.MOVE_LEFT)
+        b = make_input(70000, 1, InputFlags.MOVE_LEFT)
+        
+        assert (a, b) == (
+            PlayerInput(frame_id=5, player_id=1, flags=InputFlags.MOVE_LEFT).serialize(),
+            PlayerInput(frame_id=70000, player_id=1, flags=InputFlags.MOVE_LEFT).serialize(),
+        )
+    
     def test_full_frame_cycle(self):
         """测试完整帧周期"""
         # 1. 创建帧引擎
         engine = FrameEngine(player_count=2, buffer_size=2)
         
-        # 2. 模拟多帧
+        # 2. 模拟多帧（每个玩家的输入标志在循环外取好）
+        player_flags = (InputFlags.MOVE_RIGHT, InputFlags.MOVE_LEFT)
         for frame_id in range(10):
             # 收集输入
-            for player_id in range(2):
-                input_data = PlayerInput(
-                    frame_id=frame_id,
-                    player_id=player_id,
-                    flags=InputFlags.MOVE_RIGHT if player_id == 0 else InputFlags.MOVE_LEFT
-                ).serialize()
+            for player_id, flags in enumerate(player_flags):
+                input_data = make_input(frame_id, player_id, flags)
                 engine.add_input(frame_id, player_id, input_data)
             
             # 执行帧
@@ -78,13 +101,12 @@ class TestFrameSyncIntegration:
             physics1.add_entity(e1)
             physics2.add_entity(e2)
         
-        # 模拟相同输入
+        # 模拟相同输入：客户端1批量应用，客户端2逐个应用，结果应完全一致
         player_speed = int(CONFIG.game.PLAYER_SPEED * FixedPoint.SCALE)
+        inputs = [(i, InputFlags.MOVE_RIGHT if i % 2 == 0 else InputFlags.MOVE_LEFT) for i in range(4)]
         for frame in range(100):
-            for i in range(4):
-                # 相同输入
-                flags = InputFlags.MOVE_RIGHT if i % 2 == 0 else InputFlags.MOVE_LEFT
-                physics1.apply_input(i, flags, player_speed)
+            physics1.batch_apply_inputs(inputs, player_speed)
+            for i, flags in inputs:
                 physics2.apply_input(i, flags, player_speed)
             
             physics1.update(33)
@@ -152,20 +174,23 @@ class TestClientPredictionIntegration:
         
         predictor = ClientPredictor(game_state, physics, player_id=0)
         
+        move_right = InputFlags.MOVE_RIGHT
+        move_left = InputFlags.MOVE_LEFT
+        
         # 执行多次预测
         for i in range(10):
-            my_input = PlayerInput(frame_id=i, player_id=0, flags=InputFlags.MOVE_RIGHT).serialize()
+            my_input = make_input(i, 0, move_right)
             predictor.predict_frame(i, my_input, other_players=[1])
         
         # 模拟服务器帧（一半正确，一半错误）
         for i in range(10):
-            my_input = PlayerInput(frame_id=i, player_id=0, flags=InputFlags.MOVE_RIGHT).serialize()
+            my_input = make_input(i, 0, move_right)
             
             # 偶数帧正确，奇数帧错误
             if i % 2 == 0:
                 server_inputs = {0: my_input, 1: b''}
             else:
-                server_inputs = {0: my_input, 1: PlayerInput(frame_id=i, player_id=1, flags=InputFlags.MOVE_LEFT).serialize()}
+                server_inputs = {0: my_input, 1: make_input(i, 1, move_left)}
             
             server_frame = Frame(frame_id=i, inputs=server_inputs, confirmed=True)
             predictor.on_server_frame(server_frame, other_players=[1])
@@ -173,6 +198,33 @@ class TestClientPredictionIntegration:
         # 验证统计
         stats = predictor.get_stats()
         assert stats['prediction_count'] == 10
+    
+    def test_rollback_keeps_shared_entities(self):
+        """测试回滚后游戏状态与物理引擎仍共享同一实体对象"""
+        game_state = GameState()
+        physics = PhysicsEngine()
+        
+        player = Entity.from_float(1, 100.0, 200.0)
+        game_state.add_entity(player)
+        game_state.bind_player_entity(0, 1)
+        physics.add_entity(player)
+        
+        predictor = ClientPredictor(game_state, physics, player_id=0)
+        my_input = make_input(1, 0, InputFlags.MOVE_RIGHT)
+        predictor.predict_frame(1, my_input, other_players=[1])
+        
+        server_frame = Frame(frame_id=1, confirmed=True,
+                             inputs={0: my_input, 1: make_input(1, 1, InputFlags.MOVE_LEFT)})
+        result = predictor.on_server_frame(server_frame, other_players=[1])
+        
+        assert result.rollback_needed
+        assert game_state.get_entity(1) is player
+        assert physics.get_entity(1) is player
+        
+        # 回滚后的继续模拟应反映在游戏状态上
+        x_before = player.x
+        predictor.predict_frame(2, make_input(2, 0, InputFlags.MOVE_RIGHT), other_players=[1])
+        assert game_state.get_entity(1).x > x_before
 
 
 class TestReplayIntegration:
@@ -187,10 +239,12 @@ class TestReplayIntegration:
         recorder.start_recording(player_ids=[0, 1])
         
         # 录制帧
+        move_right = InputFlags.MOVE_RIGHT
+        move_left = InputFlags.MOVE_LEFT
         for i in range(100):
             inputs = {
-                0: PlayerInput(frame_id=i, player_id=0, flags=InputFlags.MOVE_RIGHT).serialize(),
-                1: PlayerInput(frame_id=i, player_id=1, flags=InputFlags.MOVE_LEFT).serialize()
+                0: make_input(i, 0, move_right),
+                1: make_input(i, 1, move_left)
             }
             recorder.record_frame(i, inputs)
         
@@ -223,6 +277,243 @@ class TestReplayIntegration:
         # 清理
         os.remove(filename)
     
+    def test_load_legacy_json_replay(self):
+        """测试读取旧版 JSON 格式回放文件"""
+        import json
+        import zlib
+        from core.replay import ReplayRecorder, ReplayHeader, ReplayFrame
+        
+        frames = [ReplayFrame(frame_id=i, inputs={0: b'\x01\x02'}, timestamp=float(i))
+                  for i in range(5)]
+        data = json.dumps({
+            'header': ReplayHeader(player_ids=[0], frame_count=5).to_dict(),
+            'frames': [f.to_dict() for f in frames]
+        }).encode('utf-8')
+        
+        filename = '/tmp/test_replay_legacy.fsrp'
+        with open(filename, 'wb') as f:
+            f.write(b'FSRP')
+            f.write(zlib.compress(data))
+        
+        loaded = ReplayRecorder.load(filename)
+        os.remove(filename)
+        
+        assert loaded.header.frame_count == 5
+        assert loaded.frames[3].inputs == {0: b'\x01\x02'}
+    
+    def test_uncompressed_roundtrip(self):
+        """测试不压缩保存后原样读回"""
+        from core.replay import ReplayRecorder
+        
+        recorder = ReplayRecorder(player_count=2)
+        recorder.start_recording(player_ids=[0, 1])
+        for i in range(10):
+            recorder.record_frame(i, {0: bytes([i]), 1: b''})
+        
+        filename = '/tmp/test_replay_raw.fsrp'
+        recorder.save(filename, compress=False)
+        loaded = ReplayRecorder.load(filename)
+        os.remove(filename)
+        
+        assert [f.inputs for f in loaded.frames] == [f.inputs for f in recorder.frames]
+        assert [f.timestamp for f in loaded.frames] == [f.timestamp for f in recorder.frames]
+    
+    def test_zstd_dictionary_roundtrip(self):
+        """测试带 zstd 字典的保存/加载"""
+        pytest.importorskip('zstandard')
+        from core.replay import ReplayRecorder, train_replay_dictionary
+        
+        samples = []
+        for seed in range(8):
+            sample = ReplayRecorder(player_count=2)
+            sample.start_recording(player_ids=[0, 1])
+            for i in range(300):
+                sample.record_frame(i, {0: bytes([i % 7, seed]), 1: bytes([i % 5])})
+            samples.append(sample)
+        zstd_dict = train_replay_dictionary(samples, dict_size=1024)
+        
+        filename = '/tmp/test_replay_dict.fsrp'
+        samples[0].save(filename, zstd_dict=zstd_dict)
+        with pytest.raises(ValueError):
+            ReplayRecorder.load(filename)
+        loaded = ReplayRecorder.load(filename, zstd_dict=zstd_dict)
+        os.remove(filename)
+        
+        assert loaded.inputs == samples[0].inputs
+    
+    @pytest.mark.parametrize('compress', [True, False])
+    def test_stream_recording(self, compress):
+        """测试流式录制：边录边写盘，内存不保留帧，可截断读取"""
+        from core.replay import ReplayRecorder
+        
+        filename = '/tmp/test_replay_stream.fsrp'
+        recorder = ReplayRecorder(player_count=2)
+        recorder.start_recording(player_ids=[0, 1], stream_to=filename, compress=compress)
+        for i in range(50):
+            recorder.record_frame(i, {0: bytes([i]), 1: b''})
+        assert len(recorder.frames) == 0
+        assert recorder.get_stats()['frame_count'] == 50
+        recorder.stop_recording()
+        assert ReplayRecorder.open(filename).get_stats()['frame_count'] == 50
+        
+        loaded = ReplayRecorder.load(filename)
+        assert loaded.header.frame_count == 50
+        assert loaded.header.player_ids == [0, 1]
+        assert list(loaded.frame_ids) == list(range(50))
+        assert loaded.inputs[7] == {0: b'\x07', 1: b''}
+        
+        if not compress:
+            # 录制中途崩溃：丢弃末尾不完整的记录
+            with open(filename, 'rb') as f:
+                data = f.read()
+            with open(filename, 'wb') as f:
+                f.write(data[:-3])
+            assert len(ReplayRecorder.load(filename).frames) == 49
+        os.remove(filename)
+    
+    def test_stream_playback(self):
+        """测试流式回放：逐帧读取文件，支持跳转"""
+        from core.replay import ReplayRecorder, ReplayPlayer
+        
+        filename = '/tmp/test_replay_stream_play.fsrp'
+        recorder = ReplayRecorder(player_count=1)
+        recorder.start_recording(player_ids=[0], stream_to=filename)
+        for i in range(30):
+            recorder.record_frame(i * 2, {0: bytes([i])})
+        recorder.stop_recording()
+        
+        player = ReplayPlayer.from_file(filename, stream=True)
+        assert player.is_streaming
+        assert len(player.recorder.frames) == 0
+        assert player.get_total_frames() == 30
+        assert [f.frame_id for f in player.recorder.iter_frames()] == list(range(0, 60, 2))
+        
+        player.play()
+        assert player.get_next_frame().frame_id == 0
+        assert player.seek_to_frame(21)
+        assert player.get_next_frame().frame_id == 22
+        assert not player.seek_to_frame(100)
+        assert player.get_next_frame().frame_id == 24
+        
+        played = 0
+        while player.get_next_frame() is not None:
+            played += 1
+        assert played == 17
+        assert player.get_current_time() > 0
+        os.remove(filename)
+    
+    def test_size_estimate(self):
+        """测试体积估算随录制累加，且与精确体积接近"""
+        from core.replay import ReplayRecorder
+        
+        recorder = ReplayRecorder(player_count=2)
+        recorder.start_recording(player_ids=[0, 1])
+        for i in range(200):
+            recorder.record_frame(i, {0: b'\x01\x02\x03\x04', 1: b''})
+        
+        estimate = recorder.get_stats()['file_size_estimate']
+        exact = recorder.get_exact_size()
+        assert estimate == 200 * (17 + 7 + 3)
+        assert estimate <= exact < estimate + 512
+        assert recorder.get_exact_size() == exact
+        
+        recorder.record_frame(200, {0: b'\x01'})
+        assert recorder.get_exact_size() > exact
+    
+    def test_record_frame_ownership(self):
+        """测试 record_frame 默认不复制输入，copy=True 时复制"""
+        from core.replay import ReplayRecorder
+        
+        recorder = ReplayRecorder(player_count=1)
+        recorder.start_recording(player_ids=[0])
+        shared = {0: b'\x01'}
+        recorder.record_frame(0, shared)
+        recorder.record_frame(1, shared, copy=True)
+        shared[0] = b'\x02'
+        
+        assert recorder.inputs[0] is shared
+        assert recorder.inputs[1] == {0: b'\x01'}
+    
+    def test_replay_dataclasses_use_slots(self):
+        """测试回放/快照数据类没有实例 __dict__"""
+        from core.replay import ReplayFrame, ReplayHeader
+        from core.state import StateSnapshot
+        
+        for obj in (ReplayFrame(frame_id=0, inputs={}), ReplayHeader(), StateSnapshot(frame_id=0)):
+            assert not hasattr(obj, '__dict__')
+        assert ReplayHeader.from_dict(ReplayHeader(seed=3).to_dict()).seed == 3
+    
+    def test_recorder_columns(self):
+        """测试录制器按列存储，frames 视图与旧版逐帧 msgpack 格式兼容"""
+        import msgpack
+        from core.replay import ReplayRecorder, ReplayHeader
+        
+        recorder = ReplayRecorder(player_count=1)
+        recorder.start_recording(player_ids=[0])
+        for i in range(4):
+            recorder.record_frame(i * 2, {0: bytes([i])})
+        
+        assert list(recorder.frame_ids) == [0, 2, 4, 6]
+        assert len(recorder.frames) == 4
+        assert recorder.frames[-1].frame_id == 6
+        assert [f.inputs for f in recorder.frames[1:3]] == [{0: b'\x01'}, {0: b'\x02'}]
+        
+        filename = '/tmp/test_replay_tuples.fsrp'
+        with open(filename, 'wb') as f:
+            f.write(b'FSRU')
+            f.write(msgpack.packb({
+                'header': ReplayHeader(player_ids=[0]).to_dict(),
+                'frames': [fr.to_tuple() for fr in recorder.frames]
+            }, use_bin_type=True))
+        loaded = ReplayRecorder.load(filename)
+        os.remove(filename)
+        
+        assert loaded.frame_ids == recorder.frame_ids
+        assert loaded.timestamps == recorder.timestamps
+        assert loaded.inputs == recorder.inputs
+    
+    def test_analyzer_input_frequency(self):
+        """测试输入统计：一次遍历覆盖所有玩家，追加帧后增量更新"""
+        from core.replay import ReplayRecorder, ReplayAnalyzer
+        
+        recorder = ReplayRecorder(player_count=2)
+        recorder.start_recording(player_ids=[0, 1])
+        for i in range(10):
+            recorder.record_frame(i, {0: b'\x01' if i % 2 else b'', 1: b'\x02'})
+        
+        analyzer = ReplayAnalyzer(recorder)
+        stats = analyzer.get_input_frequency(0)
+        assert (stats['input_frames'], stats['empty_frames']) == (5, 5)
+        assert analyzer.get_input_frequency(1)['input_rate'] == 1.0
+        assert analyzer.get_input_frequency(9)['input_frames'] == 0
+        
+        recorder.record_frame(10, {0: b'\x01'})
+        assert analyzer.get_input_frequency(0)['input_frames'] == 6
+        assert analyzer.get_input_frequency(1)['total_frames'] == 11
+        
+        recorder.start_recording(player_ids=[0, 1])
+        assert analyzer.get_input_frequency(0)['input_frames'] == 0
+    
+    def test_analyzer_lag_frames(self):
+        """测试回放分析器的帧间隔统计和延迟帧检测"""
+        from core.replay import ReplayRecorder, ReplayAnalyzer, ReplayFrame
+        
+        recorder = ReplayRecorder(player_count=1)
+        timestamps = [0.0, 0.033, 0.066, 0.5, 0.533]
+        recorder.frames = [ReplayFrame(frame_id=i, inputs={}, timestamp=t)
+                           for i, t in enumerate(timestamps)]
+        
+        analyzer = ReplayAnalyzer(recorder)
+        
+        assert analyzer.get_frame_times() == pytest.approx([0.033, 0.033, 0.434, 0.033])
+        assert analyzer.get_average_frame_time() == pytest.approx(0.533 / 4)
+        assert analyzer.detect_lag_frames(threshold=0.1) == [2]
+        
+        # 录制新帧后统计随之更新
+        recorder.is_recording = True
+        recorder.record_frame(5, {})
+        assert len(analyzer.get_frame_times()) == 5
+    
     def test_replay_seek(self):
         """测试回放跳转"""
         from core.replay import ReplayRecorder, ReplayPlayer
@@ -245,11 +536,341 @@ class TestReplayIntegration:
         # 获取下一帧应该是50或之后
         frame = player.get_next_frame()
         assert frame.frame_id >= 50
+    
+    def test_replay_seek_gaps(self):
+        """测试帧ID/时间戳不连续时跳转到第一个不小于目标的帧"""
+        from core.replay import ReplayRecorder, ReplayPlayer, ReplayFrame
+        
+        recorder = ReplayRecorder(player_count=1)
+        recorder.header.start_time = 100.0
+        recorder.frames = [ReplayFrame(frame_id=i * 10, inputs={}, timestamp=100.0 + i)
+                           for i in range(5)]
+        player = ReplayPlayer(recorder)
+        
+        assert player.seek_to_frame(25)
+        assert player.current_frame_index == 3
+        assert player.seek_to_frame(0)
+        assert player.current_frame_index == 0
+        assert not player.seek_to_frame(41)
+        
+        assert player.seek_to_time(1.5)
+        assert player.current_frame_index == 2
+        assert not player.seek_to_time(4.5)
+
+
+class _FakeWebSocket:
+    """记录发送内容的假连接"""
+    
+    def __init__(self):
+        self.sent: List[bytes] = []
+        self.closed = False
+    
+    async def send(self, data: bytes):
+        self.sent.append(data)
+    
+    async def close(self, code: int = 1000, reason: str = ''):
+        self.closed = True
+
+
+async def _flush_sends():
+    """让出事件循环，等各玩家的发送任务写完队列中的消息"""
+    for _ in range(3):
+        await asyncio.sleep(0)
 
 
 class TestNetworkIntegration:
     """网络集成测试"""
     
+    def test_broadcast_encodes_once(self):
+        """测试房间广播只编码一次，所有接收者收到同一份字节"""
+        import msgpack
+        
+        server = GameServer()
+        sockets = {f'player_{i}': _FakeWebSocket() for i in range(3)}
+        
+        async def scenario():
+            for player_id, ws in sockets.items():
+                await server._join_room(player_id, 'room', ws)
+            await _flush_sends()
+            for ws in sockets.values():
+                ws.sent.clear()
+            await server._broadcast_to_room('room', _pack({'type': 'ping', 'payload': {}}),
+                                            exclude_player='player_0')
+            await _flush_sends()
+        
+        asyncio.run(scenario())
+        
+        assert sockets['player_0'].sent == []
+        first = sockets['player_1'].sent[0]
+        assert sockets['player_2'].sent[0] is first
+        assert msgpack.unpackb(first, raw=False) == {'type': 'ping', 'payload': {}}
+    
+    def test_sender_task_lifecycle(self):
+        """测试发送任务按入队顺序发送，玩家断线后任务被取消"""
+        import msgpack
+        
+        server = GameServer()
+        ws = _FakeWebSocket()
+        
+        async def scenario():
+            await server._join_room('player_0', 'room', ws)
+            player = server.players['player_0']
+            await _flush_sends()
+            await server._send_to_player('player_0', _pack({'type': 'a'}))
+            await _flush_sends()
+            await server._send_to_player('player_0', _pack({'type': 'b'}))
+            await _flush_sends()
+            await server._handle_disconnect('player_0')
+            await _flush_sends()
+            return player.sender_task
+        
+        task = asyncio.run(scenario())
+        
+        types = [msgpack.unpackb(m, raw=False)['type'] for m in ws.sent]
+        assert types == ['join_success', 'a', 'b']
+        assert task.cancelled()
+    
+    def test_slow_client_backpressure(self):
+        """测试发送队列满时不丢弃已排队的消息，而是断开并立即移除慢客户端"""
+        import msgpack
+        import server.main as server_main
+        
+        class StalledWebSocket(_FakeWebSocket):
+            async def send(self, data: bytes):
+                await asyncio.Event().wait()
+        
+        server = GameServer()
+        ws = StalledWebSocket()
+        peer = _FakeWebSocket()
+        
+        async def scenario():
+            await server._join_room('player_0', 'room', ws)
+            await server._join_room('player_1', 'room', peer)
+            await _flush_sends()
+            player = server.players['player_0']
+            # 每次广播后让发送任务运行，正常客户端及时取走消息
+            for i in range(server_main.SEND_QUEUE_SIZE + 10):
+                await server._broadcast_to_room('room', _pack({'type': 'n', 'payload': {'i': i}}))
+                await _flush_sends()
+            removed = 'player_0' not in server.players and 'player_0' not in server.rooms['room'].players
+            
+            # 不等旧连接关闭握手即可重新认证；旧连接随后断开不影响新连接
+            rejoined = await server._join_room('player_0', 'room', _FakeWebSocket())
+            await server._handle_disconnect('player_0', ws)
+            await _flush_sends()
+            return (player, removed, rejoined,
+                    [msgpack.unpackb(m, raw=False)['payload']['i']
+                     for m in list(player.send_queue._queue)])
+        
+        player, removed, rejoined, queued = asyncio.run(scenario())
+        
+        # 队列里保留的是最早的消息（没有缺口），溢出的客户端被断开
+        assert queued == list(range(server_main.SEND_QUEUE_SIZE))
+        assert player.closing and ws.closed
+        assert removed and rejoined
+        assert server.players['player_0'] is not player
+        received = []
+        for data in peer.sent:
+            message = msgpack.unpackb(data, raw=False)
+            if message['type'] == 'batch':
+                received.extend(msgpack.unpackb(m, raw=False) for m in message['payload']['messages'])
+            else:
+                received.append(message)
+        assert {'type': 'player_left', 'payload': {'player_id': 'player_0'}} in received
+    
+    def test_duplicate_player_id_rejected(self):
+        """测试重复的 player_id 被拒绝，原连接和发送任务不受影响"""
+        server = GameServer()
+        first, second = _FakeWebSocket(), _FakeWebSocket()
+        
+        async def scenario():
+            await server._join_room('player_0', 'room', first)
+            player = server.players['player_0']
+            ok = await server._join_room('player_0', 'other', second)
+            await _flush_sends()
+            return ok, player
+        
+        ok, player = asyncio.run(scenario())
+        
+        assert not ok
+        assert second.closed and not first.closed
+        assert server.players['player_0'] is player
+        assert list(server.rooms) == ['room']
+    
+    def test_broadcast_targets_follow_membership(self):
+        """测试广播目标缓存随玩家加入/离开更新"""
+        server = GameServer()
+        
+        async def scenario():
+            for i in range(3):
+                await server._join_room(f'player_{i}', 'room', _FakeWebSocket())
+            room = server.rooms['room']
+            joined = {pid for pid, _ in room.broadcast_targets}
+            await server._handle_disconnect('player_1')
+            left = {pid for pid, _ in room.broadcast_targets}
+            return joined, left
+        
+        joined, left = asyncio.run(scenario())
+        
+        assert joined == {'player_0', 'player_1', 'player_2'}
+        assert left == {'player_0', 'player_2'}
+    
+    def test_room_players_in_join_order(self):
+        """测试房间按加入顺序保存玩家对象"""
+        import msgpack
+        
+        server = GameServer()
+        ws = _FakeWebSocket()
+        
+        async def scenario():
+            for player_id in ('player_2', 'player_0'):
+                await server._join_room(player_id, 'room', _FakeWebSocket())
+            await server._join_room('player_1', 'room', ws)
+            await _flush_sends()
+        
+        asyncio.run(scenario())
+        
+        room = server.rooms['room']
+        assert list(room.players) == ['player_2', 'player_0', 'player_1']
+        assert room.players['player_1'] is server.players['player_1']
+        join = msgpack.unpackb(ws.sent[0], raw=False)
+        assert join['payload']['players'] == ['player_2', 'player_0', 'player_1']
+    
+    def test_sender_coalesces_backlog(self):
+        """测试发送队列积压时合并成一条 batch 消息，顺序不变"""
+        import msgpack
+        
+        server = GameServer()
+        ws = _FakeWebSocket()
+        
+        async def scenario():
+            await server._join_room('player_0', 'room', ws)
+            await server._send_to_player('player_0', _pack({'type': 'a'}))
+            await server._send_to_player('player_0', _pack({'type': 'b'}))
+            await _flush_sends()
+        
+        asyncio.run(scenario())
+        
+        assert len(ws.sent) == 1
+        batch = msgpack.unpackb(ws.sent[0], raw=False)
+        assert batch['type'] == 'batch'
+        types = [msgpack.unpackb(m, raw=False)['type'] for m in batch['payload']['messages']]
+        assert types == ['join_success', 'a', 'b']
+    
+    def test_frame_loop_keeps_cadence(self):
+        """测试帧循环按固定截止时间推进，不会多跑或明显少跑"""
+        server = GameServer()
+        server.FRAME_TIME = 0.01
+        server.running = True
+        
+        async def scenario():
+            task = asyncio.create_task(server._frame_loop())
+            await asyncio.sleep(0.1)
+            server.running = False
+            await task
+        
+        asyncio.run(scenario())
+        
+        assert 5 <= server.current_frame <= 12
+    
+    def test_numeric_id_parsed_on_join(self):
+        """测试数字ID在加入房间时解析一次，输入直接使用该ID"""
+        server = GameServer()
+        
+        async def scenario():
+            await server._join_room('player_3', 'room', _FakeWebSocket())
+            await server._handle_input('player_3', {'frame_id': 0, 'input_data': b'\x01'})
+        
+        asyncio.run(scenario())
+        
+        assert server.players['player_3'].numeric_id == 3
+        assert server.rooms['room'].frame_engine.frame_buffer.pending_inputs[0] == {3: b'\x01'}
+    
+    def test_message_dispatch(self):
+        """测试消息按类型分发，认证后的 auth 消息被忽略"""
+        server = GameServer()
+        
+        async def scenario():
+            await server._join_room('player_0', 'room', _FakeWebSocket())
+            await server._handle_message('player_0', _pack({'type': 'auth', 'payload': {}}))
+            await server._handle_message('player_0', _pack({
+                'type': 'input', 'payload': {'frame_id': 0, 'input_data': b'\x02'}}))
+            counted = server.players['player_0'].message_count
+            await server._handle_message('player_0', _pack({'type': 'leave'}))
+            return counted
+        
+        counted = asyncio.run(scenario())
+        
+        assert counted == 2
+        assert 'player_0' not in server.players
+        assert 'room' not in server.rooms
+    
+    def test_stats_snapshot(self):
+        """测试统计快照在同一帧内复用，帧推进或玩家变化后更新"""
+        server = GameServer()
+        
+        async def scenario():
+            await server._join_room('player_0', 'room', _FakeWebSocket())
+            first = server.get_stats()
+            assert server.get_stats() is first
+            assert first['players'] == 1
+            
+            await server._join_room('player_1', 'room', _FakeWebSocket())
+            second = server.get_stats()
+            assert second['room_details']['room']['players'] == 2
+            
+            server.current_frame += 1
+            assert server.get_stats() is not second
+            
+            await server._handle_disconnect('player_0')
+            assert server.get_stats()['players'] == 1
+        
+        asyncio.run(scenario())
+    
+    def test_anonymize_cached(self):
+        """测试匿名化结果稳定且被缓存"""
+        import hashlib
+        from server.main import _anonymize
+        
+        expected = hashlib.sha256(b'player_7').hexdigest()[:8]
+        assert _anonymize('player_7') == expected
+        hits = _anonymize.cache_info().hits
+        assert _anonymize('player_7') == expected
+        assert _anonymize.cache_info().hits == hits + 1
+    
+    def test_tick_room_isolates_errors(self):
+        """测试一个房间出错不影响其他房间推进"""
+        server = GameServer()
+        
+        async def scenario():
+            for room_id in ('a', 'b'):
+                for i in range(2):
+                    await server._join_room(f'{room_id}_{i}', room_id, _FakeWebSocket())
+            
+            def broken_tick():
+                raise RuntimeError("boom")
+            server.rooms['a'].frame_engine.tick = broken_tick
+            
+            for rid, room in list(server.rooms.items()):
+                await server._tick_room(rid, room)
+        
+        asyncio.run(scenario())
+        
+        assert server.rooms['a'].frame_engine.current_frame == 0
+        assert server.rooms['b'].is_started
+        assert server.rooms['b'].frame_engine.current_frame == 1
+    
+    def test_shared_packer_roundtrip(self):
+        """测试复用的编码器连续编码互不影响，且与 packb 结果一致"""
+        import msgpack
+        
+        first = {'type': 'game_frame', 'payload': {'frame_id': 1, 'inputs': {'0': b'\x01'}}}
+        second = {'type': 'player_left', 'payload': {'player_id': 'player_1'}}
+        
+        assert _pack(first) == msgpack.packb(first)
+        assert msgpack.unpackb(_pack(second), raw=False) == second
+        assert msgpack.unpackb(_pack(first), raw=False) == first
+    
     def test_rate_limiter(self):
         """测试速率限制器"""
         limiter = RateLimiter(max_requests=10, window=1.0)
@@ -263,19 +884,42 @@ class TestNetworkIntegration:
         # 第11次应该拒绝
         assert not limiter.is_allowed(player_id)
     
-    def test_message_validator(self):
-        """测试消息验证器"""
-        import msgpack
+    def test_rate_limiter_sliding_window(self, monkeypatch):
+        """测试滑动窗口：上一窗口计数按比例衰减，空闲两个窗口后清零"""
+        import server.main as server_main
+        
+        clock = [100.0]
+        monkeypatch.setattr(server_main.time, 'monotonic', lambda: clock[0])
+        limiter = RateLimiter(max_requests=10, window=1.0)
+        
+        for _ in range(10):
+            assert limiter.is_allowed("p")
+        assert not limiter.is_allowed("p")
+        
+        # 刚进入新窗口时上一窗口的 10 次仍全部计入
+        clock[0] = 101.0
+        assert not limiter.is_allowed("p")
+        
+        # 过半个窗口后只计入一半
+        clock[0] = 101.5
+        allowed = sum(limiter.is_allowed("p") for _ in range(10))
+        assert allowed == 5
         
+        # 空闲超过两个窗口后重新计数
+        clock[0] = 104.0
+        assert sum(limiter.is_allowed("p") for _ in range(11)) == 10
+    
+    def test_message_validator(self):
+        """测试消息验证器（消息用服务器共享的编码器构造）"""
         # 有效消息
-        valid_msg = msgpack.packb({
+        valid_msg = _pack({
             'type': 'input',
             'payload': {'frame_id': 1}
         })
         assert MessageValidator.validate(valid_msg) is not None
         
         # 无效类型
-        invalid_type = msgpack.packb({
+        invalid_type = _pack({
             'type': 'invalid',
             'payload': {}
         })
@@ -286,9 +930,11 @@ class TestNetworkIntegration:
         assert MessageValidator.validate(large_msg) is None
 
 
+
 class TestDeterminismIntegration:
     """确定性集成测试"""
     
+
     def test_cross_platform_determinism(self):
         """测试跨平台确定性"""
         # 模拟两个不同平台的客户端
@@ -355,13 +1001,13 @@ class TestSecurityIntegration:
         """测试输入验证集成"""
         validator = InputValidator(max_apm=600)
         
-        # 正常输入
+        # 正常输入（同一个输入对象重复校验即可）
+        input_data = PlayerInput(
+            frame_id=1,
+            player_id=1,
+            flags=InputFlags.MOVE_RIGHT
+        )
         for _ in range(50):
-            input_data = PlayerInput(
-                frame_id=1,
-                player_id=1,
-                flags=InputFlags.MOVE_RIGHT
-            )
             assert validator.validate(1, input_data)
         
         # 帧ID验证
@@ -371,36 +1017,268 @@ class TestSecurityIntegration:
         assert not validator.validate_frame_id(300, 100)
     
     def test_replay_attack_prevention(self):
-        """测试重放攻击防护"""
-        # 模拟服务器端的重放检测
-        processed_frames = set()
+        """测试服务器丢弃重放和过期的输入帧，玩家之间互不影响"""
+        server = GameServer()
+        
+        async def scenario():
+            for i in range(2):
+                await server._join_room(f'player_{i}', 'room', _FakeWebSocket())
+            await server._handle_input('player_0', {'frame_id': 2, 'input_data': b'a'})
+            # 同一帧重放、比已处理帧更旧的帧都被丢弃
+            await server._handle_input('player_0', {'frame_id': 2, 'input_data': b'b'})
+            await server._handle_input('player_0', {'frame_id': 1, 'input_data': b'c'})
+            # 其他玩家有各自的帧号
+            await server._handle_input('player_1', {'frame_id': 1, 'input_data': b'd'})
+        
+        asyncio.run(scenario())
+        
+        pending = server.rooms['room'].frame_engine.frame_buffer.pending_inputs
+        p0 = server.players['player_0'].numeric_id
+        p1 = server.players['player_1'].numeric_id
+        assert pending == {2: {p0: b'a'}, 1: {p1: b'd'}}
+        assert server.players['player_0'].last_input_frame == 2
+
+# ==================== 调试工具测试 ====================
+
+class TestDebugTools:
+    """调试工具测试"""
+    
+    def test_canonical_hash(self):
+        """测试规范哈希与键顺序无关，且能区分不同的值"""
+        from tools.debugger import canonical_hash
+        
+        a = {'frame_id': 1, 'entities': {'2': {'x': 5, 'y': [1, 2]}, '1': {'x': 1}}}
+        b = {'entities': {'1': {'x': 1}, '2': {'y': [1, 2], 'x': 5}}, 'frame_id': 1}
+        
+        assert canonical_hash(a) == canonical_hash(b)
+        assert len(canonical_hash(a)) == 32
+        b['entities']['2']['x'] = 6
+        assert canonical_hash(a) != canonical_hash(b)
+    
+    def test_capture_state_columns(self):
+        """测试调试器按列捕获实体状态"""
+        from tools.debugger import FrameSyncDebugger
+        
+        state = GameState()
+        state.frame_id = 7
+        state.add_entity(Entity(entity_id=3, x=10, y=20, vx=1, vy=-1))
+        state.add_entity(Entity(entity_id=1, x=30, y=40, hp=50))
+        debugger = FrameSyncDebugger()
+        debugger.log(7, 'tick', {}, state)
+        
+        captured = debugger.state_history[7]
+        assert {k: list(v) if k != 'frame_id' else v for k, v in captured.items()} == {
+            'frame_id': 7, 'ids': [3, 1], 'x': [10, 30], 'y': [20, 40],
+            'vx': [1, 0], 'vy': [-1, 0], 'hp': [CONFIG.game.DEFAULT_HP, 50],
+        }
+    
+    def test_compare_states_entity_diffs(self):
+        """测试状态对比只列出不同的实体和字段"""
+        from tools.debugger import FrameSyncDebugger
+        
+        state1, state2 = GameState(), GameState()
+        for eid in range(5):
+            state1.add_entity(Entity(entity_id=eid, x=eid))
+            state2.add_entity(Entity(entity_id=eid, x=eid))
+        state2.get_entity(3).x = 30
+        state2.get_entity(3).hp = 1
+        state1.add_entity(Entity(entity_id=9))
+        
+        diffs = FrameSyncDebugger().compare_states(state1, state2)['entity_diffs']
+        
+        assert sorted(diffs, key=lambda d: d['entity_id']) == [
+            {'x_diff': {'state1': 3, 'state2': 30},
+             'hp_diff': {'state1': CONFIG.game.DEFAULT_HP, 'state2': 1}, 'entity_id': 3},
+            {'entity_id': 9, 'type': 'missing_in_state2'},
+        ]
+    
+    def test_compare_states_skips_entities_on_hash_match(self, monkeypatch):
+        """测试哈希一致时不逐个比较实体，force=True 时仍完整比较"""
+        from tools.debugger import FrameSyncDebugger
+        
+        state1, state2 = GameState(), GameState()
+        for state in (state1, state2):
+            state.add_entity(Entity(entity_id=1, x=5))
+        debugger = FrameSyncDebugger()
+        compared = []
+        original = debugger._compare_entities
+        monkeypatch.setattr(debugger, '_compare_entities',
+                            lambda e1, e2: compared.append(e1) or original(e1, e2))
+        
+        diff = debugger.compare_states(state1, state2)
+        assert (diff['hash_match'], diff['entity_diffs'], compared) == (True, [], [])
+        
+        assert debugger.compare_states(state1, state2, force=True)['entity_diffs'] == []
+        assert len(compared) == 1
+    
+    def test_compare_states_after_in_place_mutation(self):
+        """测试先比较一次，再在同一帧内修改实体后比较，仍能发现差异"""
+        from tools.debugger import FrameSyncDebugger
+        
+        state1, state2 = GameState(), GameState()
+        for state in (state1, state2):
+            state.add_entity(Entity(entity_id=1, x=5))
+        debugger = FrameSyncDebugger()
+        assert debugger.compare_states(state1, state2)['hash_match']
+        
+        state2.get_entity(1).x = 6
+        diff = debugger.compare_states(state1, state2)
+        
+        assert diff['hash_match'] is False
+        assert diff['entity_diffs'] == [{'x_diff': {'state1': 5, 'state2': 6}, 'entity_id': 1}]
+    
+    def test_visualize_frame_timeline(self):
+        """测试帧时间线每行的格式与截断提示"""
+        from tools.debugger import FrameSyncDebugger
         
-        def is_replay(frame_id: int, player_id: int) -> bool:
-            key = (frame_id, player_id)
-            if key in processed_frames:
-                return True
-            processed_frames.add(key)
-            return False
+        frames = [Frame(frame_id=i, inputs={1: b'x', 0: b'' if i else b'y'}, confirmed=i < 2)
+                  for i in range(4)]
         
-        # 第一次不是重放
-        assert not is_replay(1, 1)
+        lines = FrameSyncDebugger().visualize_frame_timeline(frames, max_frames=3).split("\n")
         
-        # 第二次是重放
-        assert is_replay(1, 1)
+        assert lines[3:] == [
+            "Frame    0 | P0:X P1:X | CONFIRMED",
+            "Frame    1 | P0:_ P1:X | CONFIRMED",
+            "Frame    2 | P0:_ P1:X | PENDING",
+            "... and 1 more frames",
+        ]
+    
+    def test_log_hash_follows_in_frame_mutation(self):
+        """测试同一帧内修改实体后，日志记录的是实时哈希"""
+        from tools.debugger import FrameSyncDebugger
+        
+        state = GameState()
+        entity = Entity(entity_id=1)
+        state.add_entity(entity)
+        debugger = FrameSyncDebugger()
+        
+        debugger.log(0, 'before', {}, state)
+        entity.x += 1
+        debugger.log(0, 'after', {}, state)
         
-        # 不同帧不是重放
-        assert not is_replay(2, 1)
+        assert debugger.logs[0].state_hash != debugger.logs[1].state_hash
+        assert debugger.logs[1].state_hash == state.compute_state_hash()
+    
+    def test_find_divergence_point(self):
+        """测试找到最早的不一致帧（只比较双方都有的帧）"""
+        from tools.debugger import FrameSyncDebugger
+        
+        debugger = FrameSyncDebugger()
+        history1 = {f: 'h%d' % f for f in range(100)}
+        history2 = {f: 'h%d' % f for f in range(50, 200)}
+        assert debugger.find_divergence_point(history1, history2) is None
+        
+        history2[80] = history2[60] = 'bad'
+        history1[99] = 'bad'
+        assert debugger.find_divergence_point(history1, history2) == 60
+        assert debugger.divergence_points == [60]
+    
+    def test_export_debug_log_msgpack(self, tmp_path):
+        """测试 .msgpack 调试日志按记录流式导出，内容与 JSON 导出一致"""
+        import json
+        import msgpack
+        from tools.debugger import FrameSyncDebugger
+        
+        debugger = FrameSyncDebugger()
+        for i in range(3):
+            debugger.log(i, 'tick', {'n': i, 'players': {i}})
+        debugger.divergence_points.append(2)
+        debugger.export_debug_log(str(tmp_path / 'debug.msgpack'))
+        debugger.export_debug_log(str(tmp_path / 'debug.json'))
+        
+        with open(tmp_path / 'debug.msgpack', 'rb') as f:
+            header, *logs = msgpack.Unpacker(f, raw=False, use_list=True)
+        with open(tmp_path / 'debug.json') as f:
+            expected = json.load(f)
+        
+        assert (header['divergence_points'], header['log_count']) == ([2], 3)
+        assert [dict(zip(header['fields'], log)) for log in logs] == expected['logs']
+        assert not hasattr(debugger.logs[0], '__dict__')
+    
+    def test_input_analyzer_ring(self):
+        """测试输入分析器只保留最近 capacity 条输入，重复输入检测只看最近 10 条"""
+        from tools.debugger import InputAnalyzer
+        
+        analyzer = InputAnalyzer(capacity=16)
+        for i in range(40):
+            analyzer.record_input(0, i, 1 if i < 30 else 2)
+        
+        ring = analyzer.input_history[0]
+        assert (ring.count, ring.total, ring.recent_flags(11)) == (16, 40, [1] + [2] * 10)
+        assert (ring.last_flags, ring.run_length) == (2, 10)
+        assert analyzer.get_input_frequency(0)['total_inputs'] == 40
+        assert "Repeated identical inputs" in analyzer.detect_suspicious_patterns(0)
+        
+        analyzer.record_input(0, 40, 3)
+        assert "Repeated identical inputs" not in analyzer.detect_suspicious_patterns(0)
+        assert analyzer.get_input_frequency(1) == {}
+        assert analyzer.detect_suspicious_patterns(1) == []
+        assert list(analyzer.input_history) == [0]
+    
+    def test_input_frequency_uses_monotonic_ns(self, monkeypatch):
+        """测试输入频率按单调时钟的整数纳秒计算"""
+        import tools.debugger as debugger_module
+        
+        clock = iter(range(0, 10 ** 9, 20_000_000))  # 每 20ms 一次输入
+        monkeypatch.setattr(debugger_module.time, 'monotonic_ns', lambda: next(clock))
+        analyzer = debugger_module.InputAnalyzer()
+        for i in range(11):
+            analyzer.record_input(0, i, i)
+        
+        assert analyzer.get_input_frequency(0) == \
+            {'total_inputs': 11, 'avg_interval_ms': 20.0, 'frequency': 50.0}
+        assert analyzer.detect_suspicious_patterns(0) == ["High input frequency: 50.0/sec"]
+    
+    def test_network_monitor_keeps_recent_latency(self):
+        """测试网络监控只保留最近 1000 条延迟记录"""
+        from tools.debugger import NetworkMonitor
+        
+        monitor = NetworkMonitor()
+        for i in range(1500):
+            monitor.record_latency(float(i))
+        
+        stats = monitor.get_stats()
+        assert (len(monitor.latency_history), stats['min_latency'], stats['max_latency']) == \
+            (1000, 500.0, 1499.0)
+        assert stats['total_packets'] == 1500
+    
+    @pytest.mark.parametrize("n", [1, 7, 100, 1000])
+    def test_network_monitor_p99(self, n):
+        """测试 p99 与排序取下标的结果一致"""
+        from tools.debugger import NetworkMonitor
+        
+        monitor = NetworkMonitor()
+        rng = DeterministicRNG(n)
+        for value in rng.range_batch(0, 500, n):
+            monitor.record_latency(float(value))
+        
+        expected = sorted(monitor.latency_history)[int(n * 0.99)]
+        assert monitor.get_stats()['p99_latency'] == expected
 
 
 # ==================== 性能测试 ====================
 
+def _best_time(fn, rounds: int = 5) -> float:
+    """
+    先预热一次，再取 rounds 次运行中最短的耗时（秒）
+    
+    最短耗时最接近代码本身的开销，不受调度、GC 等偶发干扰，
+    比单次计时稳定得多。
+    """
+    fn()
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
 class TestPerformance:
     """性能测试"""
     
     def test_physics_performance(self):
         """测试物理性能"""
-        import time
-        
         physics = PhysicsEngine()
         
         # 创建100个实体
@@ -409,33 +1287,23 @@ class TestPerformance:
             physics.add_entity(entity)
         
         # 测量100帧的执行时间
-        start = time.time()
-        for _ in range(100):
-            physics.update(33)
-        elapsed = time.time() - start
+        elapsed = _best_time(lambda: physics.update(33, steps=100))
         
         # 应该在合理时间内完成
         assert elapsed < 1.0  # 1秒内完成100帧
     
     def test_frame_engine_throughput(self):
         """测试帧引擎吞吐量"""
-        import time
+        from itertools import repeat
         
         engine = FrameEngine(player_count=4)
         
-        start = time.time()
-        frames = 0
+        inputs = {player_id: b'input' for player_id in range(4)}
         
-        while frames < 1000:
-            for player_id in range(4):
-                engine.add_input(frames, player_id, b'input')
-            
-            frame = engine.tick()
-            if frame:
-                frames += 1
+        def run():
+            assert len(engine.run_n(repeat(inputs, 1000))) == 1000
         
-        elapsed = time.time() - start
-        throughput = frames / elapsed
+        throughput = 1000 / _best_time(run)
         
         # 应该能达到高吞吐量
         assert throughput > 1000  # 每秒至少1000帧
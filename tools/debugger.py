@@ -3,12 +3,19 @@
 Debugging tools for frame synchronization
 """
 
+import heapq
 import json
 import time
+from array import array
+from collections import defaultdict, deque
+from functools import partial
+from operator import attrgetter
 from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 import hashlib
 
+import msgpack
+
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -16,9 +23,43 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.frame import Frame
 from core.state import GameState
 from core.physics import Entity
+from core.state import HASH_DIGEST_SIZE
+
+
+def _canonical(obj):
+    """递归按键排序字典，得到与键插入顺序无关的结构"""
+    if isinstance(obj, dict):
+        return {k: _canonical(obj[k]) for k in sorted(obj)}
+    if isinstance(obj, list):
+        return [_canonical(v) for v in obj]
+    return obj
 
 
-@dataclass
+def canonical_hash(data: Any) -> str:
+    """
+    状态数据的规范哈希
+    
+    键排序后用 msgpack 编码（比 JSON 更紧凑、无需转义），再计算 BLAKE2b，
+    与 GameState 的状态哈希使用同一摘要长度。
+    
+    Args:
+        data: 由 dict/list/标量组成的状态数据（如 json.load 的结果）
+    
+    Returns:
+        十六进制哈希字符串
+    """
+    buf = msgpack.packb(_canonical(data), use_bin_type=True)
+    return hashlib.blake2b(buf, digest_size=HASH_DIGEST_SIZE).hexdigest()
+
+
+# _capture_state 按列保存的实体字段
+CAPTURE_FIELDS = ('x', 'y', 'vx', 'vy', 'hp')
+_CAPTURE_GETTERS = tuple((name, attrgetter(name)) for name in CAPTURE_FIELDS)
+# 一次取出实体的全部比较字段（C 层构造元组）
+_CAPTURE_ROW = attrgetter(*CAPTURE_FIELDS)
+
+
+@dataclass(slots=True)
 class DebugLog:
     """调试日志条目"""
     frame_id: int
@@ -26,6 +67,19 @@ class DebugLog:
     data: dict
     timestamp: float
     state_hash: str
+    
+    def as_tuple(self) -> tuple:
+        """
+        按字段顺序返回各值（data 按引用返回，不像 asdict 那样深复制）
+        
+        Returns:
+            (frame_id, event, data, timestamp, state_hash)
+        """
+        return (self.frame_id, self.event, self.data, self.timestamp, self.state_hash)
+
+
+# DebugLog 的字段名（与 as_tuple() 的顺序一致）
+DEBUG_LOG_FIELDS = tuple(f.name for f in fields(DebugLog))
 
 
 class FrameSyncDebugger:
@@ -69,10 +123,17 @@ class FrameSyncDebugger:
         
         self.logs.append(log_entry)
     
-    def compare_states(self, state1: GameState, state2: GameState) -> Dict:
+    def compare_states(self, state1: GameState, state2: GameState, force: bool = False) -> Dict:
         """
         对比两个游戏状态
         
+        哈希一致时直接返回（entity_diffs 为空），不再逐个比较实体。
+        
+        Args:
+            state1: 状态1
+            state2: 状态2
+            force: 即使哈希一致也逐个比较实体（排查哈希碰撞时使用）
+        
         Returns:
             差异报告
         """
@@ -84,11 +145,15 @@ class FrameSyncDebugger:
         }
         
         # 比较哈希
+        # 每次都现算：GameState 按实体的值缓存摘要，未变化的实体不会重新编码，
+        # 帧内被修改的实体一定会反映在哈希里，哈希一致时才可以跳过逐实体比较
         hash1 = state1.compute_state_hash()
         hash2 = state2.compute_state_hash()
         diff['hash_match'] = hash1 == hash2
         diff['hash1'] = hash1
         diff['hash2'] = hash2
+        if diff['hash_match'] and not force:
+            return diff
         
         # 比较实体
         all_entity_ids = set(state1.entities.keys()) | set(state2.entities.keys())
@@ -116,21 +181,22 @@ class FrameSyncDebugger:
         return diff
     
     def _compare_entities(self, e1: Entity, e2: Entity) -> Optional[dict]:
-        """比较两个实体"""
-        diff = {}
-        
-        if e1.x != e2.x:
-            diff['x_diff'] = {'state1': e1.x, 'state2': e2.x}
-        if e1.y != e2.y:
-            diff['y_diff'] = {'state1': e1.y, 'state2': e2.y}
-        if e1.vx != e2.vx:
-            diff['vx_diff'] = {'state1': e1.vx, 'state2': e2.vx}
-        if e1.vy != e2.vy:
-            diff['vy_diff'] = {'state1': e1.vy, 'state2': e2.vy}
-        if e1.hp != e2.hp:
-            diff['hp_diff'] = {'state1': e1.hp, 'state2': e2.hp}
-        
-        return diff if diff else None
+        """
+        比较两个实体
+        
+        先整行比较字段元组，绝大多数相同的实体一次比较即返回，
+        只有不同的实体才逐列生成差异。
+        """
+        row1 = _CAPTURE_ROW(e1)
+        row2 = _CAPTURE_ROW(e2)
+        if row1 == row2:
+            return None
+        
+        return {
+            f'{name}_diff': {'state1': a, 'state2': b}
+            for name, a, b in zip(CAPTURE_FIELDS, row1, row2)
+            if a != b
+        }
     
     def find_divergence_point(self, history1: Dict[int, str], history2: Dict[int, str]) -> Optional[int]:
         """
@@ -143,22 +209,28 @@ class FrameSyncDebugger:
         Returns:
             分歧帧ID，如果完全一致返回 None
         """
-        common_frames = sorted(set(history1.keys()) & set(history2.keys()))
-        
-        for frame_id in common_frames:
-            if history1[frame_id] != history2[frame_id]:
-                self.divergence_points.append(frame_id)
-                return frame_id
-        
-        return None
+        # 只需要最早的不一致帧：直接在共同帧里取最小值，不必先整体排序
+        frame_id = min(
+            (f for f in history1.keys() & history2.keys() if history1[f] != history2[f]),
+            default=None
+        )
+        if frame_id is not None:
+            self.divergence_points.append(frame_id)
+        return frame_id
     
-    def visualize_frame_timeline(self, frames: List[Frame], output_file: str = None) -> str:
+    def visualize_frame_timeline(self, frames: List[Frame], output_file: str = None,
+                                 max_frames: int = 50) -> str:
         """
         可视化帧时间线
         
+        玩家ID在各帧间基本不变：先收集一次并排序，构造好整行的格式模板，
+        每帧只做一次 format，不再逐帧排序和拼接。
+        某帧缺少的玩家与空输入一样显示为 "_"。
+        
         Args:
             frames: 帧列表
             output_file: 输出文件路径（可选）
+            max_frames: 最多显示的帧数（默认 50）
         
         Returns:
             ASCII 可视化字符串
@@ -166,30 +238,25 @@ class FrameSyncDebugger:
         if not frames:
             return "No frames to visualize"
         
+        shown = frames[:max_frames]
+        player_ids = sorted({pid for frame in shown for pid in frame.inputs})
+        template = "Frame {:4d} | " + " ".join(f"P{pid}:{{}}" for pid in player_ids) + " | {}"
+        
         lines = []
         lines.append("=" * 80)
         lines.append("Frame Timeline")
         lines.append("=" * 80)
         
-        for frame in frames[:50]:  # 只显示前50帧
-            frame_str = f"Frame {frame.frame_id:4d} | "
-            
-            # 显示输入状态
-            player_inputs = []
-            for player_id in sorted(frame.inputs.keys()):
-                input_data = frame.inputs[player_id]
-                input_str = "X" if input_data else "_"
-                player_inputs.append(f"P{player_id}:{input_str}")
-            
-            frame_str += " ".join(player_inputs)
-            
-            # 确认状态
-            frame_str += f" | {'CONFIRMED' if frame.confirmed else 'PENDING'}"
-            
-            lines.append(frame_str)
+        for frame in shown:
+            inputs = frame.inputs
+            lines.append(template.format(
+                frame.frame_id,
+                *['X' if inputs.get(pid) else '_' for pid in player_ids],
+                'CONFIRMED' if frame.confirmed else 'PENDING'
+            ))
         
-        if len(frames) > 50:
-            lines.append(f"... and {len(frames) - 50} more frames")
+        if len(frames) > max_frames:
+            lines.append(f"... and {len(frames) - max_frames} more frames")
         
         result = "\n".join(lines)
         
@@ -203,11 +270,30 @@ class FrameSyncDebugger:
         """
         导出调试日志
         
+        .msgpack 文件按记录流式写出：首条为 {'divergence_points', 'export_time',
+        'log_count', 'fields'}，之后每条日志一个按 fields 顺序排列的数组，
+        不需要先在内存里拼出整个文档；
+        其他扩展名导出为带缩进的 JSON（便于人工查看）。
+        
         Args:
             filename: 输出文件名
         """
+        if filename.endswith('.msgpack'):
+            packer = msgpack.Packer(use_bin_type=True, default=str)
+            with open(filename, 'wb') as f:
+                f.write(packer.pack({
+                    'divergence_points': self.divergence_points,
+                    'export_time': time.time(),
+                    'log_count': len(self.logs),
+                    'fields': DEBUG_LOG_FIELDS
+                }))
+                pack = packer.pack
+                for log in self.logs:
+                    f.write(pack(log.as_tuple()))
+            return
+        
         data = {
-            'logs': [asdict(log) for log in self.logs],
+            'logs': [dict(zip(DEBUG_LOG_FIELDS, log.as_tuple())) for log in self.logs],
             'divergence_points': self.divergence_points,
             'export_time': time.time()
         }
@@ -216,21 +302,23 @@ class FrameSyncDebugger:
             json.dump(data, f, indent=2, default=str)
     
     def _capture_state(self, state: GameState) -> dict:
-        """捕获状态快照"""
-        entities = {}
-        for eid, entity in state.entities.items():
-            entities[eid] = {
-                'x': entity.x,
-                'y': entity.y,
-                'vx': entity.vx,
-                'vy': entity.vy,
-                'hp': entity.hp
-            }
+        """
+        捕获状态快照（SoA）
         
-        return {
+        每个字段一块 array('q')，第 i 行对应 ids[i] 的实体，
+        代替每个实体一个字典，长时间调试时 state_history 的内存占用小得多。
+        
+        Returns:
+            {'frame_id', 'ids', 'x', 'y', 'vx', 'vy', 'hp'}
+        """
+        entities = list(state.entities.values())
+        captured = {
             'frame_id': state.frame_id,
-            'entities': entities
+            'ids': array('q', state.entities)
         }
+        for name, getter in _CAPTURE_GETTERS:
+            captured[name] = array('q', map(getter, entities))
+        return captured
     
     def get_stats(self) -> dict:
         """获取调试统计"""
@@ -242,44 +330,94 @@ class FrameSyncDebugger:
         }
 
 
+class _InputRing:
+    """
+    单个玩家的输入环形缓冲（按列存储）
+    
+    frame_id/flags/timestamp 各一块预分配数组，写满后覆盖最旧的记录，
+    代替每条输入一个字典的无限增长列表。时间戳为 time.monotonic_ns() 整数纳秒。
+    """
+    
+    __slots__ = ('capacity', 'frame_ids', 'flags', 'timestamps', 'head', 'count', 'total',
+                 'last_flags', 'run_length')
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.frame_ids = array('q', [0]) * capacity
+        self.flags = array('q', [0]) * capacity
+        self.timestamps = array('q', [0]) * capacity
+        self.head = 0       # 下一条写入的位置
+        self.count = 0      # 有效记录数（不超过 capacity）
+        self.total = 0      # 累计记录数
+        self.last_flags = -1    # 最近一条输入的标志位
+        self.run_length = 0     # 最近连续相同标志位的输入条数
+    
+    def append(self, frame_id: int, flags: int, timestamp: int):
+        """写入一条输入"""
+        i = self.head
+        self.frame_ids[i] = frame_id
+        self.flags[i] = flags
+        self.timestamps[i] = timestamp
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        self.total += 1
+        if flags == self.last_flags:
+            self.run_length += 1
+        else:
+            self.last_flags = flags
+            self.run_length = 1
+    
+    def _index(self, k: int) -> int:
+        """第 k 条有效记录（0 为最旧）在数组中的位置"""
+        return (self.head - self.count + k) % self.capacity
+    
+    def oldest_timestamp(self) -> int:
+        return self.timestamps[self._index(0)]
+    
+    def newest_timestamp(self) -> int:
+        return self.timestamps[self._index(self.count - 1)]
+    
+    def recent_flags(self, n: int) -> List[int]:
+        """最近 n 条输入的标志位（从旧到新）"""
+        n = min(n, self.count)
+        return [self.flags[self._index(k)] for k in range(self.count - n, self.count)]
+
+
 class InputAnalyzer:
-    """输入分析器"""
+    """
+    输入分析器
     
-    def __init__(self):
-        self.input_history: Dict[int, List[dict]] = {}  # {player_id: [inputs]}
+    每个玩家只保留最近 capacity 条输入，频率按这段窗口计算。
+    """
+    
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        # {player_id: 输入环形缓冲}；首次记录时自动创建。
+        # 查询方法先用 in 判断，不会为未记录的玩家创建空缓冲
+        self.input_history: Dict[int, _InputRing] = defaultdict(partial(_InputRing, capacity))
     
     def record_input(self, player_id: int, frame_id: int, input_flags: int):
         """记录输入"""
-        if player_id not in self.input_history:
-            self.input_history[player_id] = []
-        
-        self.input_history[player_id].append({
-            'frame_id': frame_id,
-            'flags': input_flags,
-            'timestamp': time.time()
-        })
+        # 间隔只用于相对计算：单调时钟不受系统校时影响，整数纳秒避免浮点误差
+        self.input_history[player_id].append(frame_id, input_flags, time.monotonic_ns())
     
     def get_input_frequency(self, player_id: int) -> dict:
         """获取输入频率"""
         if player_id not in self.input_history:
             return {}
         
-        inputs = self.input_history[player_id]
-        if len(inputs) < 2:
+        ring = self.input_history[player_id]
+        if ring.count < 2:
             return {'frequency': 0}
         
-        # 计算输入间隔
-        intervals = []
-        for i in range(1, len(inputs)):
-            dt = inputs[i]['timestamp'] - inputs[i-1]['timestamp']
-            intervals.append(dt)
-        
-        avg_interval = sum(intervals) / len(intervals) if intervals else 0
+        # 相邻间隔的平均值 = (最新 - 最旧) / 间隔数，不必逐个求差
+        avg_interval_ns = (ring.newest_timestamp() - ring.oldest_timestamp()) / (ring.count - 1)
         
         return {
-            'total_inputs': len(inputs),
-            'avg_interval_ms': avg_interval * 1000,
-            'frequency': 1 / avg_interval if avg_interval > 0 else 0
+            'total_inputs': ring.total,
+            'avg_interval_ms': avg_interval_ns / 1e6,
+            'frequency': 1e9 / avg_interval_ns if avg_interval_ns > 0 else 0
         }
     
     def detect_suspicious_patterns(self, player_id: int) -> List[str]:
@@ -289,18 +427,16 @@ class InputAnalyzer:
         if player_id not in self.input_history:
             return suspicious
         
-        inputs = self.input_history[player_id]
+        ring = self.input_history[player_id]
         
         # 检测超高频率输入
         freq = self.get_input_frequency(player_id)
         if freq.get('frequency', 0) > 30:  # 超过30次/秒
             suspicious.append(f"High input frequency: {freq['frequency']:.1f}/sec")
         
-        # 检测重复输入
-        if len(inputs) > 10:
-            recent_flags = [i['flags'] for i in inputs[-10:]]
-            if len(set(recent_flags)) == 1:
-                suspicious.append("Repeated identical inputs")
+        # 检测重复输入（最近 10 条完全相同；连续长度在写入时增量维护）
+        if ring.count > 10 and ring.run_length >= 10:
+            suspicious.append("Repeated identical inputs")
         
         return suspicious
 
@@ -309,7 +445,8 @@ class NetworkMonitor:
     """网络监控器"""
     
     def __init__(self):
-        self.latency_history: List[float] = []
+        # 只保留最近1000条，超出时 deque 自动从头部丢弃（O(1)）
+        self.latency_history: deque = deque(maxlen=1000)
         self.packet_loss_count = 0
         self.total_packets = 0
     
@@ -317,10 +454,6 @@ class NetworkMonitor:
         """记录延迟"""
         self.latency_history.append(latency_ms)
         self.total_packets += 1
-        
-        # 只保留最近1000条
-        if len(self.latency_history) > 1000:
-            self.latency_history.pop(0)
     
     def record_packet_loss(self):
         """记录丢包"""
@@ -337,11 +470,17 @@ class NetworkMonitor:
                 'packet_loss_rate': 0
             }
         
+        history = self.latency_history
+        n = len(history)
+        # 升序排序后下标 int(n * 0.99) 的元素，即第 n - int(n * 0.99) 大的元素；
+        # 只需维护一个很小的堆，不必整体排序
+        p99 = heapq.nlargest(n - int(n * 0.99), history)[-1]
+        
         return {
-            'avg_latency': sum(self.latency_history) / len(self.latency_history),
-            'min_latency': min(self.latency_history),
-            'max_latency': max(self.latency_history),
-            'p99_latency': sorted(self.latency_history)[int(len(self.latency_history) * 0.99)],
+            'avg_latency': sum(history) / n,
+            'min_latency': min(history),
+            'max_latency': max(history),
+            'p99_latency': p99,
             'packet_loss_rate': self.packet_loss_count / self.total_packets if self.total_packets > 0 else 0,
             'total_packets': self.total_packets
         }
@@ -373,8 +512,8 @@ def main():
             state2_data = json.load(f)
         
         # 简单比较
-        hash1 = hashlib.md5(json.dumps(state1_data, sort_keys=True).encode()).hexdigest()
-        hash2 = hashlib.md5(json.dumps(state2_data, sort_keys=True).encode()).hexdigest()
+        hash1 = canonical_hash(state1_data)
+        hash2 = canonical_hash(state2_data)
         
         print(f"State 1 hash: {hash1}")
         print(f"State 2 hash: {hash2}")